@@ -1,6 +1,6 @@
 import os
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Iterable, Optional
 
 from dotenv import load_dotenv
 from fastapi import Header, Security
@@ -9,6 +9,10 @@ from jose import JWTError, jwt
 from starlette.status import HTTP_403_FORBIDDEN
 
 from app.api.v1.setting.function import http_exception
+from app.library.cache import TTLCache
+from app.library.constant.cache import (
+    CURRENT_USER_CACHE_MAX_SIZE, CURRENT_USER_CACHE_TTL
+)
 from app.library.constant.server_auth import SERVER_AUTH_TYPE
 from app.library.constant.system_type import SYSTEM_TYPE
 from app.model.base import db
@@ -17,6 +21,12 @@ load_dotenv()
 
 EXPIRES_TIME = 300
 
+# watcher_id -> thông tin watcher, xoá khi watcher bị xoá ( delete_watcher, delete_multi_watcher )
+# dùng chung cho user đang đăng nhập và tác giả activity trong feed
+current_user_cache = TTLCache(max_size=CURRENT_USER_CACHE_MAX_SIZE, ttl=CURRENT_USER_CACHE_TTL)
+
+WATCHER_CACHE_SHOW_VALUE = {"_id": 0, "watcher_id": 1, "username": 1, "avatar_url": 1}
+
 
 async def get_system(
         server_auth: Optional[str] = Header(None)
@@ -35,17 +45,52 @@ async def create_access_token(watcher_id: str) -> str:
     return encoded_jwt
 
 
+def decode_watcher_id(token: str) -> Optional[str]:
+    """
+    :return: watcher_id trong token, None nếu token ko hợp lệ hoặc hết hạn
+    """
+    try:
+        payload = jwt.decode(token, os.getenv('JWT_SECRET_KEY'), algorithms=[os.getenv("ALGORITHM")])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
+async def get_watcher_by_id(watcher_id: str) -> Optional[dict]:
+    watcher = current_user_cache.get(watcher_id)
+    if watcher is None:
+        watcher = await db.watcher.find_one({"watcher_id": watcher_id}, WATCHER_CACHE_SHOW_VALUE)
+        if watcher is not None:
+            current_user_cache.set(watcher_id, watcher)
+    return watcher
+
+
+async def get_watchers_by_ids(watcher_ids: Iterable[str]) -> Dict[str, dict]:
+    """
+    Thông tin của nhiều watcher, những watcher chưa có trong cache được lấy bằng 1 query `$in`
+    :return: watcher_id -> thông tin watcher, ko có watcher_id ko tồn tại
+    """
+    watcher_id__watcher = {}
+    missing_watcher_ids = []
+    for watcher_id in set(watcher_ids):
+        watcher = current_user_cache.get(watcher_id)
+        if watcher is None:
+            missing_watcher_ids.append(watcher_id)
+        else:
+            watcher_id__watcher[watcher_id] = watcher
+
+    if missing_watcher_ids:
+        cursor = db.watcher.find({"watcher_id": {"$in": missing_watcher_ids}}, WATCHER_CACHE_SHOW_VALUE)
+        async for watcher in cursor:
+            current_user_cache.set(watcher['watcher_id'], watcher)
+            watcher_id__watcher[watcher['watcher_id']] = watcher
+    return watcher_id__watcher
+
+
 async def get_current_user(
         scheme_and_credentials: HTTPAuthorizationCredentials = Security(HTTPBearer())
 ):
-    try:
-        payload = jwt.decode(
-            scheme_and_credentials.credentials, os.getenv('JWT_SECRET_KEY'), algorithms=[os.getenv("ALGORITHM")]
-        )
-        watcher_id: str = payload.get("sub")
-        if watcher_id is None:
-            return http_exception(status_code=HTTP_403_FORBIDDEN, description="token is not valid")
-        watcher = await db.watcher.find_one({"watcher_id": watcher_id})
-        return watcher
-    except JWTError:
-        raise http_exception(status_code=HTTP_403_FORBIDDEN, description="token is not valid")
+    watcher_id = decode_watcher_id(scheme_and_credentials.credentials)
+    if watcher_id is None:
+        return http_exception(status_code=HTTP_403_FORBIDDEN, description="token is not valid")
+    return await get_watcher_by_id(watcher_id)
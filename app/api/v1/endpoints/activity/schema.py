@@ -20,6 +20,7 @@ class ActivityResponse(Base):
     file_uuid: Optional[str] = Field(..., nullable=True, description="Uuid file gửi lên")
     file_name: Optional[str] = Field(..., nullable=True, description="Tên file gửi lên")
     file_url: Optional[HttpUrl] = Field(..., nullable=True, description='Đường dẫn tải file từ minio')
+    thumbnail_url: Optional[HttpUrl] = Field(None, nullable=True, description='Đường dẫn thumbnail của file, null khi chưa tạo xong')
     tag_users: list = Field(..., description="Các watcher_id được tag")
     watcher_created_acitivity_document: WatcherDocument = Field(..., description="thông tin người tạo")
     group_profile_id: str = Field(..., description="Id group profile")
@@ -1,4 +1,4 @@
-import re
+from collections import Counter
 from datetime import datetime
 from typing import List
 
@@ -6,18 +6,38 @@ from aioredis import Redis
 from fastapi import APIRouter, Depends, File, Form, Path, Query, UploadFile
 from starlette.status import HTTP_200_OK, HTTP_201_CREATED
 
-from app.api.v1.dependency.authentication import get_current_user, get_system
+from app.api.v1.dependency.authentication import (
+    get_current_user, get_system, get_watchers_by_ids
+)
 from app.api.v1.endpoints.activity.schema import (
     ActivityByDayResponse, CreateActivityByDayResponse
 )
-from app.api.v1.setting.event import service_file
+from app.api.v1.setting.event import service_file, thumbnail_service
 from app.api.v1.setting.function import (
     http_exception, open_api_standard_responses
 )
-from app.library.function import (
-    datetime_to_date, is_valid_object_id, paging_aggregation
+from app.library.activity_day import get_activity_day_page
+from app.library.constant.activity import (
+    ACTIVITY_DAY_MAX_PAGE_DAYS, ACTIVITY_DAY_PAGE_DAYS, ACTIVITY_DAY_TIMEZONE
+)
+from app.library.constant.function import PAGING_LIMIT, PAGING_MAX_LIMIT
+from app.library.fan_out import build_fan_out_job, dispatch_fan_out
+from app.library.fast_json import make_response
+from app.library.function import datetime_to_date, is_valid_object_id, paging
+from app.library.group_member import add_members, is_member
+from app.library.group_profile_cache import (
+    get_cached_member_ids, get_group_profile, invalidate_group_members
+)
+from app.library.mention import (
+    get_watcher_ids_by_usernames, invalidate_mention_index, parse_mentions
+)
+from app.library.notification_counter import decr_online_counters
+from app.library.notification_storage import get_unread_watcher_ids_of_activity
+from app.library.push import publish_counter_deltas
+from app.library.service_file import FileTooLargeError
+from app.model.base import (
+    FailResponse, PagingResponseData, PyObjectId, ResponseData, db
 )
-from app.model.base import FailResponse, PyObjectId, ResponseData, db
 from app.model.redis import redis_pool
 
 router = APIRouter()
@@ -42,7 +62,7 @@ async def create_new_activity(
         system_name: dict = Depends(get_system),
         redis: Redis = Depends(redis_pool)
 ):
-    group_profile = await db.group_profile.find_one({"group_profile_id": group_profile_id, "created_by": system_name})
+    group_profile = await get_group_profile(redis, group_profile_id, system_name)
     if not group_profile:
         return http_exception(description=f"group profile id = {group_profile_id} does not exist")
 
@@ -50,38 +70,40 @@ async def create_new_activity(
     if not watcher:
         return http_exception(description=f"watcher_id = {watcher_id} not exist")
 
-    # đối với những watcher ko có trong group_profile nếu được phép comment thì
-    # khi comment sẽ được add vào member của group
-    if watcher_id not in group_profile['watcher_ids']:
-        await db.group_profile.find_one_and_update(
-            {"group_profile_id": group_profile_id},
-            {
-                '$push': {'watcher_ids': watcher_id},
-                '$set': {'updated_at': datetime.now()}
-            }
-        )
-
-    # thêm white space ở cuối content để trường hợp tag user ở cuối câu ko có dấu " " thì regex ko tìm được
+    # content lưu vào db vẫn có white space ở cuối như trước
     content = f'{content} '
     activity = {'group_profile_id': group_profile_id, 'content': content}
-    tag_users = re.findall(r'@(.*?)[\s@]', content)
-    tag_users = [tag_user.strip() for tag_user in tag_users if tag_user != watcher['username']]
+    mentions = parse_mentions(content, watcher['username'])
+
+    tag_watcher_ids = []
+    if not mentions.is_all:
+        # username -> watcher_id lấy từ cache
+        username__watcher_id = await get_watcher_ids_by_usernames(mentions.usernames)
+        tag_watcher_ids = [
+            username__watcher_id[username] for username in mentions.usernames if username in username__watcher_id
+        ]
+
+    # người tạo activity và người được tag kiểm tra là thành viên trong 1 lần trên redis set thành viên của group
+    member_ids = await get_cached_member_ids(redis, group_profile, [watcher_id, *tag_watcher_ids])
 
-    if not tag_users or "all" in tag_users:
+    # đối với những watcher ko có trong group_profile nếu được phép comment thì
+    # khi comment sẽ được add vào member của group, kiểm tra lại trên mongo để ko thêm trùng khi cache chưa kịp xoá
+    if watcher_id not in member_ids and not await is_member(group_profile, watcher_id):
+        await add_members(group_profile_id, [watcher])
+        await invalidate_group_members(redis, group_profile_id)
+        await invalidate_mention_index(redis, group_profile_id)
+
+    if mentions.is_all:
         activity['tag_users'] = ['@all']
     else:
-        cursor = db.watcher.find({'username': {"$in": tag_users}})
-        list_watcher_tag = await cursor.to_list(None)
-
-        activity['tag_users'] = \
-            [watcher['watcher_id']
-             for watcher in list_watcher_tag if watcher['watcher_id'] in group_profile['watcher_ids']]
+        activity['tag_users'] = [tag_watcher_id for tag_watcher_id in tag_watcher_ids if tag_watcher_id in member_ids]
 
     uuid_and_file_url = None
     if file:
-        await file.seek(0)
-        file_data_stream = await file.read()
-        is_success, uuid_and_file_url = await service_file.upload_file(file=file_data_stream)
+        try:
+            is_success, uuid_and_file_url = await service_file.upload_file(file=file)
+        except FileTooLargeError as error:
+            return http_exception(description=str(error))
 
         if not is_success:
             return http_exception(description="Get some error when upload file to service")
@@ -99,95 +121,28 @@ async def create_new_activity(
     new_activity = await db.activity.insert_one(activity)
 
     if new_activity.inserted_id:
+        # chỉ lưu số lượng và activity mới nhất, danh sách activity tìm theo index activity.group_profile_id
         await db.group_profile.update_one(
             {"group_profile_id": group_profile_id},
-            {'$push': {'activity_ids': PyObjectId.validate(new_activity.inserted_id)}}
-        )
-    else:
-        return http_exception(description="Get some error when create activity")
-
-    # tạo mới thông báo
-    list_new_notification = []
-
-    watcher_ids_in_tag = None
-
-    if '@all' not in activity['tag_users']:
-        # nếu được tag thì chỉ những người được tag sẽ nhận được thông báo ai đã tag
-        watcher_ids_in_tag_cursor = db.watcher.find(
-            {"$and": [
-                {"watcher_id": {"$in": activity['tag_users']}},
-                {"watcher_id": {"$ne": watcher_id}}  # tìm watcher ngoại trừ người tạo activity
-            ]}
-        )
-        watcher_ids_in_tag = await watcher_ids_in_tag_cursor.to_list(None)
-    # nêu ko được tag thì tất cả watcher trong group ngoại trừ người tạo
-    #  activity['tag_users'] có giá trị là [@all] nên ko ảnh hưởng
-    watcher_ids_not_in_tag_cursor = db.watcher.find(
-        {"$and": [
-            {"watcher_id": {"$in": group_profile['watcher_ids']}},
-            {"watcher_id": {"$nin": activity['tag_users']}},
-            {"watcher_id": {"$ne": watcher_id}}  # tìm watcher ngoại trừ người tạo activity
-        ]}
-    )
-
-    watcher_ids_not_in_tag = await watcher_ids_not_in_tag_cursor.to_list(None)
-    watcher_ids = []
-    if watcher_ids_not_in_tag:
-        watcher_noti_status_not_in_tag = [
-            {
-                "watcher_id": watcher['watcher_id'],
-                "status": False
-            } for watcher in watcher_ids_not_in_tag
-        ]
-        list_new_notification.append(
             {
-                'content': f"{watcher['username']} vừa bình luận",
-                'watcher_noti_status': watcher_noti_status_not_in_tag,
-                "activity_id": new_activity.inserted_id,
-                "watcher_created_activity": watcher_id,
-                "created_by": group_profile['created_by'],
-                "updated_by": group_profile['created_by'],
-                "created_at": datetime.now(),
-                "updated_at": datetime.now()
+                '$inc': {'activity_count': 1},
+                '$set': {
+                    'last_activity_id': PyObjectId.validate(new_activity.inserted_id),
+                    'last_activity_at': activity['created_at']
+                }
             }
         )
-        watcher_ids.extend([watcher['watcher_id'] for watcher in watcher_ids_not_in_tag])
-    if watcher_ids_in_tag:
-
-        watcher_noti_status_in_tag = [
-            {
-                "watcher_id": watcher['watcher_id'],
-                "status": False
-            } for watcher in watcher_ids_in_tag
-        ]
-        list_new_notification.append(
-            {
-                'content': f"{watcher['username']} vừa nhắc đến bạn trong group_profile id = {group_profile_id}",
-                'watcher_noti_status': watcher_noti_status_in_tag,
-                "activity_id": new_activity.inserted_id,
-                "watcher_created_activity": watcher_id,
-                "created_by": group_profile['created_by'],
-                "updated_by": group_profile['created_by'],
-                "created_at": datetime.now(),
-                "updated_at": datetime.now()
-            }
-        )
-
-        watcher_ids.extend([watcher['watcher_id'] for watcher in watcher_ids_in_tag])
-
-    await db.notification.insert_many(list_new_notification)
+    else:
+        return http_exception(description="Get some error when create activity")
 
-    # lưu lại số thông báo chưa đọc trong redis
-    # watcher_id__new_number_noti = {}
-    number_noti_not_reads = await redis.mget(watcher_ids)
+    if file:
+        # thumbnail được tạo trong process con, tạo xong mới cập nhật thumbnail_url của activity
+        await thumbnail_service.submit(new_activity.inserted_id, file)
+    activity['thumbnail_url'] = None
 
-    for index, watcher_id in enumerate(watcher_ids):
-        value_number_noti = number_noti_not_reads[index]
-        # chỉ cập nhật redis nếu watcher đó đang online( nếu offline hoặc chưa có dữ liệu thì redis sẽ bằng None)
-        if value_number_noti:
-            await redis.incr(watcher_id)
+    # gửi thông báo cho các watcher trong group, mặc định được đưa vào queue nên ko làm chậm request
+    await dispatch_fan_out(redis, build_fan_out_job(activity, group_profile))
 
-    # await redis.mset(watcher_id__new_number_noti)
     activity['watcher_created_acitivity_document'] = {
         "watcher_id": watcher['watcher_id'],
         "username": watcher['username'],
@@ -207,50 +162,88 @@ async def create_new_activity(
     status_code=HTTP_200_OK,
     responses=open_api_standard_responses(
         success_status_code=HTTP_200_OK,
-        success_response_model=ResponseData[List[ActivityByDayResponse]],
+        success_response_model=PagingResponseData[List[ActivityByDayResponse]],
         fail_response_model=FailResponse
     )
 )
 async def get_all_activity(
         group_profile_id: str = Path(..., description="id of group_profile"),
-        last_activity_id: str = Query(None, description="last _id of activity in list"),
-        watcher: dict = Depends(get_current_user)
+        last_activity_id: str = Query(None, description="`next_cursor` or `prev_cursor` of previous page"),
+        limit: int = Query(PAGING_LIMIT, ge=1, description=f"number of activity per page, max {PAGING_MAX_LIMIT}"),
+        watcher: dict = Depends(get_current_user),
+        redis: Redis = Depends(redis_pool)
 ):
-    group_profile = await db.group_profile.find_one({"group_profile_id": group_profile_id})
+    group_profile = await get_group_profile(redis, group_profile_id)
     if not group_profile:
         return http_exception(description=f"group_profile_id = {group_profile_id} does not exist")
 
-    cursor = paging_aggregation(
+    # lấy 1 trang activity theo index ( group_profile_id, _id ), ko $lookup watcher cho từng trang
+    page = await paging(
         query_param_for_paging=last_activity_id,
         database_name="activity",
         key_query="group_profile_id",
         value_query=group_profile_id,
         db=db,
-        foreign_table='watcher',
-        local_field="watcher_id",
-        foreign_field="watcher_id",
-        sort=-1
+        sort=-1,
+        limit=limit
     )
-    activities = []
+    activities = page['data']
 
-    if cursor:
-        activities = await cursor.to_list(None)
+    # tác giả của cả trang lấy trong 1 lần, tác giả đăng nhiều thường đã có sẵn trong cache
+    watcher_id__watcher = await get_watchers_by_ids(activity['watcher_id'] for activity in activities)
 
     day__activities_response = {}
     for activity in activities:
-        if activity['watcher_document']:
-            activity['watcher_created_acitivity_document'] = activity['watcher_document'][0]
+        if activity['watcher_id'] in watcher_id__watcher:
+            activity['watcher_created_acitivity_document'] = watcher_id__watcher[activity['watcher_id']]
 
         created_at_in_date = datetime_to_date(activity['created_at'])
         if created_at_in_date not in day__activities_response:
             day__activities_response[created_at_in_date] = []
         day__activities_response[created_at_in_date].append(activity)
 
-    data_response = {"data": []}
-    for key, value in day__activities_response.items():
-        data_response['data'].append({"created_day": key, "activities": value})
+    page['data'] = [
+        {"created_day": key, "activities": value} for key, value in day__activities_response.items()
+    ]
+    return make_response(PagingResponseData[List[ActivityByDayResponse]], page)
 
-    return ResponseData[list[ActivityByDayResponse]](**data_response)
+
+@router.get(
+    path="/{group_profile_id}/activity/day/",
+    name="activity: Get activity of group profile by day",
+    description='Get activity of group profile grouped by day in the given timezone, each page contains whole days',
+    status_code=HTTP_200_OK,
+    responses=open_api_standard_responses(
+        success_status_code=HTTP_200_OK,
+        success_response_model=PagingResponseData[List[ActivityByDayResponse]],
+        fail_response_model=FailResponse
+    )
+)
+async def get_activity_by_day(
+        group_profile_id: str = Path(..., description="id of group_profile"),
+        timezone: str = Query(
+            ACTIVITY_DAY_TIMEZONE, description="Olson timezone ( Asia/Ho_Chi_Minh ) or UTC offset ( +07:00 )"
+        ),
+        last_day_cursor: str = Query(None, description="`next_cursor` of previous page"),
+        days: int = Query(ACTIVITY_DAY_PAGE_DAYS, ge=1, le=ACTIVITY_DAY_MAX_PAGE_DAYS, description="number of day per page"),
+        watcher: dict = Depends(get_current_user),
+        redis: Redis = Depends(redis_pool)
+):
+    group_profile = await get_group_profile(redis, group_profile_id)
+    if not group_profile:
+        return http_exception(description=f"group_profile_id = {group_profile_id} does not exist")
+
+    # mongo chia activity theo ngày, python chỉ gắn thông tin tác giả
+    page = await get_activity_day_page(group_profile_id, timezone, last_day_cursor, days)
+    watcher_id__watcher = await get_watchers_by_ids(
+        activity['watcher_id'] for day in page['data'] for activity in day['activities']
+    )
+    for day in page['data']:
+        for activity in day['activities']:
+            if activity['watcher_id'] in watcher_id__watcher:
+                activity['watcher_created_acitivity_document'] = watcher_id__watcher[activity['watcher_id']]
+
+    return make_response(PagingResponseData[List[ActivityByDayResponse]], page)
 
 
 @router.delete(
@@ -271,27 +264,32 @@ async def delete_activity(
 ):
 
     object_id = is_valid_object_id(activity_id)
-    group_profile = await db.group_profile.find_one({"group_profile_id": group_profile_id, "created_by": system_name})
+    group_profile = await get_group_profile(redis, group_profile_id, system_name)
     if group_profile is None:
         return http_exception(description=f'group_profile_id = {group_profile_id} does not exist')
     activity = await db.activity.find_one_and_delete({"_id": object_id, "group_profile_id": group_profile_id})
     if activity is None:
         return http_exception(description="_id does not exist")
 
-    notification_cursor = db.notification.find({'activity_id': object_id})
-    notifications = await notification_cursor.to_list(None)
-    watcher_ids = []
-    for notification in notifications:
-        watcher_ids.extend([watcher['watcher_id'] for watcher in notification['watcher_noti_status'] if not watcher['status']])
+    watcher_ids = await get_unread_watcher_ids_of_activity(object_id)
 
-    number_noti_not_reads = await redis.mget(watcher_ids)
-
-    for index, watcher_id in enumerate(watcher_ids):
-        value_number_noti = number_noti_not_reads[index]
-        if value_number_noti:
-            await redis.decr(watcher_id)
-    # await redis.mset(watcher_id__new_number_noti)
+    await decr_online_counters(redis, watcher_ids)
+    await publish_counter_deltas(redis, {watcher_id: -number for watcher_id, number in Counter(watcher_ids).items()})
 
     # bên trên đã check tồn tại rồi nên bên dưới chỉ cần filter theo id để cập nhật
-    await db.group_profile.update_one({"group_profile_id": group_profile_id}, {'$pull': {'activity_ids': activity_id}})
+    # last_activity_id ko có trong cache nên lấy giá trị trước khi cập nhật cùng lúc giảm activity_count
+    group_profile_before_update = await db.group_profile.find_one_and_update(
+        {"group_profile_id": group_profile_id}, {'$inc': {'activity_count': -1}}, projection={"last_activity_id": 1}
+    )
+    if group_profile_before_update and group_profile_before_update.get('last_activity_id') == activity_id:
+        last_activity = await db.activity.find_one(
+            {"group_profile_id": group_profile_id}, {"_id": 1, "created_at": 1}, sort=[("_id", -1)]
+        )
+        await db.group_profile.update_one(
+            {"group_profile_id": group_profile_id, "last_activity_id": activity_id},
+            {'$set': {
+                'last_activity_id': PyObjectId.validate(last_activity['_id']) if last_activity else None,
+                'last_activity_at': last_activity['created_at'] if last_activity else None
+            }}
+        )
     return None
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 
 from bson import ObjectId
@@ -14,8 +15,11 @@ class GroupProfileRequest(BaseModel):
 class GroupProfileResponse(Base):
     id: PyObjectId = Field(..., alias="_id")
     group_profile_id: str = Field(...)
-    watcher_ids: list = Field(...)
-    activity_ids: list = Field(...)
+    watcher_ids: list = Field(..., description="Thành viên của group, luôn rỗng khi lưu thành viên trong collection group_member")
+    member_count: Optional[int] = Field(None, description="Số thành viên của group")
+    activity_count: int = Field(0, description="Số activity trong group")
+    last_activity_id: Optional[str] = Field(None, description="_id của activity mới nhất")
+    last_activity_at: Optional[datetime] = Field(None, description="Thời gian tạo activity mới nhất")
 
     class Config:
         allow_population_by_field_name = True
@@ -24,3 +28,13 @@ class GroupProfileResponse(Base):
 
 class UpdateWatcherGroupProfileRequest(BaseModel):
     watcher_ids: list = Field(...)
+
+
+class GroupMemberBulkResponse(BaseModel):
+    number_changed: int = Field(..., description="Số thành viên thực sự được thêm/xoá")
+    member_count: Optional[int] = Field(None, description="Số thành viên của group sau khi cập nhật")
+
+
+class MentionSuggestResponse(BaseModel):
+    watcher_id: str = Field(...)
+    username: str = Field(...)
@@ -1,17 +1,33 @@
 from datetime import datetime
+from typing import List
 
+from aioredis import Redis
 from fastapi import APIRouter, Depends, Path, Query
-from pymongo import ReturnDocument
 from starlette.status import HTTP_200_OK, HTTP_201_CREATED
 
-from app.api.v1.dependency.authentication import get_system
+from app.api.v1.dependency.authentication import get_current_user, get_system
 from app.api.v1.endpoints.group_profile.schema import (
-    GroupProfileRequest, GroupProfileResponse, UpdateWatcherGroupProfileRequest
+    GroupMemberBulkResponse, GroupProfileRequest, GroupProfileResponse,
+    MentionSuggestResponse, UpdateWatcherGroupProfileRequest
 )
 from app.api.v1.setting.function import (
     http_exception, open_api_standard_responses
 )
+from app.library.constant.mention import (
+    MENTION_SUGGEST_LIMIT, MENTION_SUGGEST_MAX_LIMIT
+)
+from app.library.group_member import (
+    add_members, get_existing_member_ids, get_watchers, insert_member_rows,
+    is_collection_mode, remove_members
+)
+from app.library.group_profile_cache import (
+    get_group_profile, invalidate_group_members
+)
+from app.library.mention import (
+    build_mention_index, get_mention_suggestions, invalidate_mention_index
+)
 from app.model.base import FailResponse, ResponseData, db
+from app.model.redis import redis_pool
 
 router = APIRouter()
 
@@ -36,24 +52,30 @@ async def create_group_profile(
     group_profile["updated_by"] = system_name
     group_profile["created_at"] = datetime.now()
     group_profile["updated_at"] = datetime.now()
-    group_profile["activity_ids"] = []
+    group_profile["activity_count"] = 0
+    group_profile["last_activity_id"] = None
+    group_profile["last_activity_at"] = None
 
-    exist_group_profile = await db.group_profile.find_one({"group_profile_id": group_profile['group_profile_id']})
+    exist_group_profile = await db.group_profile.find_one(
+        {"group_profile_id": group_profile['group_profile_id']}, {"group_profile_id": 1}
+    )
     if exist_group_profile:
         return http_exception(description=f"group_profile_id = {exist_group_profile['group_profile_id']} is exist")
 
-    if group_profile['watcher_ids']:
-        cursor = db.watcher.find({"watcher_id": {"$in": group_profile['watcher_ids']}})
-        watchers = await cursor.to_list(None)
-        if len(watchers) != len(group_profile['watcher_ids']):
-            list_watcher_id_in_db = [watcher["watcher_id"] for watcher in watchers]
-            not_exist_watcher_id = []
-            for watcher in group_profile['watcher_ids']:
-                if watcher not in list_watcher_id_in_db:
-                    not_exist_watcher_id.append(watcher)
-            return http_exception(description=f"watcher_id = {not_exist_watcher_id} does not exist")
+    watcher_ids = list(dict.fromkeys(group_profile['watcher_ids'] or []))
+    watchers, not_exist_watcher_id = await get_watchers(watcher_ids)
+    if not_exist_watcher_id:
+        return http_exception(description=f"watcher_id = {not_exist_watcher_id} does not exist")
 
-    await db.group_profile.insert_one(group_profile)
+    group_profile['member_count'] = len(watchers)
+    if is_collection_mode():
+        # thành viên lưu trong collection group_member, ko lưu vào document group_profile
+        group_profile['watcher_ids'] = []
+        await db.group_profile.insert_one(group_profile)
+        await insert_member_rows(group_profile['group_profile_id'], watchers)
+    else:
+        group_profile['watcher_ids'] = watcher_ids
+        await db.group_profile.insert_one(group_profile)
 
     return ResponseData[GroupProfileResponse](**{"data": group_profile})
 
@@ -74,62 +96,144 @@ async def update_watcher_in_group_profile(
         group_profile_id: str = Path(...),
         remove_watcher_flag: bool = Query(default=False, description="`True`: remove watcher, <br/>"
                                                                      "`False`: add watcher to group profile"),
-        system_name: str = Depends(get_system)
+        system_name: str = Depends(get_system),
+        redis: Redis = Depends(redis_pool)
 ):
-    watcher_ids = watcher_ids.dict()
-    if len(watcher_ids['watcher_ids']) != len(set(watcher_ids['watcher_ids'])):
+    watcher_ids = watcher_ids.dict()['watcher_ids']
+    if len(watcher_ids) != len(set(watcher_ids)):
         return http_exception(description="some watcher_id have same value")
 
-    group_profile = await db.group_profile.find_one({"group_profile_id": group_profile_id, 'created_by': system_name})
+    group_profile = await get_group_profile(redis, group_profile_id, system_name)
     if group_profile is None:
-        http_exception(description=f"group_profile_id = {group_profile_id} is not exist")
-
-    cursor = db.watcher.find({"watcher_id": {"$in": watcher_ids['watcher_ids']}})
-    list_watcher = await cursor.to_list(None)
+        return http_exception(description=f"group_profile_id = {group_profile_id} is not exist")
 
-    if len(list_watcher) != len(watcher_ids['watcher_ids']):
-        list_watcher_id_in_db = [watcher["watcher_id"] for watcher in list_watcher]
-        not_exist_watcher_id = []
-        for watcher in watcher_ids['watcher_ids']:
-            if watcher not in list_watcher_id_in_db:
-                not_exist_watcher_id.append(watcher)
+    watchers, not_exist_watcher_id = await get_watchers(watcher_ids)
+    if not_exist_watcher_id:
         return http_exception(description=f"watcher_id = {not_exist_watcher_id} does not exist")
 
+    exist_member_ids = await get_existing_member_ids(group_profile, watcher_ids)
     if not remove_watcher_flag:
-        list_watcher_id_exist_in_group_profile = []
-        for watcher_id in watcher_ids['watcher_ids']:
-            if watcher_id in group_profile['watcher_ids']:
-                list_watcher_id_exist_in_group_profile.append(watcher_id)
-
+        list_watcher_id_exist_in_group_profile = [watcher_id for watcher_id in watcher_ids if watcher_id in exist_member_ids]
         if list_watcher_id_exist_in_group_profile:
             return http_exception(
                 description=f"watcher_id = {list_watcher_id_exist_in_group_profile} "
                             f"already exist in group_profile_id = {group_profile_id}"
             )
-        group_profile_after_update = await db.group_profile.find_one_and_update(
-            {"group_profile_id": group_profile_id},
-            {
-                '$push': {'watcher_ids': {"$each": watcher_ids['watcher_ids']}},
-                '$set': {'updated_at': datetime.now()}
-            },
-            return_document=ReturnDocument.AFTER
-        )
+        _, group_profile_after_update = await add_members(group_profile_id, watchers)
 
     else:
-        watcher_id_not_exist_in_group_profile = []
-        for watcher_id in watcher_ids['watcher_ids']:
-            if watcher_id not in group_profile['watcher_ids']:
-                watcher_id_not_exist_in_group_profile.append(watcher_id)
+        watcher_id_not_exist_in_group_profile = [
+            watcher_id for watcher_id in watcher_ids if watcher_id not in exist_member_ids
+        ]
         if watcher_id_not_exist_in_group_profile:
             return http_exception(description=f"watcher_id = {watcher_id_not_exist_in_group_profile} not exist in group profile")
 
-        group_profile_after_update = await db.group_profile.find_one_and_update(
-            {"group_profile_id": group_profile_id},
-            {
-                '$pull': {'watcher_ids': {"$in": watcher_ids['watcher_ids']}},
-                '$set': {'updated_at': datetime.now()}
-            },
-            return_document=ReturnDocument.AFTER
-        )
+        _, group_profile_after_update = await remove_members(group_profile_id, watcher_ids)
 
+    await invalidate_group_members(redis, group_profile_id)
+    await invalidate_mention_index(redis, group_profile_id)
     return ResponseData[GroupProfileResponse](**{"data": group_profile_after_update})
+
+
+@router.post(
+    path="/group-profile/{group_profile_id}/members/",
+    name="group-profile: Bulk add members",
+    description='Thêm nhiều watcher vào group profile, bỏ qua watcher đã là thành viên',
+    status_code=HTTP_200_OK,
+    responses=open_api_standard_responses(
+        success_status_code=HTTP_200_OK,
+        success_response_model=ResponseData[GroupMemberBulkResponse],
+        fail_response_model=FailResponse
+    )
+)
+async def bulk_add_members(
+        watcher_ids: UpdateWatcherGroupProfileRequest,
+        group_profile_id: str = Path(...),
+        system_name: str = Depends(get_system),
+        redis: Redis = Depends(redis_pool)
+):
+    watcher_ids = list(dict.fromkeys(watcher_ids.dict()['watcher_ids']))
+    group_profile = await get_group_profile(redis, group_profile_id, system_name)
+    if group_profile is None:
+        return http_exception(description=f"group_profile_id = {group_profile_id} is not exist")
+
+    watchers, not_exist_watcher_id = await get_watchers(watcher_ids)
+    if not_exist_watcher_id:
+        return http_exception(description=f"watcher_id = {not_exist_watcher_id} does not exist")
+
+    if not is_collection_mode():
+        # collection mode dùng unique index để bỏ qua thành viên đã có, embedded mode phải lọc trước
+        exist_member_ids = await get_existing_member_ids(group_profile, watcher_ids)
+        watchers = [watcher for watcher in watchers if watcher['watcher_id'] not in exist_member_ids]
+
+    number_changed, group_profile_after_update = await add_members(group_profile_id, watchers)
+    if number_changed:
+        await invalidate_group_members(redis, group_profile_id)
+        await invalidate_mention_index(redis, group_profile_id)
+    data = {"number_changed": number_changed, "member_count": group_profile_after_update.get('member_count')}
+    return ResponseData[GroupMemberBulkResponse](**{"data": data})
+
+
+@router.delete(
+    path="/group-profile/{group_profile_id}/members/",
+    name="group-profile: Bulk remove members",
+    description='Xoá nhiều watcher khỏi group profile, bỏ qua watcher ko phải thành viên',
+    status_code=HTTP_200_OK,
+    responses=open_api_standard_responses(
+        success_status_code=HTTP_200_OK,
+        success_response_model=ResponseData[GroupMemberBulkResponse],
+        fail_response_model=FailResponse
+    )
+)
+async def bulk_remove_members(
+        watcher_ids: UpdateWatcherGroupProfileRequest,
+        group_profile_id: str = Path(...),
+        system_name: str = Depends(get_system),
+        redis: Redis = Depends(redis_pool)
+):
+    watcher_ids = list(dict.fromkeys(watcher_ids.dict()['watcher_ids']))
+    group_profile = await get_group_profile(redis, group_profile_id, system_name)
+    if group_profile is None:
+        return http_exception(description=f"group_profile_id = {group_profile_id} is not exist")
+
+    if not is_collection_mode():
+        exist_member_ids = await get_existing_member_ids(group_profile, watcher_ids)
+        watcher_ids = [watcher_id for watcher_id in watcher_ids if watcher_id in exist_member_ids]
+
+    number_changed, group_profile_after_update = await remove_members(group_profile_id, watcher_ids)
+    if number_changed:
+        await invalidate_group_members(redis, group_profile_id)
+        await invalidate_mention_index(redis, group_profile_id)
+    data = {"number_changed": number_changed, "member_count": group_profile_after_update.get('member_count')}
+    return ResponseData[GroupMemberBulkResponse](**{"data": data})
+
+
+@router.get(
+    path="/group-profile/{group_profile_id}/mention-suggest",
+    name="group-profile: Suggest members to mention",
+    description='Gợi ý thành viên có username bắt đầu bằng `prefix` khi tag trong activity',
+    status_code=HTTP_200_OK,
+    responses=open_api_standard_responses(
+        success_status_code=HTTP_200_OK,
+        success_response_model=ResponseData[List[MentionSuggestResponse]],
+        fail_response_model=FailResponse
+    )
+)
+async def suggest_mention(
+        group_profile_id: str = Path(...),
+        prefix: str = Query("", description="phần username đã gõ sau @, ko phân biệt hoa thường"),
+        limit: int = Query(MENTION_SUGGEST_LIMIT, ge=1, le=MENTION_SUGGEST_MAX_LIMIT),
+        watcher: dict = Depends(get_current_user),
+        redis: Redis = Depends(redis_pool)
+):
+    # index đã có thì trả lời chỉ bằng redis, ko query mongo
+    suggestions = await get_mention_suggestions(redis, group_profile_id, prefix, limit)
+    if suggestions is None:
+        group_profile = await get_group_profile(redis, group_profile_id)
+        if group_profile is None:
+            return http_exception(description=f"group_profile_id = {group_profile_id} does not exist")
+
+        await build_mention_index(redis, group_profile_id, group_profile)
+        suggestions = await get_mention_suggestions(redis, group_profile_id, prefix, limit) or []
+
+    return ResponseData[List[MentionSuggestResponse]](**{"data": suggestions})
@@ -1,9 +1,12 @@
-from typing import List
+from typing import List, Optional
 
 from bson import ObjectId
 from pydantic import BaseModel, Field
 
 from app.api.v1.endpoints.activity.schema import WatcherDocument
+from app.library.constant.notification import (
+    NOTIFICATION_READ_MAX_IDS, NOTIFICATION_WARM_MAX_IDS
+)
 from app.model.base import Base, PyObjectId
 
 
@@ -44,5 +47,48 @@ class UpdateNotificationRequest(BaseModel):
     watcher_id: str = Field(..., description='id watcher')
 
 
+class ReadNotificationsRequest(BaseModel):
+    watcher_id: str = Field(..., description='id watcher')
+    notification_ids: List[str] = Field(
+        ..., min_items=1, max_items=NOTIFICATION_READ_MAX_IDS, description='Danh sách id notification cần đánh dấu đã đọc'
+    )
+
+
+class ReadAllNotificationRequest(BaseModel):
+    watcher_id: str = Field(..., description='id watcher')
+    last_notification_id: Optional[str] = Field(
+        None, description='id notification mới nhất client đã load, null để đánh dấu tất cả'
+    )
+
+
+class ReadNotificationResponse(BaseModel):
+    number_updated: int = Field(..., description='Số notification được chuyển sang đã đọc')
+    number_notification: int = Field(..., description="Số lượng thông báo mới ( chưa đọc ) còn lại")
+
+
 class NumberNotificationResponse(BaseModel):
     number_notification: int = Field(..., description="Số lượng thông báo mới ( chưa đọc ) ")
+
+
+class WarmNumberNotificationRequest(BaseModel):
+    watcher_ids: List[str] = Field(
+        ..., min_items=1, max_items=NOTIFICATION_WARM_MAX_IDS, description='Danh sách watcher cần tính trước số thông báo chưa đọc'
+    )
+
+
+class WatcherNumberNotificationResponse(BaseModel):
+    watcher_id: str = Field(..., description='id watcher')
+    number_notification: int = Field(..., description="Số lượng thông báo mới ( chưa đọc ) ")
+
+
+class BroadcastJobResponse(Base):
+    id: PyObjectId = Field(..., alias="_id")
+    notification_id: PyObjectId = Field(..., description='id của notification được gửi')
+    status: str = Field(..., description='`pending`, `running`, `done`, `failed`')
+    total: int = Field(..., description='Số watcher ước tính tại thời điểm tạo job')
+    processed: int = Field(..., description='Số watcher đã được gửi thông báo')
+    error: Optional[str] = Field(None, description='Lỗi của lần chạy gần nhất')
+
+    class Config:
+        allow_population_by_field_name = True
+        json_encoders = {ObjectId: str}
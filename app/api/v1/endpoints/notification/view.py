@@ -3,23 +3,43 @@ from typing import List
 
 from aioredis import Redis
 from fastapi import APIRouter, Depends, Path, Query
-from pymongo import ReturnDocument
-from starlette.status import HTTP_200_OK
+from starlette.status import HTTP_200_OK, HTTP_202_ACCEPTED
 
 from app.api.v1.dependency.authentication import (
     EXPIRES_TIME, get_current_user, get_system
 )
 from app.api.v1.endpoints.notification.schema import (
-    CreateNotificationResponse, NotificationRequest, NotificationResponse,
-    NumberNotificationResponse, UpdateNotificationRequest
+    BroadcastJobResponse, CreateNotificationResponse, NotificationRequest,
+    NotificationResponse, NumberNotificationResponse,
+    ReadAllNotificationRequest, ReadNotificationResponse,
+    ReadNotificationsRequest, UpdateNotificationRequest,
+    WarmNumberNotificationRequest, WatcherNumberNotificationResponse
 )
 from app.api.v1.setting.function import (
     http_exception, open_api_standard_responses
 )
-from app.library.function import (
-    convert_str_to_int, is_valid_object_id, paging_aggregation
+from app.library.broadcast import (
+    build_broadcast_fan_out_job, create_broadcast_job
 )
-from app.model.base import FailResponse, ResponseData, db
+from app.library.constant.broadcast import BROADCAST_JOB_COLLECTION
+from app.library.constant.function import PAGING_LIMIT, PAGING_MAX_LIMIT
+from app.library.constant.push import PUSH_TYPE_COUNTER
+from app.library.fan_out import dispatch_fan_out
+from app.library.fast_json import make_response
+from app.library.function import convert_str_to_int, is_valid_object_id
+from app.library.notification_counter import (
+    incr_online_counters, set_counters, set_online_counter
+)
+from app.library.notification_storage import (
+    count_unread_notification, count_unread_notification_of_watchers,
+    get_notification_page_of_watcher, insert_notifications,
+    mark_all_notifications_as_read, mark_notification_as_read,
+    mark_notifications_as_read
+)
+from app.library.push import (
+    publish, publish_counter_deltas, publish_notifications
+)
+from app.model.base import FailResponse, PagingResponseData, ResponseData, db
 from app.model.redis import redis_pool
 
 router = APIRouter()
@@ -32,12 +52,13 @@ router = APIRouter()
     status_code=HTTP_200_OK,
     responses=open_api_standard_responses(
         success_status_code=HTTP_200_OK,
-        success_response_model=ResponseData[List[NotificationResponse]],
+        success_response_model=PagingResponseData[List[NotificationResponse]],
         fail_response_model=FailResponse
     )
 )
 async def get_all_notification_of_watcher(
-        last_notification_id: str = Query(None, description="last id of list notification"),
+        last_notification_id: str = Query(None, description="`next_cursor` or `prev_cursor` of previous page"),
+        limit: int = Query(PAGING_LIMIT, ge=1, description=f"number of notification per page, max {PAGING_MAX_LIMIT}"),
         watcher_id: str = Query(..., description="id watcher"),
         system_name: dict = Depends(get_system),
 ):
@@ -45,44 +66,85 @@ async def get_all_notification_of_watcher(
     if watcher is None:
         return http_exception(description=f"watcher_id = {watcher_id} is not exist")
 
-    notification_cursor = paging_aggregation(
-        query_param_for_paging=last_notification_id,
-        database_name="notification",
-        key_query="watcher_noti_status.watcher_id",
-        value_query=watcher['watcher_id'],
-        db=db,
-        foreign_table='watcher',
-        local_field="watcher_created_activity",
-        foreign_field="watcher_id",
-        show_value={
-            "_id": 1,
-            "content": 1,
-            "created_by": 1,
-            "updated_by": 1,
-            "created_at": 1,
-            "updated_at": 1,
-            "watcher_document": 1,
-            "watcher_noti_status": {
-                "$filter": {
-                    "input": "$watcher_noti_status",
-                    "as": "watcher_noti_status",
-                    "cond": {
-                        "$eq": ["$$watcher_noti_status.watcher_id", watcher['watcher_id']]
-                    }
-                }
-            }
-        },
-        sort=-1
-    )
-
-    list_notification = await notification_cursor.to_list(None)
+    page = await get_notification_page_of_watcher(watcher['watcher_id'], last_notification_id, limit)
 
-    for notification in list_notification:
+    for notification in page['data']:
         notification['watcher_created_activity_document'] = \
             notification['watcher_document'][0] if notification['watcher_document'] else None
         notification['watcher_noti_status'] = \
             notification['watcher_noti_status'][0] if notification['watcher_noti_status'] else None
-    return ResponseData[List[NotificationResponse]](**{"data": list_notification})
+    return make_response(PagingResponseData[List[NotificationResponse]], page)
+
+
+async def read_notifications_response(redis: Redis, watcher_id: str, number_updated: int) -> dict:
+    # đếm lại trên mongo rồi ghi đè counter nên counter luôn khớp dù trước đó bị lệch
+    number_notification = await count_unread_notification(watcher_id)
+    await set_online_counter(redis, watcher_id, number_notification)
+    if number_updated:
+        await publish(
+            redis,
+            PUSH_TYPE_COUNTER,
+            {"delta": -number_updated, "number_notification": number_notification},
+            [watcher_id]
+        )
+    return {"number_updated": number_updated, "number_notification": number_notification}
+
+
+# route cố định phải khai báo trước /notification/{notification_id}
+@router.patch(
+    path="/notification/read",
+    name="notification: update status of many notifications",
+    description='Đánh dấu đã đọc nhiều notification của watcher trong 1 request',
+    status_code=HTTP_200_OK,
+    responses=open_api_standard_responses(
+        success_status_code=HTTP_200_OK,
+        success_response_model=ResponseData[ReadNotificationResponse],
+        fail_response_model=FailResponse
+    )
+)
+async def read_notifications(
+        read_request: ReadNotificationsRequest,
+        system_name: dict = Depends(get_system),
+        redis: Redis = Depends(redis_pool)
+):
+    watcher = await db.watcher.find_one({"watcher_id": read_request.watcher_id}, {'watcher_id': 1, '_id': 0})
+    if watcher is None:
+        return http_exception(description=f"watcher_id = {read_request.watcher_id} is not exist")
+
+    notification_ids = list({is_valid_object_id(notification_id) for notification_id in read_request.notification_ids})
+    number_updated = await mark_notifications_as_read(watcher['watcher_id'], notification_ids)
+
+    data = await read_notifications_response(redis, watcher['watcher_id'], number_updated)
+    return ResponseData[ReadNotificationResponse](**{"data": data})
+
+
+@router.patch(
+    path="/notification/read-all",
+    name="notification: update status of all notifications",
+    description='Đánh dấu đã đọc tất cả notification của watcher tới `last_notification_id`',
+    status_code=HTTP_200_OK,
+    responses=open_api_standard_responses(
+        success_status_code=HTTP_200_OK,
+        success_response_model=ResponseData[ReadNotificationResponse],
+        fail_response_model=FailResponse
+    )
+)
+async def read_all_notification(
+        read_request: ReadAllNotificationRequest,
+        system_name: dict = Depends(get_system),
+        redis: Redis = Depends(redis_pool)
+):
+    watcher = await db.watcher.find_one({"watcher_id": read_request.watcher_id}, {'watcher_id': 1, '_id': 0})
+    if watcher is None:
+        return http_exception(description=f"watcher_id = {read_request.watcher_id} is not exist")
+
+    last_notification_id = None
+    if read_request.last_notification_id:
+        last_notification_id = is_valid_object_id(read_request.last_notification_id)
+    number_updated = await mark_all_notifications_as_read(watcher['watcher_id'], last_notification_id)
+
+    data = await read_notifications_response(redis, watcher['watcher_id'], number_updated)
+    return ResponseData[ReadNotificationResponse](**{"data": data})
 
 
 @router.patch(
@@ -107,37 +169,7 @@ async def update_status_noti(
 
     object_id = is_valid_object_id(notification_id)
 
-    notification = await db.notification.find_one_and_update(
-        {
-            "_id": object_id,
-            "watcher_noti_status": {
-                "$elemMatch": {
-                    "watcher_id": watcher['watcher_id'],
-                    "status": False
-                }
-            }
-        },
-        {
-            "$set": {
-                'watcher_noti_status.$.status': True
-            }
-        },
-        return_document=ReturnDocument.AFTER,
-        projection={
-            "_id": 1,
-            "content": 1,
-            "created_by": 1,
-            "updated_by": 1,
-            "created_at": 1,
-            "updated_at": 1,
-            "watcher_created_activity": 1,
-            "watcher_noti_status": {
-                "$elemMatch": {
-                    "watcher_id": watcher['watcher_id']
-                }
-            }
-        }
-    )
+    notification = await mark_notification_as_read(object_id, watcher['watcher_id'])
 
     if notification is None:
         return http_exception(
@@ -164,6 +196,7 @@ async def update_status_noti(
         return http_exception(description=f"cache of watcher_id = {watcher['watcher_id']} is not exist")
     if convert_str_to_int(number_noti_not_read) >= 1:
         await redis.decr(watcher['watcher_id'])
+        await publish_counter_deltas(redis, {watcher['watcher_id']: -1})
 
     return ResponseData[NotificationResponse](**{"data": notification})
 
@@ -202,21 +235,69 @@ async def create_notification(
         } for watcher in watchers
     ]
     notification_request['watcher_noti_status'] = watcher_noti_status
-    await db.notification.insert_one(notification_request)
-
-    # watcher_id__new_number_noti = {}
+    await insert_notifications([notification_request])
 
     watcher_ids = [watcher['watcher_id'] for watcher in watchers]
-
-    number_noti_not_reads = await redis.mget(watcher_ids)
-    for index, watcher_id in enumerate(watcher_ids):
-        value_number_noti = number_noti_not_reads[index]
-        if value_number_noti:
-            await redis.incr(watcher_id)
+    await incr_online_counters(redis, watcher_ids)
+    await publish_notifications(redis, [notification_request], broadcast=True)
+    await publish(redis, PUSH_TYPE_COUNTER, {"delta": 1})
 
     return ResponseData[CreateNotificationResponse](**{"data": notification_request})
 
 
+@router.post(
+    path="/notification/broadcast/",
+    name="notification: Create broadcast notification job",
+    description='Gửi thông báo tới tất cả watcher theo từng batch, trả về job để theo dõi tiến độ',
+    status_code=HTTP_202_ACCEPTED,
+    responses=open_api_standard_responses(
+        success_status_code=HTTP_202_ACCEPTED,
+        success_response_model=ResponseData[BroadcastJobResponse],
+        fail_response_model=FailResponse
+    )
+)
+async def create_broadcast_notification(
+        notification_request: NotificationRequest,
+        system_name: str = Depends(get_system),
+        redis: Redis = Depends(redis_pool)
+):
+    notification_request = notification_request.dict()
+    notification_request['created_by'] = system_name
+    notification_request['created_at'] = datetime.now()
+    notification_request['updated_by'] = system_name
+    notification_request['updated_at'] = datetime.now()
+    notification_request['watcher_created_activity'] = None
+
+    broadcast_job = await create_broadcast_job(notification_request, system_name)
+    await dispatch_fan_out(redis, build_broadcast_fan_out_job(broadcast_job))
+
+    return ResponseData[BroadcastJobResponse](**{"data": broadcast_job})
+
+
+@router.get(
+    path="/notification/broadcast/{broadcast_job_id}",
+    name="notification: Get broadcast notification job",
+    description='Tiến độ gửi thông báo tới tất cả watcher',
+    status_code=HTTP_200_OK,
+    responses=open_api_standard_responses(
+        success_status_code=HTTP_200_OK,
+        success_response_model=ResponseData[BroadcastJobResponse],
+        fail_response_model=FailResponse
+    )
+)
+async def get_broadcast_notification(
+        broadcast_job_id: str = Path(..., description="id of broadcast job"),
+        system_name: str = Depends(get_system)
+):
+    broadcast_job = await db[BROADCAST_JOB_COLLECTION].find_one(
+        {"_id": is_valid_object_id(broadcast_job_id), "created_by": system_name}
+    )
+    if broadcast_job is None:
+        return http_exception(description=f"broadcast_job_id = {broadcast_job_id} does not exist")
+
+    return ResponseData[BroadcastJobResponse](**{"data": broadcast_job})
+
+
 @router.get(
     path="/notification/number/",
     name="notification: Get number notification not read",
@@ -234,17 +315,7 @@ async def get_number_notification(
 ):
     number_notification = await redis.get(watcher['watcher_id'])
     if number_notification is None:
-        notification_of_watcher_cursor = db.notification.find({
-            "watcher_noti_status": {
-                "$elemMatch": {
-                    "watcher_id": watcher['watcher_id'],
-                    "status": False
-                }
-            }
-        },
-        )
-        notification_of_watcher = await notification_of_watcher_cursor.to_list(None)
-        number_notification = len(notification_of_watcher)
+        number_notification = await count_unread_notification(watcher['watcher_id'])
         # khi watcher online thì lưu số lượng thông báo vào redis và chỉ set thời gian ở đây
         # những chỗ khác ko được đụng tới thời gian sống của redis
         await redis.setex(watcher['watcher_id'], EXPIRES_TIME * 60, number_notification)
@@ -253,3 +324,30 @@ async def get_number_notification(
     name__number_noti = {"number_notification": number_notification}
 
     return ResponseData[NumberNotificationResponse](**{"data": name__number_noti})
+
+
+@router.post(
+    path="/notification/number/warm/",
+    name="notification: Warm number notification not read of watchers",
+    description='Tính trước số thông báo chưa đọc của nhiều watcher và lưu vào redis',
+    status_code=HTTP_200_OK,
+    responses=open_api_standard_responses(
+        success_status_code=HTTP_200_OK,
+        success_response_model=ResponseData[List[WatcherNumberNotificationResponse]],
+        fail_response_model=FailResponse
+    )
+)
+async def warm_number_notification(
+        warm_request: WarmNumberNotificationRequest,
+        system_name: str = Depends(get_system),
+        redis: Redis = Depends(redis_pool)
+):
+    watcher_ids = list(dict.fromkeys(warm_request.watcher_ids))
+    watcher_id__number = await count_unread_notification_of_watchers(watcher_ids)
+    await set_counters(redis, watcher_id__number, EXPIRES_TIME * 60)
+
+    data = [
+        {"watcher_id": watcher_id, "number_notification": number}
+        for watcher_id, number in watcher_id__number.items()
+    ]
+    return ResponseData[List[WatcherNumberNotificationResponse]](**{"data": data})
@@ -0,0 +1,5 @@
+from fastapi import APIRouter
+from app.api.v1.endpoints.push import view as push_view
+router = APIRouter()
+
+router.include_router(router=push_view.router)
@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+from fastapi import (
+    APIRouter, Depends, Query, Request, WebSocket, WebSocketDisconnect
+)
+from fastapi.responses import StreamingResponse
+from starlette.status import (
+    HTTP_200_OK, HTTP_503_SERVICE_UNAVAILABLE, WS_1008_POLICY_VIOLATION,
+    WS_1013_TRY_AGAIN_LATER
+)
+
+from app.api.v1.dependency.authentication import (
+    decode_watcher_id, get_current_user, get_watcher_by_id
+)
+from app.api.v1.setting.function import (
+    http_exception, open_api_standard_responses
+)
+from app.library.constant.push import PUSH_HEARTBEAT_INTERVAL, PUSH_TYPE_PING
+from app.library.push import push_hub
+from app.model.base import FailResponse
+
+router = APIRouter()
+
+
+async def next_message(queue: asyncio.Queue) -> dict:
+    try:
+        return await asyncio.wait_for(queue.get(), timeout=PUSH_HEARTBEAT_INTERVAL)
+    except asyncio.TimeoutError:
+        return {"type": PUSH_TYPE_PING, "data": None}
+
+
+@router.websocket(path="/push/ws")
+async def push_websocket(
+        websocket: WebSocket,
+        token: str = Query(..., description="token lấy từ api generate-token")
+):
+    watcher_id = decode_watcher_id(token)
+    watcher = await get_watcher_by_id(watcher_id) if watcher_id else None
+    if watcher is None:
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return
+
+    queue = push_hub.connect(watcher['watcher_id'])
+    if queue is None:
+        await websocket.close(code=WS_1013_TRY_AGAIN_LATER)
+        return
+
+    await websocket.accept()
+
+    async def send():
+        while True:
+            await websocket.send_text(json.dumps(await next_message(queue)))
+
+    async def receive():
+        # client ko cần gửi gì, chỉ đọc để biết khi nào client đóng kết nối
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            # lỗi khi gửi do client đã đóng kết nối thì bỏ qua
+            task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        push_hub.disconnect(watcher['watcher_id'], queue)
+
+
+@router.get(
+    path="/push/sse/",
+    name="push: Server-Sent Events of watcher",
+    description='Nhận số thông báo thay đổi và thông báo mới qua Server-Sent Events',
+    status_code=HTTP_200_OK,
+    responses=open_api_standard_responses(
+        success_status_code=HTTP_200_OK,
+        success_content_type="text/event-stream",
+        fail_response_model=FailResponse
+    )
+)
+async def push_sse(
+        request: Request,
+        watcher: dict = Depends(get_current_user)
+):
+    queue = push_hub.connect(watcher['watcher_id'])
+    if queue is None:
+        return http_exception(status_code=HTTP_503_SERVICE_UNAVAILABLE, description="too many push connections")
+
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                message = await next_message(queue)
+                if message['type'] == PUSH_TYPE_PING:
+                    yield ": ping\n\n"
+                else:
+                    yield f"event: {message['type']}\ndata: {json.dumps(message['data'])}\n\n"
+        finally:
+            push_hub.disconnect(watcher['watcher_id'], queue)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -4,6 +4,7 @@ from app.api.v1.endpoints.notification import router as routers_test
 from app.api.v1.endpoints.group_profile import router as routers_group
 from app.api.v1.endpoints.watcher import router as routers_watcher
 from app.api.v1.endpoints.activity import router as routers_activity
+from app.api.v1.endpoints.push import router as routers_push
 
 router = APIRouter()
 
@@ -11,6 +12,7 @@ router.include_router(router=routers_test.router, tags=["[NOTIFICATION]"])
 router.include_router(router=routers_watcher.router, tags=["[WATCHER]"])
 router.include_router(router=routers_group.router, tags=["[GROUP_PROFILE]"])
 router.include_router(router=routers_activity.router, tags=["[ACTIVITY]"])
+router.include_router(router=routers_push.router, tags=["[PUSH]"])
 
 
 
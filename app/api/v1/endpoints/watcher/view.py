@@ -1,12 +1,13 @@
 from datetime import datetime
 from typing import List
 
+from aioredis import Redis
 from fastapi import APIRouter, Depends, Path, Query
 from fastapi.encoders import jsonable_encoder
 from starlette.status import HTTP_200_OK, HTTP_201_CREATED
 
 from app.api.v1.dependency.authentication import (
-    create_access_token, get_system
+    create_access_token, current_user_cache, get_system
 )
 from app.api.v1.endpoints.watcher.schema import (
     DeleteWacherRequest, UserTokenResponse, WatcherIdRequest,
@@ -15,8 +16,13 @@ from app.api.v1.endpoints.watcher.schema import (
 from app.api.v1.setting.function import (
     http_exception, open_api_standard_responses
 )
-from app.library.function import paging
-from app.model.base import FailResponse, ResponseData, db
+from app.library.constant.function import PAGING_LIMIT, PAGING_MAX_LIMIT
+from app.library.fast_json import make_response
+from app.library.group_member import get_member_page, is_watcher_in_any_group
+from app.library.group_profile_cache import get_group_profile
+from app.library.mention import cache_usernames, invalidate_usernames
+from app.model.base import FailResponse, PagingResponseData, ResponseData, db
+from app.model.redis import redis_pool
 
 router = APIRouter()
 
@@ -48,6 +54,7 @@ async def create_watcher(
     if exist_watcher:
         return http_exception(description="watcher is already exist")
     await db.watcher.insert_one(watcher)
+    cache_usernames([watcher])
     return ResponseData[WatcherResponseSchema](**{"data": watcher})
 
 
@@ -84,6 +91,7 @@ async def create_multi_watcher(
         watcher["updated_at"] = datetime.now()
 
     await db.watcher.insert_many(watchers)
+    cache_usernames(watchers)
     return ResponseData[list[WatcherResponseSchema]](**{"data": watchers})
 
 
@@ -98,16 +106,17 @@ async def create_multi_watcher(
 )
 async def delete_watcher(
         watcher_id: str = Path(...),
-        system_name: str = Depends(get_system)
+        system_name: str = Depends(get_system),
+        redis: Redis = Depends(redis_pool)
 ):
-    cursor = db.group_profile.find({"watcher_ids": {"$elemMatch": {"$eq": watcher_id}}})
-    watcher_in_profile = await cursor.to_list(None)
-    if watcher_in_profile:
+    if await is_watcher_in_any_group(watcher_id):
         return http_exception(description="Can't delete this watcher because watcher is in group profile")
 
     data = await db.watcher.find_one_and_delete({"watcher_id": watcher_id})
     if data is None:
         return http_exception(description=f"{watcher_id} is not exist")
+    current_user_cache.delete(watcher_id)
+    await invalidate_usernames(redis, [data['username']])
 
     return None
 
@@ -123,7 +132,8 @@ async def delete_watcher(
 )
 async def delete_multi_watcher(
         list_watcher_id: DeleteWacherRequest,
-        system_name: str = Depends(get_system)
+        system_name: str = Depends(get_system),
+        redis: Redis = Depends(redis_pool)
 ):
     list_watcher_id = jsonable_encoder(list_watcher_id)
 
@@ -133,13 +143,15 @@ async def delete_multi_watcher(
     not_exist_watcher_id = []
 
     if len(exist_watchers) != len(list_watcher_id['list_watcher_id']):
-        exist_watchers = [exist_watcher['watcher_id'] for exist_watcher in exist_watchers]
+        exist_watchers = {exist_watcher['watcher_id'] for exist_watcher in exist_watchers}
         for watcher in list_watcher_id['list_watcher_id']:
             if watcher not in exist_watchers:
                 not_exist_watcher_id.append(watcher)
         return http_exception(description=f"watcher_ids = {not_exist_watcher_id} are not exist")
 
     await db.watcher.delete_many({"watcher_id": {"$in": list_watcher_id['list_watcher_id']}})
+    current_user_cache.delete_many(list_watcher_id['list_watcher_id'])
+    await invalidate_usernames(redis, [exist_watcher['username'] for exist_watcher in exist_watchers])
 
     return None
 
@@ -193,29 +205,20 @@ async def generate_token(
     status_code=HTTP_200_OK,
     responses=open_api_standard_responses(
         success_status_code=HTTP_200_OK,
-        success_response_model=ResponseData[List[WatcherResponseSchema]],
+        success_response_model=PagingResponseData[List[WatcherResponseSchema]],
         fail_response_model=FailResponse),
 )
 async def get_all_watchers_of_group(
         group_profile_id: str = Path(...),
-        last_watcher_id: str = Query(None, description="last _id of watcher in list"),
-        system_name: str = Depends(get_system)
+        last_watcher_id: str = Query(None, description="`next_cursor` or `prev_cursor` of previous page"),
+        limit: int = Query(PAGING_LIMIT, ge=1, description=f"number of watcher per page, max {PAGING_MAX_LIMIT}"),
+        system_name: str = Depends(get_system),
+        redis: Redis = Depends(redis_pool)
 ):
-    group_profile = await db.group_profile.find_one({"group_profile_id": group_profile_id, 'created_by': system_name})
+    group_profile = await get_group_profile(redis, group_profile_id, system_name)
     if not group_profile:
         return http_exception(description=f'group_profile_id = {group_profile_id} is not exist')
 
-    if group_profile['watcher_ids'] is None:
-        return http_exception(description='group_profile does not have member')
-
-    # watchers_cursor = db.watcher.find({"watcher_id": {"$in": group_profile['watcher_ids']}})
-    watchers_cursor = paging(
-        query_param_for_paging=last_watcher_id,
-        database_name="watcher",
-        key_query="watcher_id",
-        value_query={"$in": group_profile['watcher_ids']},
-        db=db,
-        sort=1)
-    watchers = await watchers_cursor.to_list(None)
+    page = await get_member_page(group_profile, last_watcher_id, limit)
 
-    return ResponseData[list[WatcherResponseSchema]](**{"data": watchers})
+    return make_response(PagingResponseData[List[WatcherResponseSchema]], page)
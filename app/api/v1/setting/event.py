@@ -3,18 +3,43 @@ from typing import Callable
 from fastapi import FastAPI
 from loguru import logger
 
+from app.library.constant.database import MONGO_INDEX_CHECK
+from app.library.constant.fan_out import (
+    FAN_OUT_LOCAL_WORKER, FAN_OUT_MODE, FAN_OUT_MODE_QUEUE
+)
+from app.library.fan_out import fan_out_worker
+from app.library.push import push_hub
 from app.library.service_file import ServiceFile
+from app.library.thumbnail import ThumbnailService
+from app.model.index import check_query_plans, create_indexes
+from app.model.redis import redis_client
 
 service_file = ServiceFile()
+thumbnail_service = ThumbnailService(service_file)
+
+
 def create_start_app_handler(app: FastAPI) -> Callable:  # noqa
     async def startup_event():
         service_file.start_session()
+        thumbnail_service.start()
+        redis_client.start_pool()
+        push_hub.start(redis_client.redis)
+        if FAN_OUT_MODE == FAN_OUT_MODE_QUEUE and FAN_OUT_LOCAL_WORKER:
+            fan_out_worker.start(redis_client.redis)
+        logger.info(f"redis pool started: {redis_client.metrics()}")
+        await create_indexes()
+        if MONGO_INDEX_CHECK:
+            await check_query_plans()
 
     return startup_event
 
 
 def create_stop_app_handler(app: FastAPI) -> Callable:  # noqa
     async def shutdown_event():
+        await thumbnail_service.stop()
         await service_file.close_session()
+        await fan_out_worker.stop()
+        await push_hub.stop()
+        await redis_client.close_pool()
 
     return shutdown_event
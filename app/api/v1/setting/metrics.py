@@ -0,0 +1,47 @@
+from fastapi.responses import PlainTextResponse
+
+from app.api.v1.dependency.authentication import current_user_cache
+from app.api.v1.setting.event import service_file, thumbnail_service
+from app.library.circuit_breaker import CIRCUIT_STATE_OPEN
+from app.library.group_profile_cache import group_profile_cache
+from app.library.mention import username_cache
+from app.library.metrics import Gauge, render_metrics
+from app.library.push import push_hub
+from app.model.redis import redis_client
+
+# các thành phần đã tự đếm sẵn, chỉ đọc lại giá trị mỗi lần xuất /metrics
+
+REDIS_POOL_CONNECTIONS = Gauge(
+    "redis_pool_connections", "Số connection của redis pool", label_names=("state",),
+    function=lambda: {(state,): number for state, number in redis_client.metrics().items()}
+)
+
+PUSH_HUB = Gauge(
+    "push_hub", "Kết nối websocket/sse và số message bị bỏ do client đọc chậm", label_names=("name",),
+    function=lambda: {(name,): number for name, number in push_hub.metrics().items()}
+)
+
+CACHE = Gauge(
+    "cache", "Số phần tử, số lần hit/miss của cache trong process", label_names=("cache", "name"),
+    function=lambda: {
+        (cache_name, name): number
+        for cache_name, cache in (
+            ("current_user", current_user_cache), ("username", username_cache), ("group_profile", group_profile_cache)
+        )
+        for name, number in cache.metrics().items()
+    }
+)
+
+THUMBNAIL = Gauge(
+    "thumbnail", "Số file đang chờ tạo thumbnail và số file bị bỏ qua do queue đầy", label_names=("name",),
+    function=lambda: {(name,): number for name, number in thumbnail_service.metrics().items()}
+)
+
+SERVICE_FILE_CIRCUIT_OPEN = Gauge(
+    "service_file_circuit_open", "1 khi circuit breaker của service file đang ngắt",
+    function=lambda: {(): int(service_file.circuit_breaker.state == CIRCUIT_STATE_OPEN)}
+)
+
+
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
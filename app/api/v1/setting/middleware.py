@@ -0,0 +1,69 @@
+import time
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.library.metrics import Gauge, Histogram
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "Thời gian xử lý 1 request theo route", label_names=("method", "route", "status")
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Số request đang xử lý", label_names=("method",)
+)
+
+# path ko khớp route nào gom chung 1 label để số series ko tăng theo path lạ
+UNMATCHED_ROUTE = "unmatched"
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware ghi thời gian xử lý request theo route template ( vd: /api/v1/{group_profile_id}/activity/ ),
+    ko dùng BaseHTTPMiddleware vì nó đọc lại body của response và làm hỏng response dạng stream ( SSE ).
+    Thời gian tính tới khi bắt đầu trả response ( http.response.start ) nên kết nối stream ( /push/sse/ )
+    ko bị tính cả thời gian client giữ kết nối
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        start_time = time.perf_counter()
+        is_observed = False
+
+        def observe() -> None:
+            nonlocal is_observed
+            if is_observed:
+                return
+            is_observed = True
+            HTTP_REQUESTS_IN_PROGRESS.dec(1, method)
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start_time, method, get_route_path(scope), str(status_code)
+            )
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                observe()
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc(1, method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # lỗi trước khi trả response
+            observe()
+
+
+def get_route_path(scope: Scope) -> str:
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED_ROUTE
@@ -0,0 +1,17 @@
+"""
+Tạo index theo INDEX_MANIFEST rồi kiểm tra query plan, exit code khác 0 nếu có COLLSCAN
+
+Chạy: python -m app.command.check_mongo_index
+"""
+import asyncio
+
+from app.model.index import check_query_plans, create_indexes
+
+
+async def check():
+    await create_indexes()
+    await check_query_plans()
+
+
+if __name__ == "__main__":
+    asyncio.run(check())
@@ -0,0 +1,56 @@
+"""
+Bỏ mảng group_profile.activity_ids, thay bằng activity_count, last_activity_id, last_activity_at
+
+Chạy: python -m app.command.compact_group_profile_activity
+Có thể chạy lại nhiều lần, group_profile đã compact sẽ không còn field activity_ids
+"""
+import asyncio
+
+from loguru import logger
+from pymongo import UpdateOne
+
+from app.model.base import PyObjectId, db
+
+COMPACT_BATCH_SIZE = 500
+
+
+async def build_compact_request(group_profile: dict) -> UpdateOne:
+    group_profile_id = group_profile['group_profile_id']
+    activity_count = await db.activity.count_documents({"group_profile_id": group_profile_id})
+    last_activity = await db.activity.find_one(
+        {"group_profile_id": group_profile_id}, {"_id": 1, "created_at": 1}, sort=[("_id", -1)]
+    )
+    return UpdateOne(
+        {"_id": group_profile['_id']},
+        {
+            "$set": {
+                "activity_count": activity_count,
+                "last_activity_id": PyObjectId.validate(last_activity['_id']) if last_activity else None,
+                "last_activity_at": last_activity['created_at'] if last_activity else None
+            },
+            "$unset": {"activity_ids": ""}
+        }
+    )
+
+
+async def compact():
+    cursor = db.group_profile.find({"activity_ids": {"$exists": True}}, {"group_profile_id": 1})
+
+    number_group_profile = 0
+    requests = []
+    async for group_profile in cursor:
+        requests.append(await build_compact_request(group_profile))
+        if len(requests) >= COMPACT_BATCH_SIZE:
+            await db.group_profile.bulk_write(requests, ordered=False)
+            number_group_profile += len(requests)
+            logger.info(f"compacted {number_group_profile} group profiles")
+            requests = []
+    if requests:
+        await db.group_profile.bulk_write(requests, ordered=False)
+        number_group_profile += len(requests)
+
+    logger.info(f"done: compacted {number_group_profile} group profiles")
+
+
+if __name__ == "__main__":
+    asyncio.run(compact())
@@ -0,0 +1,23 @@
+"""
+Worker gửi thông báo của activity, dùng khi FAN_OUT_MODE=queue và FAN_OUT_LOCAL_WORKER=False
+
+Chạy: python -m app.command.fan_out_worker
+"""
+import asyncio
+
+from app.library.fan_out import fan_out_worker
+from app.model.redis import redis_client
+
+
+async def run():
+    redis_client.start_pool()
+    try:
+        fan_out_worker.start(redis_client.redis)
+        await fan_out_worker.task
+    finally:
+        await fan_out_worker.stop()
+        await redis_client.close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,49 @@
+"""
+Chuyển thành viên trong mảng group_profile.watcher_ids sang collection group_member
+
+Chạy: python -m app.command.migrate_group_member
+Có thể chạy lại nhiều lần, group_profile đã migrate sẽ có watcher_ids rỗng
+"""
+import asyncio
+
+from loguru import logger
+
+from app.library.constant.group_member import (
+    GROUP_MEMBER_COLLECTION, GROUP_MEMBER_MIGRATE_BATCH_SIZE
+)
+from app.library.group_member import get_watchers, insert_member_rows
+from app.model.base import db
+
+
+async def migrate():
+    cursor = db.group_profile.find(
+        {"watcher_ids.0": {"$exists": True}}, {"group_profile_id": 1, "watcher_ids": 1}
+    ).batch_size(GROUP_MEMBER_MIGRATE_BATCH_SIZE)
+
+    number_group_profile = 0
+    number_member = 0
+    async for group_profile in cursor:
+        watchers, not_exist_watcher_id = await get_watchers(set(group_profile['watcher_ids']))
+        if not_exist_watcher_id:
+            logger.warning(f"group_profile_id = {group_profile['group_profile_id']} skip watcher_id = {not_exist_watcher_id}")
+
+        # unique index (group_profile_id, watcher_id) nên chạy lại ko bị nhân đôi
+        await insert_member_rows(group_profile['group_profile_id'], watchers)
+        member_count = await db[GROUP_MEMBER_COLLECTION].count_documents(
+            {"group_profile_id": group_profile['group_profile_id']}
+        )
+        await db.group_profile.update_one(
+            {"_id": group_profile['_id']},
+            {"$set": {"watcher_ids": [], "member_count": member_count}}
+        )
+
+        number_group_profile += 1
+        number_member += len(watchers)
+        if number_group_profile % GROUP_MEMBER_MIGRATE_BATCH_SIZE == 0:
+            logger.info(f"migrated {number_group_profile} group profiles, {number_member} members")
+
+    logger.info(f"done: migrated {number_group_profile} group profiles, {number_member} members")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
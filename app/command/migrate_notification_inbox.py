@@ -0,0 +1,63 @@
+"""
+Chuyển trạng thái đọc trong mảng notification.watcher_noti_status sang collection notification_inbox
+
+Chạy: python -m app.command.migrate_notification_inbox
+Có thể chạy lại nhiều lần, notification đã migrate sẽ không còn field watcher_noti_status
+"""
+import asyncio
+
+from loguru import logger
+from pymongo import UpdateOne
+
+from app.library.constant.notification import (
+    NOTIFICATION_INBOX_COLLECTION, NOTIFICATION_INBOX_MIGRATE_BATCH_SIZE
+)
+from app.library.notification_storage import build_inbox_rows
+from app.model.base import db
+
+
+async def migrate_batch(notifications: list) -> int:
+    requests = []
+    for notification in notifications:
+        for inbox_row in build_inbox_rows(notification, notification['watcher_noti_status']):
+            # upsert theo (notification_id, watcher_id) để chạy lại ko bị nhân đôi dữ liệu
+            requests.append(UpdateOne(
+                {"notification_id": inbox_row['notification_id'], "watcher_id": inbox_row['watcher_id']},
+                {"$setOnInsert": inbox_row},
+                upsert=True
+            ))
+    if requests:
+        await db[NOTIFICATION_INBOX_COLLECTION].bulk_write(requests, ordered=False)
+
+    await db.notification.update_many(
+        {"_id": {"$in": [notification['_id'] for notification in notifications]}},
+        {"$unset": {"watcher_noti_status": ""}}
+    )
+    return len(requests)
+
+
+async def migrate():
+    cursor = db.notification.find(
+        {"watcher_noti_status": {"$exists": True}},
+        {"watcher_noti_status": 1, "created_at": 1, "updated_at": 1}
+    ).batch_size(NOTIFICATION_INBOX_MIGRATE_BATCH_SIZE)
+
+    number_notification = 0
+    number_inbox_row = 0
+    batch = []
+    async for notification in cursor:
+        batch.append(notification)
+        if len(batch) >= NOTIFICATION_INBOX_MIGRATE_BATCH_SIZE:
+            number_inbox_row += await migrate_batch(batch)
+            number_notification += len(batch)
+            logger.info(f"migrated {number_notification} notifications, {number_inbox_row} inbox rows")
+            batch = []
+    if batch:
+        number_inbox_row += await migrate_batch(batch)
+        number_notification += len(batch)
+
+    logger.info(f"done: migrated {number_notification} notifications, {number_inbox_row} inbox rows")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,118 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from app.api.v1.setting.function import http_exception
+from app.library.constant.activity import (
+    ACTIVITY_DAY_FORMAT, ACTIVITY_DAY_MAX_ACTIVITIES,
+    MONGO_INVALID_TIMEZONE_ERROR_CODES
+)
+from app.library.constant.function import PAGING_DIRECTION_NEXT
+from app.library.function import decode_cursor, encode_cursor
+from app.model.base import db
+
+# thời gian tạo lấy từ _id ( UTC ) thay vì created_at được lưu theo giờ của server
+CREATED_AT_EXPRESSION = {"$toDate": "$_id"}
+
+
+def date_part(operator: str, timezone: str) -> dict:
+    return {operator: {"date": CREATED_AT_EXPRESSION, "timezone": timezone}}
+
+
+def decode_day_cursor(cursor: Optional[str]) -> Optional[ObjectId]:
+    if not cursor:
+        return None
+    values, direction = decode_cursor(cursor)
+    if direction != PAGING_DIRECTION_NEXT or len(values) != 1 or not isinstance(values[0], ObjectId):
+        return http_exception(description='invalid cursor')
+    return values[0]
+
+
+async def aggregate(pipeline: list, timezone: str) -> list:
+    try:
+        return await db.activity.aggregate(pipeline).to_list(None)
+    except OperationFailure as error:
+        # chỉ lỗi do timezone client truyền vào mới trả về 400, lỗi khác của mongo vẫn raise
+        if error.code not in MONGO_INVALID_TIMEZONE_ERROR_CODES:
+            raise
+        return http_exception(description=f"timezone = {timezone} is invalid: {(error.details or {}).get('errmsg', error)}")
+
+
+async def get_activity_day_page(
+        group_profile_id: str,
+        timezone: str,
+        cursor: Optional[str],
+        days: int
+) -> Dict[str, Any]:
+    """
+    Activity của `days` ngày gần nhất ( trước cursor ) theo timezone của client, mongo chia theo ngày.
+    Cursor là _id nhỏ nhất đã trả về nên trang sau vẫn đi theo index ( group_profile_id, _id )
+    :return: {data: [{created_day, activities}], has_more, next_cursor, prev_cursor}
+    """
+    last_id = decode_day_cursor(cursor)
+    match = {"group_profile_id": group_profile_id}
+    if last_id is not None:
+        match["_id"] = {"$lt": last_id}
+
+    # thời điểm bắt đầu của ngày cũ nhất trong trang, tính từ activity mới nhất chưa trả về
+    rows = await aggregate([
+        {"$match": match},
+        {"$sort": {"_id": -1}},
+        {"$limit": 1},
+        {
+            "$project": {
+                "_id": 0,
+                "day_start": {
+                    "$dateFromParts": {
+                        "year": date_part("$year", timezone),
+                        "month": date_part("$month", timezone),
+                        # ngày <= 0 được mongo lùi sang tháng trước
+                        "day": {"$subtract": [date_part("$dayOfMonth", timezone), days - 1]},
+                        "timezone": timezone
+                    }
+                }
+            }
+        }
+    ], timezone)
+    if not rows:
+        return {"data": [], "has_more": False, "next_cursor": None, "prev_cursor": None}
+
+    first_id = ObjectId.from_datetime(rows[0]['day_start'])
+    match["_id"] = {**match.get("_id", {}), "$gte": first_id}
+    day_rows = await aggregate([
+        {"$match": match},
+        {"$sort": {"_id": -1}},
+        {"$limit": ACTIVITY_DAY_MAX_ACTIVITIES},
+        {
+            "$group": {
+                "_id": {"$dateToString": {"format": ACTIVITY_DAY_FORMAT, "date": CREATED_AT_EXPRESSION, "timezone": timezone}},
+                "activities": {"$push": "$$ROOT"},
+                "min_id": {"$min": "$_id"},
+                "count": {"$sum": 1}
+            }
+        },
+        {"$sort": {"_id": -1}}
+    ], timezone)
+
+    # trang bị cắt ở ACTIVITY_DAY_MAX_ACTIVITIES thì trang sau đọc tiếp từ activity cuối cùng đã trả về
+    if sum(row['count'] for row in day_rows) >= ACTIVITY_DAY_MAX_ACTIVITIES:
+        next_id = min(row['min_id'] for row in day_rows)
+    else:
+        next_id = first_id
+    has_more = await db.activity.find_one(
+        {"group_profile_id": group_profile_id, "_id": {"$lt": next_id}}, {"_id": 1}
+    ) is not None
+
+    return {
+        "data": [
+            {
+                "created_day": datetime.strptime(row['_id'], ACTIVITY_DAY_FORMAT).date(),
+                "activities": row['activities']
+            } for row in day_rows
+        ],
+        "has_more": has_more,
+        "next_cursor": encode_cursor([next_id], PAGING_DIRECTION_NEXT) if has_more else None,
+        "prev_cursor": None
+    }
@@ -0,0 +1,187 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from aioredis import Redis
+from bson import ObjectId
+from loguru import logger
+from pymongo import ReturnDocument
+
+from app.library.constant.broadcast import (
+    BROADCAST_BATCH_SIZE, BROADCAST_COUNTER_MARKER_PREFIX,
+    BROADCAST_COUNTER_MARKER_TTL, BROADCAST_JOB_COLLECTION,
+    BROADCAST_LEASE_SECONDS, BROADCAST_MAX_ATTEMPT, BROADCAST_STATUS_DONE,
+    BROADCAST_STATUS_FAILED, BROADCAST_STATUS_PENDING, BROADCAST_STATUS_RUNNING
+)
+from app.library.constant.fan_out import FAN_OUT_JOB_TYPE_BROADCAST
+from app.library.constant.push import PUSH_TYPE_COUNTER, PUSH_TYPE_NOTIFICATION
+from app.library.notification_counter import incr_online_counters
+from app.library.notification_storage import (
+    add_recipients, insert_notifications
+)
+from app.library.push import notification_push_data, publish
+from app.model.base import db
+
+
+class BroadcastLeaseLostError(Exception):
+    """
+    Job đã bị worker khác nhận lại do ko gia hạn kịp, lần chạy hiện tại phải dừng
+    """
+
+
+async def create_broadcast_job(notification: dict, system_name: str) -> dict:
+    """
+    Lưu nội dung thông báo chưa có người nhận và tạo job để gửi tới tất cả watcher theo từng batch
+    """
+    notification['watcher_noti_status'] = []
+    await insert_notifications([notification])
+
+    broadcast_job = {
+        "notification_id": notification['_id'],
+        "status": BROADCAST_STATUS_PENDING,
+        "total": await db.watcher.estimated_document_count(),
+        "processed": 0,
+        "last_watcher_object_id": None,
+        "error": None,
+        "attempt": 0,
+        "lease_owner": None,
+        "lease_until": None,
+        "created_by": system_name,
+        "updated_by": system_name,
+        "created_at": datetime.now(),
+        "updated_at": datetime.now()
+    }
+    await db[BROADCAST_JOB_COLLECTION].insert_one(broadcast_job)
+    return broadcast_job
+
+
+def build_broadcast_fan_out_job(broadcast_job: dict) -> dict:
+    return {
+        "type": FAN_OUT_JOB_TYPE_BROADCAST,
+        "idempotency_key": str(broadcast_job['_id']),
+        "broadcast_job_id": str(broadcast_job['_id'])
+    }
+
+
+def lease_until() -> datetime:
+    return datetime.now() + timedelta(seconds=BROADCAST_LEASE_SECONDS)
+
+
+async def claim_broadcast_job(broadcast_job_id: Optional[ObjectId] = None) -> Optional[dict]:
+    """
+    Nhận job chưa xong và ko có worker nào đang giữ ( chưa chạy, lỗi, hoặc đang chạy nhưng hết hạn ),
+    nên 1 job chỉ được 1 worker chạy tại 1 thời điểm
+    :param broadcast_job_id: None thì nhận job bất kỳ, dùng khi tìm job bị bỏ dở
+    """
+    query = {
+        "status": {"$ne": BROADCAST_STATUS_DONE},
+        # job tạo trước khi có field attempt cũng được nhận
+        "attempt": {"$not": {"$gte": BROADCAST_MAX_ATTEMPT}},
+        "$or": [
+            {"status": {"$in": [BROADCAST_STATUS_PENDING, BROADCAST_STATUS_FAILED]}},
+            {"lease_until": {"$lt": datetime.now()}}
+        ]
+    }
+    if broadcast_job_id is not None:
+        query["_id"] = broadcast_job_id
+    return await db[BROADCAST_JOB_COLLECTION].find_one_and_update(
+        query,
+        {
+            "$set": {
+                "status": BROADCAST_STATUS_RUNNING,
+                "error": None,
+                "lease_owner": uuid.uuid4().hex,
+                "lease_until": lease_until(),
+                "updated_at": datetime.now()
+            },
+            "$inc": {"attempt": 1}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def update_claimed_job(broadcast_job: dict, update: dict) -> None:
+    # chỉ cập nhật khi vẫn đang giữ job, nếu ko thì worker khác đã nhận lại
+    result = await db[BROADCAST_JOB_COLLECTION].update_one(
+        {"_id": broadcast_job['_id'], "lease_owner": broadcast_job['lease_owner']}, update
+    )
+    if not result.matched_count:
+        raise BroadcastLeaseLostError(f"broadcast job {broadcast_job['_id']} was claimed by another worker")
+
+
+async def process_broadcast_batch(redis: Redis, broadcast_job: dict, notification: dict, watchers: List[dict]):
+    watcher_ids = [watcher['watcher_id'] for watcher in watchers]
+    # batch chạy lại sau khi lỗi ( mất lease, lỗi khi lưu tiến độ, worker bị dừng ) được nhận diện theo vị trí
+    # đã lưu trước batch, nên ko thêm người nhận và ko tăng số thông báo chưa đọc lần nữa
+    batch_key = broadcast_job['last_watcher_object_id']
+    batch_notification = await add_recipients(notification, watcher_ids, batch_key)
+    await incr_online_counters(
+        redis, watcher_ids,
+        marker_key=f"{BROADCAST_COUNTER_MARKER_PREFIX}{broadcast_job['_id']}:{batch_key}",
+        marker_ttl=BROADCAST_COUNTER_MARKER_TTL
+    )
+
+    # lưu lại vị trí đã xử lý và gia hạn job, job chạy lại sẽ tiếp tục từ watcher sau đó
+    await update_claimed_job(broadcast_job, {
+        "$inc": {"processed": len(watchers)},
+        "$set": {
+            "last_watcher_object_id": watchers[-1]['_id'],
+            "lease_until": lease_until(),
+            "updated_at": datetime.now()
+        }
+    })
+    broadcast_job['last_watcher_object_id'] = watchers[-1]['_id']
+
+    await publish(redis, PUSH_TYPE_NOTIFICATION, notification_push_data(batch_notification), watcher_ids)
+    await publish(redis, PUSH_TYPE_COUNTER, {"delta": 1}, watcher_ids)
+
+
+async def execute_broadcast(redis: Redis, broadcast_job: dict) -> None:
+    """
+    Duyệt watcher theo `_id` tăng dần, mỗi batch ghi người nhận, cập nhật số thông báo chưa đọc và tiến độ của job.
+    Job phải được nhận bằng claim_broadcast_job trước
+    """
+    try:
+        notification = await db.notification.find_one(
+            {"_id": broadcast_job['notification_id']},
+            {
+                "content": 1, "watcher_created_activity": 1, "created_by": 1, "updated_by": 1,
+                "created_at": 1, "updated_at": 1
+            }
+        )
+
+        query = {}
+        if broadcast_job['last_watcher_object_id']:
+            query = {"_id": {"$gt": broadcast_job['last_watcher_object_id']}}
+        watchers_cursor = db.watcher.find(query, {"watcher_id": 1}, batch_size=BROADCAST_BATCH_SIZE).sort("_id", 1)
+
+        watchers = []
+        async for watcher in watchers_cursor:
+            watchers.append(watcher)
+            if len(watchers) >= BROADCAST_BATCH_SIZE:
+                await process_broadcast_batch(redis, broadcast_job, notification, watchers)
+                watchers = []
+        if watchers:
+            await process_broadcast_batch(redis, broadcast_job, notification, watchers)
+    except BroadcastLeaseLostError as error:
+        logger.warning(str(error))
+        return
+    except Exception as error:
+        await update_claimed_job(broadcast_job, {
+            "$set": {"status": BROADCAST_STATUS_FAILED, "error": str(error), "updated_at": datetime.now()}
+        })
+        raise
+
+    await update_claimed_job(broadcast_job, {
+        "$set": {"status": BROADCAST_STATUS_DONE, "lease_until": None, "updated_at": datetime.now()}
+    })
+
+
+async def run_broadcast(redis: Redis, job: dict) -> None:
+    """
+    Job đang được worker khác chạy ( còn hạn ) hoặc đã xong thì bỏ qua
+    """
+    broadcast_job = await claim_broadcast_job(ObjectId(job['broadcast_job_id']))
+    if broadcast_job is None:
+        return
+    await execute_broadcast(redis, broadcast_job)
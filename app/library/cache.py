@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+# cache có tên được xoá trên tất cả worker qua redis pub/sub ( push.publish_cache_invalidation )
+NAMED_CACHES: Dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """
+    Cache trong process, giới hạn số phần tử ( bỏ phần tử lâu không dùng nhất ) và thời gian sống của mỗi phần tử.
+    Mỗi worker có cache riêng nên dữ liệu có thể cũ tối đa `ttl` giây so với worker khác
+    """
+    def __init__(self, max_size: int, ttl: float, name: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if name is not None:
+            NAMED_CACHES[name] = self
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self.data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expire_at, value = item
+        if expire_at < time.monotonic():
+            del self.data[key]
+            self.misses += 1
+            return None
+
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.data[key] = (time.monotonic() + self.ttl, value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self.data.pop(key, None)
+
+    def delete_many(self, keys: Iterable[Hashable]) -> None:
+        for key in keys:
+            self.data.pop(key, None)
+
+    def clear(self) -> None:
+        self.data.clear()
+
+    def metrics(self) -> Dict[str, int]:
+        return {"size": len(self.data), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,46 @@
+import time
+
+CIRCUIT_STATE_CLOSED = "closed"
+CIRCUIT_STATE_OPEN = "open"
+CIRCUIT_STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Lỗi liên tiếp `failure_threshold` lần thì ngắt ( open ), sau `reset_timeout` giây cho 1 request thử ( half open ),
+    request thử thành công thì đóng lại, lỗi thì ngắt tiếp
+    """
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CIRCUIT_STATE_CLOSED
+        self.number_failure = 0
+        self.opened_at = 0.0
+
+    def allow_request(self) -> bool:
+        if self.state == CIRCUIT_STATE_CLOSED:
+            return True
+        if self.state == CIRCUIT_STATE_OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = CIRCUIT_STATE_HALF_OPEN
+            return True
+        # đang half open thì chỉ cho 1 request thử
+        return False
+
+    def record_success(self) -> None:
+        self.state = CIRCUIT_STATE_CLOSED
+        self.number_failure = 0
+
+    def is_trial(self) -> bool:
+        # gọi ngay sau allow_request() = True: request này là request thử
+        return self.state == CIRCUIT_STATE_HALF_OPEN
+
+    def release_trial(self) -> None:
+        # request thử kết thúc mà ko biết service còn lỗi hay ko, request sau được thử lại ngay
+        if self.state == CIRCUIT_STATE_HALF_OPEN:
+            self.state = CIRCUIT_STATE_OPEN
+
+    def record_failure(self) -> None:
+        self.number_failure += 1
+        if self.state == CIRCUIT_STATE_HALF_OPEN or self.number_failure >= self.failure_threshold:
+            self.state = CIRCUIT_STATE_OPEN
+            self.opened_at = time.monotonic()
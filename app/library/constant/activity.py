@@ -0,0 +1,17 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# timezone mặc định khi chia activity theo ngày, nhận tên Olson ( Asia/Ho_Chi_Minh ) hoặc độ lệch ( +07:00 )
+ACTIVITY_DAY_TIMEZONE = os.getenv("ACTIVITY_DAY_TIMEZONE", "UTC")
+# mã lỗi của mongo khi timezone ko hợp lệ: ko nhận ra tên/độ lệch, timezone ko phải chuỗi
+MONGO_INVALID_TIMEZONE_ERROR_CODES = (40485, 40517)
+
+ACTIVITY_DAY_FORMAT = "%Y-%m-%d"
+# số ngày trong 1 trang
+ACTIVITY_DAY_PAGE_DAYS = 1
+ACTIVITY_DAY_MAX_PAGE_DAYS = 7
+# ngày có nhiều activity hơn sẽ được chia tiếp sang trang sau ( cùng created_day )
+ACTIVITY_DAY_MAX_ACTIVITIES = 1000
@@ -0,0 +1,26 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BROADCAST_JOB_COLLECTION = "broadcast_job"
+
+# số watcher xử lý trong 1 batch khi gửi thông báo tới tất cả watcher
+BROADCAST_BATCH_SIZE = 1000
+
+BROADCAST_STATUS_PENDING = "pending"
+BROADCAST_STATUS_RUNNING = "running"
+BROADCAST_STATUS_DONE = "done"
+BROADCAST_STATUS_FAILED = "failed"
+
+# job đang chạy được gia hạn sau mỗi batch, quá hạn mà chưa gia hạn thì worker khác được nhận lại, tính bằng giây
+BROADCAST_LEASE_SECONDS = int(os.getenv("BROADCAST_LEASE_SECONDS", 120))
+# chu kỳ worker tìm job bị bỏ dở ( worker chết hoặc lỗi ) để chạy tiếp, tính bằng giây
+BROADCAST_RESUME_INTERVAL = int(os.getenv("BROADCAST_RESUME_INTERVAL", 60))
+# job lỗi quá số lần này thì giữ trạng thái failed, ko chạy lại nữa
+BROADCAST_MAX_ATTEMPT = 5
+
+# key đánh dấu batch đã tăng số thông báo chưa đọc, batch chạy lại ko tăng thêm lần nữa
+BROADCAST_COUNTER_MARKER_PREFIX = "broadcast:counter:"
+BROADCAST_COUNTER_MARKER_TTL = 24 * 60 * 60
@@ -0,0 +1,22 @@
+# thông tin watcher theo token, tính bằng giây
+CURRENT_USER_CACHE_MAX_SIZE = 10000
+CURRENT_USER_CACHE_TTL = 60
+
+# username -> watcher_id dùng khi tìm người được tag, tính bằng giây
+# xoá watcher thì key bị xoá trên tất cả worker qua redis pub/sub
+USERNAME_CACHE_NAME = "username"
+USERNAME_CACHE_MAX_SIZE = 50000
+USERNAME_CACHE_TTL = 10 * 60
+
+# group_profile_id -> thông tin group ko gồm thành viên và activity, tính bằng giây
+# cache trong process sống ngắn để các worker ko dùng dữ liệu cũ lâu sau khi group được cập nhật
+GROUP_PROFILE_CACHE_MAX_SIZE = 10000
+GROUP_PROFILE_CACHE_TTL = 5
+GROUP_PROFILE_REDIS_CACHE_TTL = 10 * 60
+GROUP_PROFILE_CACHE_KEY_PREFIX = "group_profile:cache:"
+# tăng khi thay đổi các field được cache để ko đọc lại dữ liệu cũ trong redis
+GROUP_PROFILE_CACHE_VERSION = 1
+
+# set watcher_id thành viên của mỗi group trong redis, dùng để kiểm tra thành viên khi tạo activity, tính bằng giây
+GROUP_MEMBER_CACHE_KEY_PREFIX = "group_member:cache:"
+GROUP_MEMBER_CACHE_TTL = 10 * 60
@@ -0,0 +1,8 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# True: khi startup chạy explain() cho các câu query chính và dừng app nếu có COLLSCAN
+MONGO_INDEX_CHECK = os.getenv("MONGO_INDEX_CHECK", "False").lower() == "true"
@@ -0,0 +1,35 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# inline: gửi thông báo ngay trong request, queue: đưa vào redis stream cho worker xử lý
+FAN_OUT_MODE_INLINE = "inline"
+FAN_OUT_MODE_QUEUE = "queue"
+FAN_OUT_MODE = os.getenv("FAN_OUT_MODE", FAN_OUT_MODE_QUEUE)
+
+# True: chạy worker ngay trong process api, False: chạy riêng bằng python -m app.command.fan_out_worker
+FAN_OUT_LOCAL_WORKER = os.getenv("FAN_OUT_LOCAL_WORKER", "True").lower() == "true"
+
+# loại job trong stream
+FAN_OUT_JOB_TYPE_ACTIVITY = "activity"
+FAN_OUT_JOB_TYPE_BROADCAST = "broadcast"
+
+FAN_OUT_STREAM = "notification:fan_out"
+FAN_OUT_DEAD_LETTER_STREAM = "notification:fan_out:dead_letter"
+FAN_OUT_GROUP = "fan_out_worker"
+FAN_OUT_STREAM_MAX_LENGTH = 100000
+
+FAN_OUT_DONE_KEY_PREFIX = "fan_out:done:"
+FAN_OUT_DONE_TTL = 24 * 60 * 60
+
+FAN_OUT_BATCH_SIZE = 10
+# phải nhỏ hơn REDIS_SOCKET_TIMEOUT nếu ko lệnh XREADGROUP sẽ bị timeout, tính bằng mili giây
+FAN_OUT_BLOCK_MS = 2000
+# job bị treo quá thời gian này sẽ được worker khác nhận lại, tính bằng mili giây
+FAN_OUT_RETRY_IDLE_MS = 30000
+# job đang chạy được nhận lại định kỳ để reset idle time, worker khác ko nhận lại job vẫn đang chạy, tính bằng giây
+FAN_OUT_CLAIM_INTERVAL = FAN_OUT_RETRY_IDLE_MS / 1000 / 3
+FAN_OUT_MAX_RETRY = 5
+FAN_OUT_ERROR_DELAY = 1
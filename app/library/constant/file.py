@@ -1,26 +1,56 @@
-# MAX_SIZE_UPLOAD_IN_BYTES = 100 * 1024 * 1024
-#
-# THUMBNAIL_WIDTH = 100
-# THUMBNAIL_HEIGHT = 100
-# THUMBNAIL_IMAGE_EXTENSION = 'jpeg'
-#
-# PREFIX_CONTENT_TYPE_IMAGE = 'image/'
-#
-# PREFIX_CONTENT_TYPE_VIDEO = 'video/'
-#
-# CONTENT_TYPE_PDF = 'application/pdf'
-#
-# CONTENT_TYPE_GIF = 'image/gif'
-#
-# EXTENSION_PDF = '.pdf'
-#
-# PREFIX_CONTENT_TYPE_APPLICATION = [
-#     'application/vnd.openxmlformats-officedocument.presentationml.presentation',
-#     'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-#     'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-#     'application/vnd.oasis.opendocument.text',
-#     'application/vnd.oasis.opendocument.spreadsheet',
-#     'application/vnd.oasis.opendocument.presentation'
-# ]
-#
-# THUMBNAIL_CONTENT_TYPE = 'image/jpeg'
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_SIZE_UPLOAD_IN_BYTES = 100 * 1024 * 1024
+
+# mỗi lần chỉ đọc và gửi 1 chunk lên service file nên bộ nhớ cho 1 upload ko vượt quá kích thước chunk
+UPLOAD_CHUNK_SIZE_IN_BYTES = 1024 * 1024
+
+THUMBNAIL_WIDTH = 100
+THUMBNAIL_HEIGHT = 100
+THUMBNAIL_IMAGE_EXTENSION = 'jpeg'
+
+PREFIX_CONTENT_TYPE_IMAGE = 'image/'
+
+PREFIX_CONTENT_TYPE_VIDEO = 'video/'
+
+CONTENT_TYPE_PDF = 'application/pdf'
+
+CONTENT_TYPE_GIF = 'image/gif'
+
+EXTENSION_PDF = '.pdf'
+
+PREFIX_CONTENT_TYPE_APPLICATION = [
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.oasis.opendocument.text',
+    'application/vnd.oasis.opendocument.spreadsheet',
+    'application/vnd.oasis.opendocument.presentation'
+]
+
+THUMBNAIL_CONTENT_TYPE = 'image/jpeg'
+
+# tạo thumbnail bằng process con sau khi tạo activity có file, THUMBNAIL_PROCESS_WORKERS process cùng lúc
+THUMBNAIL_ENABLED = os.getenv("THUMBNAIL_ENABLED", "True").lower() == "true"
+THUMBNAIL_PROCESS_WORKERS = int(os.getenv("THUMBNAIL_PROCESS_WORKERS", 2))
+# queue đầy thì bỏ qua thumbnail của file mới thay vì làm chậm request
+THUMBNAIL_QUEUE_SIZE = int(os.getenv("THUMBNAIL_QUEUE_SIZE", 100))
+
+THUMBNAIL_TYPE_IMAGE = 'image'
+THUMBNAIL_TYPE_VIDEO = 'video'
+THUMBNAIL_TYPE_PDF = 'pdf'
+THUMBNAIL_TYPE_OFFICE = 'office'
+
+# thời gian tối đa tạo thumbnail theo loại file, quá thời gian thì process con bị kill, tính bằng giây
+THUMBNAIL_TIMEOUT = {
+    THUMBNAIL_TYPE_IMAGE: 10,
+    THUMBNAIL_TYPE_VIDEO: 30,
+    THUMBNAIL_TYPE_PDF: 30,
+    THUMBNAIL_TYPE_OFFICE: 90,
+}
+
+THUMBNAIL_COLLECTION = "thumbnail"
@@ -1,3 +1,8 @@
 DATETIME_FORMAT = '%d/%m/%Y %H:%M:%S'
 
 PAGING_LIMIT = 10
+# client truyền limit lớn hơn sẽ bị giới hạn lại ở giá trị này
+PAGING_MAX_LIMIT = 100
+
+PAGING_DIRECTION_NEXT = 1
+PAGING_DIRECTION_PREVIOUS = -1
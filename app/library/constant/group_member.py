@@ -0,0 +1,17 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# embedded: thành viên nằm trong mảng group_profile.watcher_ids
+# collection: mỗi thành viên là 1 document trong collection group_member, dùng cho group rất lớn
+GROUP_MEMBER_STORAGE_MODE_EMBEDDED = "embedded"
+GROUP_MEMBER_STORAGE_MODE_COLLECTION = "collection"
+
+GROUP_MEMBER_STORAGE_MODE = os.getenv("GROUP_MEMBER_STORAGE_MODE", GROUP_MEMBER_STORAGE_MODE_EMBEDDED)
+
+GROUP_MEMBER_COLLECTION = "group_member"
+
+# số group_profile xử lý trong 1 batch khi migrate thành viên sang collection
+GROUP_MEMBER_MIGRATE_BATCH_SIZE = 100
@@ -0,0 +1,16 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# tag tất cả thành viên trong group
+MENTION_ALL = "all"
+
+# sorted set theo thứ tự từ điển chứa username của thành viên trong group, dùng để gợi ý khi tag
+MENTION_INDEX_KEY_PREFIX = "mention:group:"
+# tính bằng giây, index bị xoá khi thành viên của group thay đổi và được tạo lại ở lần gợi ý kế tiếp
+MENTION_INDEX_TTL = int(os.getenv("MENTION_INDEX_TTL", 60 * 60))
+
+MENTION_SUGGEST_LIMIT = 10
+MENTION_SUGGEST_MAX_LIMIT = 50
@@ -0,0 +1,44 @@
+import os
+
+from dotenv import load_dotenv
+
+from app.library.constant.system_type import (
+    SYSTEM_TYPE, SYSTEM_TYPE_CRM, SYSTEM_TYPE_HRM, SYSTEM_TYPE_LOS,
+    SYSTEM_TYPE_OFFICE
+)
+
+load_dotenv()
+
+# embedded: trạng thái đọc của mọi watcher nằm trong mảng notification.watcher_noti_status
+# inbox: mỗi watcher có 1 document nhỏ trong collection notification_inbox trỏ tới notification
+NOTIFICATION_STORAGE_MODE_EMBEDDED = "embedded"
+NOTIFICATION_STORAGE_MODE_INBOX = "inbox"
+
+NOTIFICATION_STORAGE_MODE = os.getenv("NOTIFICATION_STORAGE_MODE", NOTIFICATION_STORAGE_MODE_EMBEDDED)
+
+NOTIFICATION_INBOX_COLLECTION = "notification_inbox"
+
+# loại thông báo tạo từ 1 activity, mỗi activity có tối đa 1 thông báo mỗi loại ( unique index )
+NOTIFICATION_TYPE_COMMENT = "comment"
+NOTIFICATION_TYPE_MENTION = "mention"
+# thông báo đã gộp được tách riêng cho những watcher được gộp khi thông báo cũ còn người nhận khác
+NOTIFICATION_TYPE_COALESCE = "coalesce"
+
+# số notification xử lý trong 1 batch khi migrate dữ liệu sang inbox
+NOTIFICATION_INBOX_MIGRATE_BATCH_SIZE = 500
+
+# số notification tối đa trong 1 request đánh dấu đã đọc
+NOTIFICATION_READ_MAX_IDS = 1000
+# số watcher tối đa trong 1 request tính trước số thông báo chưa đọc
+NOTIFICATION_WARM_MAX_IDS = 1000
+
+# tính bằng giây, trong khoảng này các bình luận tiếp theo trong cùng group được gộp vào thông báo "vừa bình luận"
+# watcher chưa đọc thay vì tạo thông báo mới, 0 là ko gộp. Cấu hình riêng cho từng hệ thống ( created_by của group )
+NOTIFICATION_COALESCE_WINDOW = {
+    SYSTEM_TYPE[SYSTEM_TYPE_CRM]: int(os.getenv("NOTIFICATION_COALESCE_WINDOW_CRM", 0)),
+    SYSTEM_TYPE[SYSTEM_TYPE_LOS]: int(os.getenv("NOTIFICATION_COALESCE_WINDOW_LOS", 0)),
+    SYSTEM_TYPE[SYSTEM_TYPE_HRM]: int(os.getenv("NOTIFICATION_COALESCE_WINDOW_HRM", 0)),
+    SYSTEM_TYPE[SYSTEM_TYPE_OFFICE]: int(os.getenv("NOTIFICATION_COALESCE_WINDOW_OFFICE", 0)),
+}
+# group_profile_id + watcher_id -> _id của thông báo "vừa bình luận" đang được gộp
+NOTIFICATION_COALESCE_KEY_PREFIX = "notification:coalesce:"
@@ -0,0 +1,17 @@
+# tất cả worker cùng subscribe 1 channel, mỗi worker tự lọc watcher đang kết nối tới nó
+PUSH_CHANNEL = "notification:push"
+# xoá key của cache trong process ( TTLCache có tên ) trên tất cả worker
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+
+PUSH_TYPE_COUNTER = "counter"
+PUSH_TYPE_NOTIFICATION = "notification"
+PUSH_TYPE_RESYNC = "resync"
+PUSH_TYPE_PING = "ping"
+
+# số message tối đa chờ gửi cho 1 kết nối, vượt quá thì bỏ message cũ và báo client tải lại ( resync )
+PUSH_QUEUE_SIZE = 100
+# số kết nối tối đa của 1 worker
+PUSH_MAX_CONNECTIONS = 5000
+# tính bằng giây
+PUSH_HEARTBEAT_INTERVAL = 15
+PUSH_RECONNECT_DELAY = 1
@@ -0,0 +1,16 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# số connection tối đa trong pool, khi hết connection request sẽ chờ tối đa REDIS_POOL_TIMEOUT giây
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT = int(os.getenv("REDIS_POOL_TIMEOUT", 5))
+
+# tính bằng giây, connection rảnh quá khoảng này sẽ được PING lại trước khi dùng
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+REDIS_SOCKET_TIMEOUT = int(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+
+# số key tối đa trong 1 lần gọi script cập nhật số thông báo chưa đọc
+REDIS_COUNTER_CHUNK_SIZE = int(os.getenv("REDIS_COUNTER_CHUNK_SIZE", 1000))
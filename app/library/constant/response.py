@@ -0,0 +1,8 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# True: các api trả về danh sách lớn serialize thẳng document mongo bằng orjson, ko tạo model pydantic
+FAST_JSON_RESPONSE = os.getenv("FAST_JSON_RESPONSE", "False").lower() == "true"
@@ -1,6 +1,36 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
 SERVICE_FILE_HEADER = {
     'Authorization': 'Bearer 2',
     'server-auth': '2L0YHOzA4NqqavbYyAwQ7k0cz0X1BbPF'
 }
 
 SERVICE_FILE_API_FILES = 'api/v1/files/'
+
+# connection pool tới service file
+SERVICE_FILE_LIMIT = int(os.getenv("SERVICE_FILE_LIMIT", 100))
+SERVICE_FILE_LIMIT_PER_HOST = int(os.getenv("SERVICE_FILE_LIMIT_PER_HOST", 30))
+# tính bằng giây
+SERVICE_FILE_KEEPALIVE_TIMEOUT = int(os.getenv("SERVICE_FILE_KEEPALIVE_TIMEOUT", 30))
+SERVICE_FILE_DNS_CACHE_TTL = int(os.getenv("SERVICE_FILE_DNS_CACHE_TTL", 300))
+SERVICE_FILE_TOTAL_TIMEOUT = int(os.getenv("SERVICE_FILE_TOTAL_TIMEOUT", 120))
+SERVICE_FILE_CONNECT_TIMEOUT = int(os.getenv("SERVICE_FILE_CONNECT_TIMEOUT", 5))
+SERVICE_FILE_READ_TIMEOUT = int(os.getenv("SERVICE_FILE_READ_TIMEOUT", 30))
+
+# chỉ retry khi upload file tạm ( temp_flag ), thời gian chờ lần thứ n = SERVICE_FILE_RETRY_BACKOFF * 2^(n-1) giây
+SERVICE_FILE_MAX_RETRY = int(os.getenv("SERVICE_FILE_MAX_RETRY", 2))
+SERVICE_FILE_RETRY_BACKOFF = float(os.getenv("SERVICE_FILE_RETRY_BACKOFF", 0.5))
+
+# lỗi liên tiếp SERVICE_FILE_CIRCUIT_FAILURE_THRESHOLD lần thì ngừng gọi service file trong SERVICE_FILE_CIRCUIT_RESET_TIMEOUT giây
+SERVICE_FILE_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("SERVICE_FILE_CIRCUIT_FAILURE_THRESHOLD", 5))
+SERVICE_FILE_CIRCUIT_RESET_TIMEOUT = int(os.getenv("SERVICE_FILE_CIRCUIT_RESET_TIMEOUT", 30))
+
+SERVICE_FILE_UPLOAD_RESULT_SUCCESS = "success"
+SERVICE_FILE_UPLOAD_RESULT_FAILED = "failed"
+SERVICE_FILE_UPLOAD_RESULT_ERROR = "error"
+SERVICE_FILE_UPLOAD_RESULT_TOO_LARGE = "too_large"
+SERVICE_FILE_UPLOAD_RESULT_CIRCUIT_OPEN = "circuit_open"
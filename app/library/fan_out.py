@@ -0,0 +1,318 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Awaitable, List, Optional, Set
+
+from aioredis import Redis
+from aioredis.exceptions import RedisError, ResponseError
+from bson import ObjectId
+from loguru import logger
+
+from app.library.broadcast import (
+    claim_broadcast_job, execute_broadcast, run_broadcast
+)
+from app.library.constant.broadcast import BROADCAST_RESUME_INTERVAL
+from app.library.constant.fan_out import (
+    FAN_OUT_BATCH_SIZE, FAN_OUT_BLOCK_MS, FAN_OUT_CLAIM_INTERVAL,
+    FAN_OUT_DEAD_LETTER_STREAM, FAN_OUT_DONE_KEY_PREFIX, FAN_OUT_DONE_TTL,
+    FAN_OUT_ERROR_DELAY, FAN_OUT_GROUP, FAN_OUT_JOB_TYPE_ACTIVITY,
+    FAN_OUT_JOB_TYPE_BROADCAST, FAN_OUT_MAX_RETRY, FAN_OUT_MODE,
+    FAN_OUT_MODE_QUEUE, FAN_OUT_RETRY_IDLE_MS, FAN_OUT_STREAM,
+    FAN_OUT_STREAM_MAX_LENGTH
+)
+from app.library.constant.notification import (
+    NOTIFICATION_TYPE_COMMENT, NOTIFICATION_TYPE_MENTION
+)
+from app.library.metrics import Histogram
+from app.library.notification_coalesce import (
+    build_coalesce_fields, coalesce_comment, get_coalesce_window,
+    remember_coalesce_target, split_coalesced_recipients, split_comment
+)
+from app.library.notification_counter import incr_online_counters
+from app.library.notification_storage import upsert_activity_notifications
+from app.library.push import publish_counter_deltas, publish_notifications
+from app.library.recipient import resolve_recipients
+
+FAN_OUT_RECIPIENTS = Histogram(
+    "fan_out_recipients", "Số watcher nhận thông báo của 1 activity",
+    buckets=(1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+)
+FAN_OUT_JOB_SECONDS = Histogram(
+    "fan_out_job_seconds", "Thời gian xử lý 1 job gửi thông báo", label_names=("type", "result")
+)
+
+
+def build_fan_out_job(activity: dict, group_profile: dict) -> dict:
+    return {
+        "type": FAN_OUT_JOB_TYPE_ACTIVITY,
+        # mỗi activity chỉ được gửi thông báo 1 lần dù job chạy lại nhiều lần
+        "idempotency_key": str(activity['_id']),
+        "activity_id": str(activity['_id']),
+        "group_profile_id": activity['group_profile_id'],
+        "watcher_id": activity['watcher_id'],
+        "username": activity['created_by'],
+        "tag_users": activity['tag_users'],
+        "system_name": group_profile['created_by']
+    }
+
+
+def build_notification(job: dict, notification_type: str, content: str, watcher_ids: List[str]) -> dict:
+    return {
+        'content': content,
+        'watcher_noti_status': [
+            {
+                "watcher_id": watcher_id,
+                "status": False
+            } for watcher_id in watcher_ids
+        ],
+        "activity_id": ObjectId(job['activity_id']),
+        "activity_notification_type": notification_type,
+        "watcher_created_activity": job['watcher_id'],
+        "created_by": job['system_name'],
+        "updated_by": job['system_name'],
+        "created_at": datetime.now(),
+        "updated_at": datetime.now()
+    }
+
+
+async def fan_out_activity(redis: Redis, job: dict) -> None:
+    """
+    Tạo thông báo cho các watcher trong group, cập nhật số thông báo chưa đọc và push tới client.
+    Chạy lại nhiều lần với cùng idempotency_key ko tạo thêm thông báo
+    """
+    done_key = f"{FAN_OUT_DONE_KEY_PREFIX}{job['idempotency_key']}"
+    if await redis.exists(done_key):
+        return
+
+    # thành viên của group lấy trong 1 query rồi chia người được tag / ko được tag trong bộ nhớ
+    recipients = await resolve_recipients(job['group_profile_id'], job['watcher_id'], job['tag_users'])
+    watcher_ids_not_in_tag, watcher_ids_in_tag = recipients.not_mentioned, recipients.mentioned
+    FAN_OUT_RECIPIENTS.observe(len(watcher_ids_not_in_tag) + len(watcher_ids_in_tag))
+
+    # watcher còn thông báo "vừa bình luận" chưa đọc của group trong cửa sổ gộp thì gộp vào thông báo đó
+    # ( hoặc tách sang thông báo riêng nếu thông báo đó còn người nhận khác ), ko tăng số thông báo chưa đọc
+    coalesce_window = get_coalesce_window(job['system_name'])
+    notification_id__coalesced_ids, notification_id__split_ids = {}, {}
+    if coalesce_window:
+        (
+            notification_id__coalesced_ids, notification_id__split_ids, watcher_ids_not_in_tag
+        ) = await split_coalesced_recipients(redis, job['group_profile_id'], watcher_ids_not_in_tag)
+
+    list_new_notification = []
+    comment_notification = None
+    if watcher_ids_not_in_tag:
+        comment_notification = build_notification(
+            job, NOTIFICATION_TYPE_COMMENT, f"{job['username']} vừa bình luận", watcher_ids_not_in_tag
+        )
+        if coalesce_window:
+            comment_notification.update(build_coalesce_fields(job))
+        list_new_notification.append(comment_notification)
+    if watcher_ids_in_tag:
+        list_new_notification.append(build_notification(
+            job,
+            NOTIFICATION_TYPE_MENTION,
+            f"{job['username']} vừa nhắc đến bạn trong group_profile id = {job['group_profile_id']}",
+            watcher_ids_in_tag
+        ))
+
+    # lần chạy trước ( hoặc lần chạy song song ) đã lưu thông báo thì ko tạo thêm, chỉ ghi bù người nhận còn thiếu
+    new_notifications = await upsert_activity_notifications(list_new_notification)
+    for notification_id, coalesced_ids in notification_id__coalesced_ids.items():
+        await coalesce_comment(redis, job, notification_id, coalesced_ids)
+    for notification_id, split_ids in notification_id__split_ids.items():
+        await split_comment(redis, job, notification_id, split_ids)
+
+    # lưu lại số thông báo chưa đọc trong redis
+    # chỉ cập nhật redis nếu watcher đó đang online( nếu offline hoặc chưa có dữ liệu thì redis sẽ bằng None)
+    # mỗi chunk tăng counter và ghi key đánh dấu trong cùng 1 script: lỗi trước khi ghi done_key thì
+    # lần chạy lại chỉ tăng counter của những chunk chưa được cập nhật
+    watcher_ids = watcher_ids_not_in_tag + watcher_ids_in_tag
+    await incr_online_counters(redis, watcher_ids, marker_key=f"{done_key}:counter", marker_ttl=FAN_OUT_DONE_TTL)
+    await redis.set(done_key, 1, ex=FAN_OUT_DONE_TTL)
+
+    # chỉ ghi nhớ thông báo để gộp sau khi job đã hoàn thành, nếu ko lần chạy lại sẽ coi người nhận của chính
+    # thông báo này là đã được gộp và bỏ họ khỏi counter
+    if coalesce_window and comment_notification is not None:
+        await remember_coalesce_target(
+            redis, job['group_profile_id'], comment_notification['_id'], watcher_ids_not_in_tag, coalesce_window
+        )
+
+    await publish_notifications(redis, new_notifications)
+    await publish_counter_deltas(redis, Counter(watcher_ids))
+
+
+async def run_fan_out_job(redis: Redis, job: dict) -> None:
+    job_type = job.get('type', FAN_OUT_JOB_TYPE_ACTIVITY)
+    start_time = time.perf_counter()
+    result = "success"
+    try:
+        if job_type == FAN_OUT_JOB_TYPE_BROADCAST:
+            await run_broadcast(redis, job)
+        else:
+            await fan_out_activity(redis, job)
+    except Exception:
+        result = "error"
+        raise
+    finally:
+        FAN_OUT_JOB_SECONDS.observe(time.perf_counter() - start_time, job_type, result)
+
+
+async def dispatch_fan_out(redis: Redis, job: dict) -> None:
+    if FAN_OUT_MODE == FAN_OUT_MODE_QUEUE:
+        try:
+            await redis.xadd(
+                FAN_OUT_STREAM, {"job": json.dumps(job)}, maxlen=FAN_OUT_STREAM_MAX_LENGTH, approximate=True
+            )
+            return
+        except RedisError as error:
+            logger.warning(f"can not enqueue fan out job {job['idempotency_key']}, run inline: {error}")
+    await run_fan_out_job(redis, job)
+
+
+class FanOutWorker:
+    """
+    Đọc job từ redis stream theo consumer group, job lỗi sẽ ở lại pending và được nhận lại sau
+    FAN_OUT_RETRY_IDLE_MS, quá FAN_OUT_MAX_RETRY lần thì chuyển sang dead letter stream.
+    Job broadcast chạy trong task riêng, tiến độ và lease lưu trong mongo nên ko đi qua luồng nhận lại của stream
+    """
+    def __init__(self):
+        self.redis: Optional[Redis] = None
+        self.task: Optional[asyncio.Task] = None
+        self.resume_task: Optional[asyncio.Task] = None
+        self.broadcast_tasks: Set[asyncio.Task] = set()
+        self.consumer_name = f"{socket.gethostname()}-{os.getpid()}"
+        self.last_retry_check = 0.0
+
+    def start(self, redis: Redis):
+        self.redis = redis
+        self.task = asyncio.create_task(self.run())
+        self.resume_task = asyncio.create_task(self.resume_broadcast_jobs())
+
+    async def stop(self):
+        tasks = [task for task in [self.task, self.resume_task, *self.broadcast_tasks] if task is not None]
+        for task in tasks:
+            task.cancel()
+        # broadcast bị huỷ giữa chừng sẽ được chạy tiếp khi lease hết hạn
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def start_broadcast(self, broadcast: Awaitable):
+        task = asyncio.create_task(self.run_broadcast_task(broadcast))
+        self.broadcast_tasks.add(task)
+        task.add_done_callback(self.broadcast_tasks.discard)
+
+    @staticmethod
+    async def run_broadcast_task(broadcast: Awaitable):
+        try:
+            await broadcast
+        except Exception:
+            logger.exception("broadcast job failed, it will be resumed")
+
+    async def resume_broadcast_jobs(self):
+        """
+        Định kỳ nhận lại job broadcast bị lỗi hoặc bị bỏ dở ( worker chết, lease hết hạn )
+        """
+        while True:
+            await asyncio.sleep(BROADCAST_RESUME_INTERVAL)
+            try:
+                broadcast_job = await claim_broadcast_job()
+                while broadcast_job is not None:
+                    logger.info(f"resume broadcast job {broadcast_job['_id']}, attempt {broadcast_job['attempt']}")
+                    self.start_broadcast(execute_broadcast(self.redis, broadcast_job))
+                    broadcast_job = await claim_broadcast_job()
+            except Exception:
+                logger.exception("can not resume broadcast jobs")
+
+    async def create_group(self):
+        try:
+            await self.redis.xgroup_create(FAN_OUT_STREAM, FAN_OUT_GROUP, id="0", mkstream=True)
+        except ResponseError as error:
+            # BUSYGROUP: group đã tồn tại
+            if "BUSYGROUP" not in str(error):
+                raise
+
+    async def run(self):
+        while True:
+            try:
+                await self.create_group()
+                while True:
+                    await self.retry_pending_jobs()
+                    response = await self.redis.xreadgroup(
+                        FAN_OUT_GROUP, self.consumer_name, {FAN_OUT_STREAM: ">"},
+                        count=FAN_OUT_BATCH_SIZE, block=FAN_OUT_BLOCK_MS
+                    )
+                    for _, messages in response or []:
+                        for message_id, fields in messages:
+                            await self.process(message_id, fields)
+            except RedisError as error:
+                logger.warning(f"fan out worker redis error: {error}")
+                await asyncio.sleep(FAN_OUT_ERROR_DELAY)
+
+    async def process(self, message_id: str, fields: dict):
+        try:
+            job = json.loads(fields['job'])
+            if job.get('type') == FAN_OUT_JOB_TYPE_BROADCAST:
+                # broadcast chạy lâu, ko chặn các job activity phía sau
+                self.start_broadcast(run_fan_out_job(self.redis, job))
+            else:
+                keep_claimed_task = asyncio.create_task(self.keep_claimed(message_id))
+                try:
+                    await run_fan_out_job(self.redis, job)
+                finally:
+                    keep_claimed_task.cancel()
+        except RedisError:
+            raise
+        except Exception:
+            logger.exception(f"fan out job {message_id} failed, it will be retried")
+            return
+        await self.redis.xack(FAN_OUT_STREAM, FAN_OUT_GROUP, message_id)
+
+    async def keep_claimed(self, message_id: str):
+        """
+        Nhận lại job đang chạy ( JUSTID ko tăng số lần giao ) để reset idle time, nếu ko job chạy lâu hơn
+        FAN_OUT_RETRY_IDLE_MS sẽ bị worker khác nhận lại và chạy song song
+        """
+        while True:
+            await asyncio.sleep(FAN_OUT_CLAIM_INTERVAL)
+            try:
+                await self.redis.xclaim(
+                    FAN_OUT_STREAM, FAN_OUT_GROUP, self.consumer_name, 0, [message_id], justid=True
+                )
+            except RedisError as error:
+                logger.warning(f"can not extend fan out job {message_id}: {error}")
+
+    async def retry_pending_jobs(self):
+        if (time.monotonic() - self.last_retry_check) * 1000 < FAN_OUT_RETRY_IDLE_MS:
+            return
+        self.last_retry_check = time.monotonic()
+
+        pending_jobs = await self.redis.xpending_range(
+            FAN_OUT_STREAM, FAN_OUT_GROUP, min="-", max="+", count=FAN_OUT_BATCH_SIZE
+        )
+        for pending_job in pending_jobs:
+            if pending_job['time_since_delivered'] < FAN_OUT_RETRY_IDLE_MS:
+                continue
+            message_id = pending_job['message_id']
+            claimed = await self.redis.xclaim(
+                FAN_OUT_STREAM, FAN_OUT_GROUP, self.consumer_name, FAN_OUT_RETRY_IDLE_MS, [message_id]
+            )
+            if not claimed:
+                # worker khác đã nhận lại job này
+                continue
+
+            fields = claimed[0][1] if claimed[0] else None
+            if not fields:
+                # message đã bị xoá khỏi stream do vượt FAN_OUT_STREAM_MAX_LENGTH
+                await self.redis.xack(FAN_OUT_STREAM, FAN_OUT_GROUP, message_id)
+            elif pending_job['times_delivered'] >= FAN_OUT_MAX_RETRY:
+                logger.error(f"fan out job {message_id} failed {pending_job['times_delivered']} times")
+                await self.redis.xadd(FAN_OUT_DEAD_LETTER_STREAM, fields, maxlen=FAN_OUT_STREAM_MAX_LENGTH)
+                await self.redis.xack(FAN_OUT_STREAM, FAN_OUT_GROUP, message_id)
+            else:
+                await self.process(message_id, fields)
+
+
+fan_out_worker = FanOutWorker()
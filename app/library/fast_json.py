@@ -0,0 +1,90 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, List, NamedTuple, Optional, Type
+
+import orjson
+from bson import ObjectId
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON, ModelField
+from starlette.responses import JSONResponse
+
+from app.library.constant.response import FAST_JSON_RESPONSE
+from app.library.function import datetime_to_str
+
+ORJSON_OPTION = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def default(value: Any) -> Any:
+    # orjson chỉ gọi hàm này với kiểu nó ko tự serialize được, giữ đúng định dạng của json_encoders
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return datetime_to_str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=default, option=ORJSON_OPTION)
+
+
+class FieldPlan(NamedTuple):
+    alias: str
+    name: str
+    field: ModelField
+    # model con và field có phải list model con hay không
+    model: Optional[Type[BaseModel]]
+    is_list: bool
+    is_date: bool
+
+
+@lru_cache(maxsize=None)
+def build_plan(model: Type[BaseModel]) -> List[FieldPlan]:
+    """
+    Duyệt field của model 1 lần và cache lại, các lần serialize sau chỉ lấy key theo plan
+    """
+    plan = []
+    for name, field in model.__fields__.items():
+        sub_model = field.type_ if isinstance(field.type_, type) and issubclass(field.type_, BaseModel) else None
+        if sub_model is not None and field.shape not in (SHAPE_SINGLETON, SHAPE_LIST):
+            sub_model = None
+        is_date = field.type_ is date
+        plan.append(FieldPlan(field.alias, name, field, sub_model, field.shape == SHAPE_LIST, is_date))
+    return plan
+
+
+def dump_trusted(model: Type[BaseModel], row: dict) -> dict:
+    """
+    Chuyển dict ( document mongo đã qua xử lý của app ) sang dict có đúng các field ( theo alias ) của model
+    mà ko validate, dùng cho dữ liệu app tự đọc từ db
+    """
+    output = {}
+    for field_plan in build_plan(model):
+        if field_plan.alias in row:
+            value = row[field_plan.alias]
+        elif field_plan.name in row:
+            value = row[field_plan.name]
+        else:
+            value = field_plan.field.get_default()
+
+        if value is not None:
+            if field_plan.model is not None and field_plan.is_list:
+                value = [dump_trusted(field_plan.model, item) for item in value]
+            elif field_plan.model is not None:
+                value = dump_trusted(field_plan.model, value)
+            elif field_plan.is_date and isinstance(value, datetime):
+                value = value.date()
+        output[field_plan.alias] = value
+    return output
+
+
+def make_response(response_model: Type[BaseModel], content: dict):
+    """
+    Trả về response_model như bình thường, khi bật FAST_JSON_RESPONSE thì bỏ qua bước tạo model
+    và serialize bằng orjson, kết quả json giống nhau
+    """
+    if not FAST_JSON_RESPONSE:
+        return response_model(**content)
+    return FastJSONResponse(dump_trusted(response_model, content))
@@ -1,13 +1,17 @@
+import base64
 from datetime import date, datetime
 from http.client import HTTPException
-from typing import Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from bson import ObjectId
+from bson import ObjectId, json_util
 from bson.errors import InvalidId
 from motor.motor_asyncio import AsyncIOMotorDatabase  # noqa
 
 from app.api.v1.setting.function import http_exception
-from app.library.constant.function import DATETIME_FORMAT, PAGING_LIMIT
+from app.library.constant.function import (
+    DATETIME_FORMAT, PAGING_DIRECTION_NEXT, PAGING_DIRECTION_PREVIOUS,
+    PAGING_LIMIT, PAGING_MAX_LIMIT
+)
 
 
 def datetime_to_str(_time: datetime, _format=DATETIME_FORMAT, default='') -> str:
@@ -39,40 +43,111 @@ def is_valid_object_id(id: str):
         return http_exception(description='invalid id')
 
 
-def paging(
-        query_param_for_paging: str,
+def get_page_limit(limit: Optional[int]) -> int:
+    if not limit:
+        return PAGING_LIMIT
+    return max(1, min(limit, PAGING_MAX_LIMIT))
+
+
+def encode_cursor(values: list, direction: int) -> str:
+    payload = json_util.dumps({"v": values, "d": direction})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[list, int]:
+    try:
+        payload = json_util.loads(base64.urlsafe_b64decode(f'{cursor}{"=" * (-len(cursor) % 4)}'.encode()))
+        values, direction = payload["v"], payload["d"]
+    except (ValueError, TypeError, KeyError):
+        return http_exception(description='invalid cursor')
+    if not isinstance(values, list) or direction not in (PAGING_DIRECTION_NEXT, PAGING_DIRECTION_PREVIOUS):
+        return http_exception(description='invalid cursor')
+    return values, direction
+
+
+class KeysetPaging:
+    """
+    Phân trang theo giá trị của các key sort ( keyset ), ko dùng skip nên trang sau nhanh như trang đầu.
+    Cursor là chuỗi base64 chứa giá trị các key sort của phần tử cuối/đầu trang và chiều đọc,
+    vẫn nhận `_id` cuối trang như cách phân trang cũ khi chỉ sort theo 1 key
+    """
+    def __init__(self, sort_keys: List[Tuple[str, int]], cursor: Optional[str] = None, limit: Optional[int] = None):
+        self.sort_keys = sort_keys
+        self.limit = get_page_limit(limit)
+        self.values = None
+        self.direction = PAGING_DIRECTION_NEXT
+        if cursor and len(sort_keys) == 1 and ObjectId.is_valid(cursor):
+            self.values = [ObjectId(cursor)]
+        elif cursor:
+            self.values, self.direction = decode_cursor(cursor)
+            if len(self.values) != len(sort_keys):
+                return http_exception(description='invalid cursor')
+
+    @property
+    def sort(self) -> List[Tuple[str, int]]:
+        # đọc trang trước thì sort ngược lại rồi đảo kết quả
+        return [(key, order * self.direction) for key, order in self.sort_keys]
+
+    @property
+    def fetch_limit(self) -> int:
+        # lấy thêm 1 phần tử để biết còn trang tiếp theo hay không
+        return self.limit + 1
+
+    def match(self, query: dict) -> dict:
+        if self.values is None:
+            return query
+
+        # ( k1 > v1 ) or ( k1 = v1 and k2 > v2 ) or ...
+        conditions = []
+        for index, (key, order) in enumerate(self.sort):
+            condition = {previous_key: value for (previous_key, _), value in zip(self.sort_keys[:index], self.values)}
+            condition[key] = {"$gt" if order == 1 else "$lt": self.values[index]}
+            conditions.append(condition)
+        return {"$and": [query, conditions[0] if len(conditions) == 1 else {"$or": conditions}]}
+
+    def make_cursor(self, item: dict, direction: int) -> str:
+        return encode_cursor([item[key] for key, _ in self.sort_keys], direction)
+
+    def page(self, items: List[dict]) -> Dict[str, Any]:
+        """
+        :param items: kết quả query với `match`, `sort` và `fetch_limit`
+        :return: dict dùng được cho PagingResponseData, `has_more` là còn dữ liệu theo chiều đang đọc
+        """
+        has_more = len(items) > self.limit
+        items = items[:self.limit]
+        if self.direction == PAGING_DIRECTION_PREVIOUS:
+            items.reverse()
+
+        has_next = has_more if self.direction == PAGING_DIRECTION_NEXT else self.values is not None
+        has_previous = has_more if self.direction == PAGING_DIRECTION_PREVIOUS else self.values is not None
+        return {
+            "data": items,
+            "has_more": has_more,
+            "next_cursor": self.make_cursor(items[-1], PAGING_DIRECTION_NEXT) if items and has_next else None,
+            "prev_cursor": self.make_cursor(items[0], PAGING_DIRECTION_PREVIOUS) if items and has_previous else None
+        }
+
+
+async def paging(
+        query_param_for_paging: Optional[str],  # cursor của trang trước hoặc _id cuối trang trước
         database_name: str,
         key_query: str,
         value_query: Union[str, dict],
         db: AsyncIOMotorDatabase,
         show_value: dict = None,  # sau khi query sẽ hiển thị những field nào, mặc định hiển thị hết
-        sort: int = 1  # sort : -1 descending, 1 ascending
-):
-    object_id = is_valid_object_id(query_param_for_paging)
-    if show_value is None:
-        show_value = {}
-    query_greater_than_or_less_than = "$gt"  # query lớn hơn
-    if sort == -1:
-        query_greater_than_or_less_than = "$lt"  # query bé hơn
-
-    if not query_param_for_paging:
-        cursor = db[database_name].find({key_query: value_query}, show_value).sort("_id", sort).limit(PAGING_LIMIT)
-    else:
-        cursor = db[database_name].find(
-            {
-                key_query: value_query,
-                "_id": {
-                    query_greater_than_or_less_than: object_id
-                }
-            },
-            show_value
-        ).sort("_id", sort).limit(PAGING_LIMIT)
-
-    return cursor
-
-
-def paging_aggregation(
-        query_param_for_paging: str,
+        sort: int = 1,  # sort : -1 descending, 1 ascending
+        limit: Optional[int] = None  # mặc định PAGING_LIMIT, tối đa PAGING_MAX_LIMIT
+) -> Dict[str, Any]:
+    keyset_paging = KeysetPaging([("_id", sort)], query_param_for_paging, limit)
+
+    cursor = db[database_name].find(keyset_paging.match({key_query: value_query}), show_value or None) \
+        .sort(keyset_paging.sort).limit(keyset_paging.fetch_limit)
+
+    return keyset_paging.page(await cursor.to_list(None))
+
+
+async def paging_aggregation(
+        query_param_for_paging: Optional[str],  # cursor của trang trước hoặc _id cuối trang trước
         database_name: str,
         key_query: str,
         value_query: Union[str, dict],
@@ -81,35 +156,28 @@ def paging_aggregation(
         local_field: str = "None",
         foreign_field: str = "None",
         show_value: dict = None,  # sau khi query sẽ hiển thị những field nào, mặc định hiển thị hết
-        sort: int = 1  # sort : -1 descending, 1 ascending
-):
-    object_id = is_valid_object_id(query_param_for_paging)
-
-    query_greater_than_or_less_than = "$gt"  # query lớn hơn
-    if sort == -1:
-        query_greater_than_or_less_than = "$lt"  # query bé hơn
-
-    cursor = db[database_name].aggregate(
-        [
-            {
-                "$match": {
-                    "$and": [{key_query: value_query}, {"_id": {query_greater_than_or_less_than: object_id}}]
-                }
-            } if query_param_for_paging else {
-                "$match": {key_query: value_query}
-            },
-            {
-                "$lookup": {
-                    "from": foreign_table,
-                    'localField': local_field,
-                    'foreignField': foreign_field,
-                    "as": f'{foreign_table}_document'
-                }
-            },
-            {"$project": show_value} if show_value else {'$unset': f"{show_value}"},
-            {"$sort": {"_id": sort}},
-            {"$limit": PAGING_LIMIT}
-        ]
-    )
-
-    return cursor
+        sort: int = 1,  # sort : -1 descending, 1 ascending
+        limit: Optional[int] = None  # mặc định PAGING_LIMIT, tối đa PAGING_MAX_LIMIT
+) -> Dict[str, Any]:
+    keyset_paging = KeysetPaging([("_id", sort)], query_param_for_paging, limit)
+
+    # sort + limit trước rồi mới lookup nên chỉ join đúng số phần tử của 1 trang
+    pipeline = [
+        {"$match": keyset_paging.match({key_query: value_query})},
+        {"$sort": dict(keyset_paging.sort)},
+        {"$limit": keyset_paging.fetch_limit},
+        {
+            "$lookup": {
+                "from": foreign_table,
+                'localField': local_field,
+                'foreignField': foreign_field,
+                "as": f'{foreign_table}_document'
+            }
+        }
+    ]
+    if show_value:
+        pipeline.append({"$project": show_value})
+
+    cursor = db[database_name].aggregate(pipeline)
+
+    return keyset_paging.page(await cursor.to_list(None))
@@ -0,0 +1,221 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from app.library.constant.group_member import (
+    GROUP_MEMBER_COLLECTION, GROUP_MEMBER_STORAGE_MODE,
+    GROUP_MEMBER_STORAGE_MODE_COLLECTION
+)
+from app.library.function import KeysetPaging, paging
+from app.model.base import db
+
+DUPLICATE_KEY_ERROR_CODE = 11000
+
+# chế độ embedded: member_count tính lại từ watcher_ids trong cùng lần cập nhật ( pipeline update ),
+# group cũ chưa có member_count cũng đúng thay vì $inc từ 0
+MEMBER_COUNT_STAGE = {'$set': {'member_count': {'$size': '$watcher_ids'}}}
+
+
+def is_collection_mode() -> bool:
+    return GROUP_MEMBER_STORAGE_MODE == GROUP_MEMBER_STORAGE_MODE_COLLECTION
+
+
+def build_member_rows(group_profile_id: str, watchers: List[dict]) -> List[dict]:
+    return [
+        {
+            "group_profile_id": group_profile_id,
+            "watcher_id": watcher['watcher_id'],
+            # lưu _id của watcher để phân trang thành viên giống phân trang trên collection watcher
+            "watcher_object_id": watcher['_id'],
+            "created_at": datetime.now()
+        } for watcher in watchers
+    ]
+
+
+async def get_watchers(watcher_ids: Iterable[str]) -> Tuple[List[dict], List[str]]:
+    """
+    :return: (watcher tồn tại chỉ gồm `_id`, `watcher_id`), (watcher_id ko tồn tại theo thứ tự truyền vào)
+    """
+    watcher_ids = list(watcher_ids)
+    if not watcher_ids:
+        return [], []
+    cursor = db.watcher.find({"watcher_id": {"$in": watcher_ids}}, {"_id": 1, "watcher_id": 1})
+    watchers = await cursor.to_list(None)
+    exist_watcher_ids = {watcher['watcher_id'] for watcher in watchers}
+    return watchers, [watcher_id for watcher_id in watcher_ids if watcher_id not in exist_watcher_ids]
+
+
+async def get_existing_member_ids(group_profile: dict, watcher_ids: Iterable[str]) -> Set[str]:
+    """
+    Những watcher_id trong `watcher_ids` đang là thành viên của group
+    """
+    watcher_ids = set(watcher_ids)
+    if not watcher_ids:
+        return set()
+
+    if not is_collection_mode():
+        if 'watcher_ids' in group_profile:
+            return watcher_ids.intersection(group_profile['watcher_ids'] or [])
+        # group_profile lấy từ cache ko có watcher_ids, chỉ lấy phần giao trên mongo thay vì tải cả mảng thành viên
+        cursor = db.group_profile.aggregate([
+            {"$match": {"group_profile_id": group_profile['group_profile_id']}},
+            {
+                "$project": {
+                    "_id": 0,
+                    "watcher_ids": {"$setIntersection": [{"$ifNull": ["$watcher_ids", []]}, list(watcher_ids)]}
+                }
+            }
+        ])
+        rows = await cursor.to_list(None)
+        return set(rows[0]['watcher_ids']) if rows else set()
+
+    cursor = db[GROUP_MEMBER_COLLECTION].find(
+        {"group_profile_id": group_profile['group_profile_id'], "watcher_id": {"$in": list(watcher_ids)}},
+        {"watcher_id": 1, "_id": 0}
+    )
+    return {member['watcher_id'] async for member in cursor}
+
+
+async def is_member(group_profile: dict, watcher_id: str) -> bool:
+    return watcher_id in await get_existing_member_ids(group_profile, [watcher_id])
+
+
+async def get_member_ids(group_profile_id: str, group_profile: Optional[dict] = None) -> List[str]:
+    """
+    :param group_profile: group_profile đã đọc sẵn cả watcher_ids thì ko đọc lại ở chế độ embedded
+    """
+    if not is_collection_mode():
+        if group_profile is None or 'watcher_ids' not in group_profile:
+            group_profile = await db.group_profile.find_one(
+                {"group_profile_id": group_profile_id}, {"watcher_ids": 1}
+            )
+        return (group_profile.get('watcher_ids') or []) if group_profile else []
+
+    cursor = db[GROUP_MEMBER_COLLECTION].find({"group_profile_id": group_profile_id}, {"watcher_id": 1, "_id": 0})
+    return [member['watcher_id'] async for member in cursor]
+
+
+async def insert_member_rows(group_profile_id: str, watchers: List[dict]) -> int:
+    """
+    :return: số thành viên thực sự được thêm, bỏ qua watcher đã là thành viên
+    """
+    if not watchers:
+        return 0
+    try:
+        result = await db[GROUP_MEMBER_COLLECTION].insert_many(
+            build_member_rows(group_profile_id, watchers), ordered=False
+        )
+        return len(result.inserted_ids)
+    except BulkWriteError as error:
+        if any(write_error['code'] != DUPLICATE_KEY_ERROR_CODE for write_error in error.details['writeErrors']):
+            raise
+        return error.details['nInserted']
+
+
+async def add_members(group_profile_id: str, watchers: List[dict]) -> Tuple[int, Optional[dict]]:
+    """
+    Thêm thành viên, watcher đã có trong group phải được loại ra trước ở chế độ embedded
+    :return: (số thành viên được thêm, group_profile sau khi cập nhật)
+    """
+    if not is_collection_mode():
+        watcher_ids = [watcher['watcher_id'] for watcher in watchers]
+        group_profile = await db.group_profile.find_one_and_update(
+            {"group_profile_id": group_profile_id},
+            [
+                {
+                    '$set': {
+                        'watcher_ids': {'$concatArrays': [{'$ifNull': ['$watcher_ids', []]}, {'$literal': watcher_ids}]},
+                        'updated_at': datetime.now()
+                    }
+                },
+                MEMBER_COUNT_STAGE
+            ],
+            return_document=ReturnDocument.AFTER
+        )
+        return len(watcher_ids), group_profile
+
+    number_added = await insert_member_rows(group_profile_id, watchers)
+    group_profile = await db.group_profile.find_one_and_update(
+        {"group_profile_id": group_profile_id},
+        {
+            '$inc': {'member_count': number_added},
+            '$set': {'updated_at': datetime.now()}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    return number_added, group_profile
+
+
+async def remove_members(group_profile_id: str, watcher_ids: List[str]) -> Tuple[int, Optional[dict]]:
+    """
+    Xoá thành viên, watcher ko có trong group phải được loại ra trước ở chế độ embedded
+    :return: (số thành viên bị xoá, group_profile sau khi cập nhật)
+    """
+    if not is_collection_mode():
+        group_profile = await db.group_profile.find_one_and_update(
+            {"group_profile_id": group_profile_id},
+            [
+                {
+                    '$set': {
+                        'watcher_ids': {
+                            '$filter': {
+                                'input': {'$ifNull': ['$watcher_ids', []]},
+                                'cond': {'$not': [{'$in': ['$$this', {'$literal': watcher_ids}]}]}
+                            }
+                        },
+                        'updated_at': datetime.now()
+                    }
+                },
+                MEMBER_COUNT_STAGE
+            ],
+            return_document=ReturnDocument.AFTER
+        )
+        return len(watcher_ids), group_profile
+
+    result = await db[GROUP_MEMBER_COLLECTION].delete_many(
+        {"group_profile_id": group_profile_id, "watcher_id": {"$in": watcher_ids}}
+    )
+    group_profile = await db.group_profile.find_one_and_update(
+        {"group_profile_id": group_profile_id},
+        {
+            '$inc': {'member_count': -result.deleted_count},
+            '$set': {'updated_at': datetime.now()}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    return result.deleted_count, group_profile
+
+
+async def is_watcher_in_any_group(watcher_id: str) -> bool:
+    if not is_collection_mode():
+        return await db.group_profile.find_one({"watcher_ids": watcher_id}, {"_id": 1}) is not None
+    return await db[GROUP_MEMBER_COLLECTION].find_one({"watcher_id": watcher_id}, {"_id": 1}) is not None
+
+
+async def get_member_page(group_profile: dict, last_watcher_id: Optional[str], limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    1 trang watcher của group, sắp xếp theo `_id` của watcher tăng dần
+    """
+    if not is_collection_mode():
+        return await paging(
+            query_param_for_paging=last_watcher_id,
+            database_name="watcher",
+            key_query="watcher_id",
+            value_query={"$in": await get_member_ids(group_profile['group_profile_id'], group_profile)},
+            db=db,
+            sort=1,
+            limit=limit)
+
+    # watcher_object_id là _id của watcher nên cursor dùng được cho cả 2 storage mode
+    keyset_paging = KeysetPaging([("watcher_object_id", 1)], last_watcher_id, limit)
+    member_cursor = db[GROUP_MEMBER_COLLECTION].find(
+        keyset_paging.match({"group_profile_id": group_profile['group_profile_id']}), {"watcher_object_id": 1}
+    ).sort(keyset_paging.sort).limit(keyset_paging.fetch_limit)
+    page = keyset_paging.page(await member_cursor.to_list(None))
+
+    watcher_object_ids = [member['watcher_object_id'] for member in page['data']]
+    watchers_cursor = db.watcher.find({"_id": {"$in": watcher_object_ids}}).sort("_id", 1)
+    page['data'] = await watchers_cursor.to_list(None)
+    return page
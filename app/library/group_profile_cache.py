@@ -0,0 +1,142 @@
+from typing import Iterable, List, Optional, Set
+
+from aioredis import Redis
+from aioredis.exceptions import RedisError, WatchError
+from bson import json_util
+from loguru import logger
+
+from app.library.cache import TTLCache
+from app.library.constant.cache import (
+    GROUP_MEMBER_CACHE_KEY_PREFIX, GROUP_MEMBER_CACHE_TTL,
+    GROUP_PROFILE_CACHE_KEY_PREFIX, GROUP_PROFILE_CACHE_MAX_SIZE,
+    GROUP_PROFILE_CACHE_TTL, GROUP_PROFILE_CACHE_VERSION,
+    GROUP_PROFILE_REDIS_CACHE_TTL
+)
+from app.library.group_member import get_existing_member_ids, get_member_ids
+from app.library.notification_counter import chunks
+from app.model.base import db
+
+# ko cache watcher_ids và last_activity_id: mảng thành viên rất lớn, activity mới nhất đổi theo từng bình luận.
+# Các field được cache ko đổi sau khi tạo group nên ko cần xoá cache, thành viên được cache riêng trong redis set
+GROUP_PROFILE_CACHE_SHOW_VALUE = {"_id": 1, "group_profile_id": 1, "created_by": 1}
+
+group_profile_cache = TTLCache(max_size=GROUP_PROFILE_CACHE_MAX_SIZE, ttl=GROUP_PROFILE_CACHE_TTL)
+
+
+def group_profile_cache_key(group_profile_id: str) -> str:
+    return f"{GROUP_PROFILE_CACHE_KEY_PREFIX}v{GROUP_PROFILE_CACHE_VERSION}:{group_profile_id}"
+
+
+async def load_group_profile(redis: Redis, group_profile_id: str) -> Optional[dict]:
+    key = group_profile_cache_key(group_profile_id)
+    try:
+        value = await redis.get(key)
+        if value is not None:
+            return json_util.loads(value)
+    except RedisError as error:
+        logger.warning(f"can not read group profile cache {group_profile_id}: {error}")
+
+    group_profile = await db.group_profile.find_one({"group_profile_id": group_profile_id}, GROUP_PROFILE_CACHE_SHOW_VALUE)
+    if group_profile is None:
+        return None
+
+    try:
+        await redis.set(key, json_util.dumps(group_profile), ex=GROUP_PROFILE_REDIS_CACHE_TTL)
+    except RedisError as error:
+        logger.warning(f"can not write group profile cache {group_profile_id}: {error}")
+    return group_profile
+
+
+async def get_group_profile(redis: Redis, group_profile_id: str, system_name: Optional[str] = None) -> Optional[dict]:
+    """
+    Thông tin group gồm các field trong GROUP_PROFILE_CACHE_SHOW_VALUE, đọc lần lượt từ cache trong process,
+    redis rồi mới tới mongo. Redis lỗi thì đọc thẳng từ mongo
+    :param system_name: chỉ trả về group do hệ thống này tạo
+    """
+    group_profile = group_profile_cache.get(group_profile_id)
+    if group_profile is None:
+        group_profile = await load_group_profile(redis, group_profile_id)
+        if group_profile is None:
+            return None
+        group_profile_cache.set(group_profile_id, group_profile)
+
+    if system_name is not None and group_profile['created_by'] != system_name:
+        return None
+    # trả về bản sao để view thêm field vào ko làm thay đổi cache
+    return dict(group_profile)
+
+
+def group_member_cache_key(group_profile_id: str) -> str:
+    return f"{GROUP_MEMBER_CACHE_KEY_PREFIX}{group_profile_id}"
+
+
+def group_member_version_key(group_profile_id: str) -> str:
+    # tăng mỗi lần thành viên của group thay đổi
+    return f"{GROUP_MEMBER_CACHE_KEY_PREFIX}{group_profile_id}:version"
+
+
+async def build_member_cache(redis: Redis, group_profile: dict) -> List[str]:
+    """
+    Tạo set thành viên của group từ mongo. Thành viên thay đổi trong lúc đang đọc ( invalidate_group_members )
+    thì ko ghi set cũ vào redis
+    :return: watcher_id thành viên đọc từ mongo
+    """
+    group_profile_id = group_profile['group_profile_id']
+    key = group_member_cache_key(group_profile_id)
+    async with redis.pipeline(transaction=True) as pipeline:
+        await pipeline.watch(group_member_version_key(group_profile_id))
+        member_ids = await get_member_ids(group_profile_id, group_profile)
+        pipeline.multi()
+        pipeline.delete(key)
+        # redis ko lưu set rỗng, phần tử "" để group chưa có thành viên vẫn có cache
+        pipeline.sadd(key, "")
+        for chunk in chunks(member_ids):
+            pipeline.sadd(key, *chunk)
+        pipeline.expire(key, GROUP_MEMBER_CACHE_TTL)
+        try:
+            await pipeline.execute()
+        except WatchError:
+            pass
+    return member_ids
+
+
+async def get_cached_member_ids(redis: Redis, group_profile: dict, watcher_ids: Iterable[str]) -> Set[str]:
+    """
+    Những watcher_id trong `watcher_ids` là thành viên của group, kiểm tra trên redis set của group trong 1 round trip.
+    Set chưa có thì tạo từ mongo, redis lỗi thì kiểm tra trên mongo.
+    Dùng cho đường đọc, api thêm/xoá thành viên vẫn kiểm tra trên mongo
+    """
+    watcher_ids = [watcher_id for watcher_id in dict.fromkeys(watcher_ids) if watcher_id]
+    if not watcher_ids:
+        return set()
+
+    key = group_member_cache_key(group_profile['group_profile_id'])
+    try:
+        pipeline = redis.pipeline(transaction=False)
+        pipeline.exists(key)
+        for watcher_id in watcher_ids:
+            pipeline.sismember(key, watcher_id)
+        is_exist, *is_members = await pipeline.execute()
+        if is_exist:
+            return {watcher_id for watcher_id, is_member in zip(watcher_ids, is_members) if is_member}
+        member_ids = await build_member_cache(redis, group_profile)
+        return set(watcher_ids).intersection(member_ids)
+    except RedisError as error:
+        logger.warning(f"can not read group member cache {group_profile['group_profile_id']}: {error}")
+    return await get_existing_member_ids(group_profile, watcher_ids)
+
+
+async def invalidate_group_members(redis: Redis, group_profile_id: str) -> None:
+    """
+    Gọi sau khi thêm/xoá thành viên, cùng chỗ với invalidate_mention_index
+    """
+    version_key = group_member_version_key(group_profile_id)
+    try:
+        pipeline = redis.pipeline(transaction=True)
+        pipeline.delete(group_member_cache_key(group_profile_id))
+        pipeline.incr(version_key)
+        # version chỉ cần sống lâu hơn thời gian tạo set
+        pipeline.expire(version_key, GROUP_MEMBER_CACHE_TTL)
+        await pipeline.execute()
+    except RedisError as error:
+        logger.warning(f"can not delete group member cache {group_profile_id}: {error}")
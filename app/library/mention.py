@@ -0,0 +1,136 @@
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from aioredis import Redis
+from aioredis.exceptions import WatchError
+
+from app.library.cache import TTLCache
+from app.library.constant.cache import (
+    USERNAME_CACHE_MAX_SIZE, USERNAME_CACHE_NAME, USERNAME_CACHE_TTL
+)
+from app.library.constant.mention import (
+    MENTION_ALL, MENTION_INDEX_KEY_PREFIX, MENTION_INDEX_TTL
+)
+from app.library.push import publish_cache_invalidation
+from app.library.recipient import get_member_watchers
+from app.model.base import db
+
+# @username kết thúc bởi white space, @ kế tiếp hoặc hết chuỗi
+MENTION_PATTERN = re.compile(r'@([^\s@]+)')
+
+# member của index có dạng "username viết thường \0 username \0 watcher_id" để tìm theo prefix ko phân biệt hoa thường
+MENTION_INDEX_SEPARATOR = "\x00"
+# ký tự lớn nhất của unicode, dùng làm cận trên khi tìm theo prefix bằng ZRANGEBYLEX
+MENTION_INDEX_MAX_CHAR = chr(0x10FFFF)
+
+# username ko đổi sau khi tạo watcher nên cache được lâu, cập nhật khi tạo watcher, xoá trên mọi worker khi xoá watcher
+username_cache = TTLCache(max_size=USERNAME_CACHE_MAX_SIZE, ttl=USERNAME_CACHE_TTL, name=USERNAME_CACHE_NAME)
+
+
+class Mentions(NamedTuple):
+    # True khi ko tag ai hoặc tag @all, tất cả thành viên nhận cùng 1 thông báo
+    is_all: bool
+    # username được tag theo thứ tự xuất hiện, ko trùng lặp
+    usernames: List[str]
+
+
+def parse_mentions(content: Optional[str], author_username: str) -> Mentions:
+    usernames = [
+        username for username in dict.fromkeys(MENTION_PATTERN.findall(content or ''))
+        if username != author_username
+    ]
+    return Mentions(is_all=not usernames or MENTION_ALL in usernames, usernames=usernames)
+
+
+def cache_usernames(watchers: Iterable[dict]) -> None:
+    for watcher in watchers:
+        username_cache.set(watcher['username'], watcher['watcher_id'])
+
+
+async def invalidate_usernames(redis: Redis, usernames: List[str]) -> None:
+    # username của watcher bị xoá có thể được dùng lại cho watcher khác
+    await publish_cache_invalidation(redis, USERNAME_CACHE_NAME, usernames)
+
+
+async def get_watcher_ids_by_usernames(usernames: Iterable[str]) -> Dict[str, str]:
+    """
+    :return: {username: watcher_id}, chỉ query những username chưa có trong cache
+    """
+    username__watcher_id = {}
+    missing_usernames = []
+    for username in dict.fromkeys(usernames):
+        watcher_id = username_cache.get(username)
+        if watcher_id is None:
+            missing_usernames.append(username)
+        else:
+            username__watcher_id[username] = watcher_id
+
+    if missing_usernames:
+        cursor = db.watcher.find({"username": {"$in": missing_usernames}}, {"watcher_id": 1, "username": 1, "_id": 0})
+        watchers = await cursor.to_list(None)
+        cache_usernames(watchers)
+        username__watcher_id.update({watcher['username']: watcher['watcher_id'] for watcher in watchers})
+    return username__watcher_id
+
+
+def mention_index_key(group_profile_id: str) -> str:
+    return f"{MENTION_INDEX_KEY_PREFIX}{group_profile_id}"
+
+
+def mention_index_version_key(group_profile_id: str) -> str:
+    # tăng mỗi lần thành viên của group thay đổi
+    return f"{MENTION_INDEX_KEY_PREFIX}{group_profile_id}:version"
+
+
+async def build_mention_index(redis: Redis, group_profile_id: str, group_profile: Optional[dict] = None) -> None:
+    """
+    Thành viên thay đổi ( invalidate_mention_index ) trong lúc đang đọc từ mongo thì ko ghi danh sách cũ vào redis
+    ( WATCH version của group ), lần gợi ý sau sẽ tạo lại
+    """
+    key = mention_index_key(group_profile_id)
+    async with redis.pipeline(transaction=True) as pipeline:
+        await pipeline.watch(mention_index_version_key(group_profile_id))
+        members = await get_member_watchers(group_profile_id, group_profile)
+        pipeline.multi()
+        pipeline.delete(key)
+        if members:
+            pipeline.zadd(key, {
+                MENTION_INDEX_SEPARATOR.join([member['username'].lower(), member['username'], member['watcher_id']]): 0
+                for member in members
+            })
+            pipeline.expire(key, MENTION_INDEX_TTL)
+        try:
+            await pipeline.execute()
+        except WatchError:
+            pass
+
+
+async def invalidate_mention_index(redis: Redis, group_profile_id: str) -> None:
+    version_key = mention_index_version_key(group_profile_id)
+    pipeline = redis.pipeline(transaction=True)
+    pipeline.delete(mention_index_key(group_profile_id))
+    pipeline.incr(version_key)
+    # version chỉ cần sống lâu hơn thời gian tạo index
+    pipeline.expire(version_key, MENTION_INDEX_TTL)
+    await pipeline.execute()
+
+
+async def get_mention_suggestions(redis: Redis, group_profile_id: str, prefix: str, limit: int) -> Optional[List[dict]]:
+    """
+    Thành viên có username bắt đầu bằng `prefix` theo thứ tự từ điển, chỉ tốn 1 round trip tới redis
+    :return: None khi index của group chưa được tạo
+    """
+    key = mention_index_key(group_profile_id)
+    prefix = prefix.lower()
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.zrangebylex(key, f"[{prefix}", f"[{prefix}{MENTION_INDEX_MAX_CHAR}", start=0, num=limit)
+    pipeline.exists(key)
+    members, is_exist = await pipeline.execute()
+    if not is_exist:
+        return None
+
+    suggestions = []
+    for member in members:
+        _, username, watcher_id = member.split(MENTION_INDEX_SEPARATOR)
+        suggestions.append({"watcher_id": watcher_id, "username": username})
+    return suggestions
@@ -0,0 +1,169 @@
+import bisect
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# tính bằng giây
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# mọi metric được tạo ra đều nằm trong registry để xuất ra /metrics
+REGISTRY: List["Metric"] = []
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(label_names: Sequence[str], label_values: Sequence[str]) -> str:
+    if not label_names:
+        return ""
+    labels = ",".join(
+        f'{name}="{escape_label_value(str(value))}"' for name, value in zip(label_names, label_values)
+    )
+    return f"{{{labels}}}"
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        # metric được cập nhật từ cả thread của motor ( command listener ) nên cần lock
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def samples(self) -> List[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """
+        :return: list ( tên, label names, label values, giá trị )
+        """
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        for name, label_names, label_values, value in self.samples():
+            lines.append(f"{name}{format_labels(label_names, label_values)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        super().__init__(name, description, label_names)
+        self.series: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, value: float = 1, *label_values: str) -> None:
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + value
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, self.label_names, label_values, value) for label_values, value in self.series.items()]
+
+
+class Gauge(Metric):
+    """
+    Giá trị tại thời điểm đọc, `function` trả về {label values: giá trị} được gọi mỗi lần xuất metric
+    dùng cho những thành phần đã tự đếm sẵn ( redis pool, push hub, cache )
+    """
+    metric_type = "gauge"
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            label_names: Sequence[str] = (),
+            function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+    ):
+        super().__init__(name, description, label_names)
+        self.function = function
+        self.series: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *label_values: str) -> None:
+        with self.lock:
+            self.series[label_values] = value
+
+    def inc(self, value: float = 1, *label_values: str) -> None:
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + value
+
+    def dec(self, value: float = 1, *label_values: str) -> None:
+        self.inc(-value, *label_values)
+
+    def samples(self):
+        with self.lock:
+            series = dict(self.series)
+        if self.function is not None:
+            series.update(self.function())
+        return [(self.name, self.label_names, label_values, value) for label_values, value in series.items()]
+
+
+class Histogram(Metric):
+    """
+    Histogram theo từng bộ label, mỗi bucket đếm số lần quan sát có giá trị <= bucket
+    """
+    metric_type = "histogram"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (số lần theo từng bucket, tổng giá trị, số lần quan sát)
+        self.series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, ...], dict]:
+        result = {}
+        with self.lock:
+            series_items = [
+                (label_values, list(bucket_counts), total, count)
+                for label_values, (bucket_counts, total, count) in self.series.items()
+            ]
+        for label_values, bucket_counts, total, count in series_items:
+            cumulative = 0
+            buckets = {}
+            for bucket, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                buckets[bucket] = cumulative
+            result[label_values] = {"buckets": buckets, "sum": total, "count": count}
+        return result
+
+    def samples(self):
+        samples = []
+        bucket_label_names = self.label_names + ("le",)
+        for label_values, series in self.snapshot().items():
+            for bucket, cumulative in series["buckets"].items():
+                samples.append((f"{self.name}_bucket", bucket_label_names, label_values + (format_value(bucket),), cumulative))
+            samples.append((f"{self.name}_bucket", bucket_label_names, label_values + ("+Inf",), series["count"]))
+            samples.append((f"{self.name}_sum", self.label_names, label_values, series["sum"]))
+            samples.append((f"{self.name}_count", self.label_names, label_values, series["count"]))
+        return samples
+
+
+def render_metrics() -> str:
+    """
+    Xuất toàn bộ metric theo định dạng text của Prometheus
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
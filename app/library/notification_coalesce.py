@@ -0,0 +1,233 @@
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from aioredis import Redis
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.library.constant.notification import (
+    NOTIFICATION_COALESCE_KEY_PREFIX, NOTIFICATION_COALESCE_WINDOW,
+    NOTIFICATION_TYPE_COALESCE
+)
+from app.library.constant.push import PUSH_TYPE_NOTIFICATION
+from app.library.notification_counter import chunks
+from app.library.notification_storage import (
+    count_recipients_of_notifications, get_unread_watcher_ids_of_notifications,
+    remove_unread_recipients, upsert_activity_notifications
+)
+from app.library.push import (
+    notification_push_data, publish, publish_notifications
+)
+from app.model.base import db
+
+
+def get_coalesce_window(system_name: str) -> int:
+    return NOTIFICATION_COALESCE_WINDOW.get(system_name, 0)
+
+
+def coalesce_key(group_profile_id: str, watcher_id: str) -> str:
+    return f"{NOTIFICATION_COALESCE_KEY_PREFIX}{group_profile_id}:{watcher_id}"
+
+
+def build_coalesce_content(username: str, actors: List[str], comment_count: int) -> str:
+    """
+    Nội dung theo số người đã bình luận, người bình luận mới nhất đứng đầu
+    """
+    number_other_actor = len(set(actors) - {username})
+    if number_other_actor:
+        return f"{username} và {number_other_actor} người khác vừa bình luận"
+    if comment_count > 1:
+        return f"{username} vừa bình luận {comment_count} lần"
+    return f"{username} vừa bình luận"
+
+
+def build_coalesce_content_expression(username: str) -> dict:
+    """
+    Giống build_coalesce_content nhưng tính trên mongo từ actors, comment_count sau khi cập nhật
+    nên ko cần đọc thông báo về rồi ghi lại
+    """
+    number_other_actor = {"$size": {"$setDifference": ["$actors", {"$literal": [username]}]}}
+    # $literal để username bắt đầu bằng $ ko bị hiểu là tên field
+    username = {"$literal": username}
+    return {
+        "$switch": {
+            "branches": [
+                {
+                    "case": {"$gt": [number_other_actor, 0]},
+                    "then": {"$concat": [username, " và ", {"$toString": number_other_actor}, " người khác vừa bình luận"]}
+                },
+                {
+                    "case": {"$gt": ["$comment_count", 1]},
+                    "then": {"$concat": [username, " vừa bình luận ", {"$toString": "$comment_count"}, " lần"]}
+                }
+            ],
+            "default": {"$concat": [username, " vừa bình luận"]}
+        }
+    }
+
+
+def build_coalesce_fields(job: dict) -> dict:
+    # thêm vào thông báo "vừa bình luận" mới để các bình luận sau gộp vào được
+    return {"actors": [job['username']], "comment_count": 1}
+
+
+async def split_coalesced_recipients(
+        redis: Redis,
+        group_profile_id: str,
+        watcher_ids: List[str]
+) -> Tuple[Dict[ObjectId, List[str]], Dict[ObjectId, List[str]], List[str]]:
+    """
+    Tách những watcher còn thông báo "vừa bình luận" chưa đọc trong cửa sổ gộp của group.
+    Nội dung thông báo dùng chung cho mọi người nhận nên chỉ được sửa khi người nhận đúng bằng những watcher được gộp,
+    nếu ko thì những watcher đó được chuyển sang thông báo riêng
+    :return: ({_id thông báo: watcher_id được gộp vào thông báo đó},
+        {_id thông báo: watcher_id được gộp nhưng phải tách khỏi thông báo đó}, watcher_id cần tạo thông báo mới)
+    """
+    notification_id__candidate_ids: Dict[ObjectId, List[str]] = {}
+    for chunk in chunks(watcher_ids):
+        notification_ids = await redis.mget([coalesce_key(group_profile_id, watcher_id) for watcher_id in chunk])
+        for watcher_id, notification_id in zip(chunk, notification_ids):
+            if notification_id is not None:
+                notification_id__candidate_ids.setdefault(ObjectId(notification_id), []).append(watcher_id)
+    if not notification_id__candidate_ids:
+        return {}, {}, watcher_ids
+
+    # watcher đã đọc thông báo cũ thì nhận thông báo mới
+    notification_id__watcher_ids = await get_unread_watcher_ids_of_notifications(
+        list(notification_id__candidate_ids),
+        [watcher_id for candidate_ids in notification_id__candidate_ids.values() for watcher_id in candidate_ids]
+    )
+    coalesced_ids = {
+        watcher_id
+        for notification_id, unread_ids in notification_id__watcher_ids.items()
+        for watcher_id in set(unread_ids).intersection(notification_id__candidate_ids[notification_id])
+    }
+    notification_id__coalesced_ids = {}
+    for notification_id, candidate_ids in notification_id__candidate_ids.items():
+        ids = [watcher_id for watcher_id in candidate_ids if watcher_id in coalesced_ids]
+        if ids:
+            notification_id__coalesced_ids[notification_id] = ids
+
+    # watcher được gộp đều là người nhận chưa đọc nên cùng số lượng nghĩa là ko còn người nhận nào khác
+    notification_id__number_recipient = await count_recipients_of_notifications(list(notification_id__coalesced_ids))
+    notification_id__split_ids = {
+        notification_id: ids for notification_id, ids in notification_id__coalesced_ids.items()
+        if notification_id__number_recipient.get(notification_id) != len(ids)
+    }
+    return (
+        {
+            notification_id: ids for notification_id, ids in notification_id__coalesced_ids.items()
+            if notification_id not in notification_id__split_ids
+        },
+        notification_id__split_ids,
+        [watcher_id for watcher_id in watcher_ids if watcher_id not in coalesced_ids]
+    )
+
+
+async def remember_coalesce_target(
+        redis: Redis,
+        group_profile_id: str,
+        notification_id: ObjectId,
+        watcher_ids: List[str],
+        window: int
+) -> None:
+    """
+    Các bình luận trong `window` giây tới sẽ được gộp vào thông báo này, ko gia hạn khi có bình luận mới
+    để thông báo của 1 cuộc trò chuyện dài vẫn được tạo mới định kỳ
+    """
+    for chunk in chunks(watcher_ids):
+        pipeline = redis.pipeline(transaction=False)
+        for watcher_id in chunk:
+            pipeline.set(coalesce_key(group_profile_id, watcher_id), str(notification_id), ex=window)
+        await pipeline.execute()
+
+
+async def move_coalesce_target(
+        redis: Redis,
+        group_profile_id: str,
+        notification_id: ObjectId,
+        watcher_ids: List[str]
+) -> None:
+    # giữ nguyên thời gian còn lại của cửa sổ gộp, key đã hết hạn thì ko tạo lại
+    for chunk in chunks(watcher_ids):
+        pipeline = redis.pipeline(transaction=False)
+        for watcher_id in chunk:
+            pipeline.set(coalesce_key(group_profile_id, watcher_id), str(notification_id), xx=True, keepttl=True)
+        await pipeline.execute()
+
+
+async def coalesce_comment(redis: Redis, job: dict, notification_id: ObjectId, watcher_ids: List[str]) -> None:
+    """
+    Gộp bình luận của job vào thông báo "vừa bình luận" đã có, ko tăng số thông báo chưa đọc.
+    Chạy lại với cùng activity ko gộp thêm lần nữa
+    """
+    activity_id = ObjectId(job['activity_id'])
+    # pipeline update: content được tính từ actors, comment_count mới trong cùng 1 lần ghi
+    notification = await db.notification.find_one_and_update(
+        {"_id": notification_id, "activity_id": {"$ne": activity_id}, "activity_ids": {"$ne": activity_id}},
+        [
+            {
+                "$set": {
+                    "actors": {"$setUnion": [{"$ifNull": ["$actors", []]}, {"$literal": [job['username']]}]},
+                    "activity_ids": {"$concatArrays": [{"$ifNull": ["$activity_ids", []]}, [activity_id]]},
+                    "comment_count": {"$add": [{"$ifNull": ["$comment_count", 1]}, 1]},
+                    "watcher_created_activity": {"$literal": job['watcher_id']},
+                    "updated_by": {"$literal": job['system_name']},
+                    "updated_at": datetime.now()
+                }
+            },
+            {"$set": {"content": build_coalesce_content_expression(job['username'])}}
+        ],
+        projection={"_id": 1, "content": 1, "watcher_created_activity": 1, "created_at": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if notification is None:
+        # thông báo do chính job này tách ra ( split_comment ): lần chạy trước lỗi trước khi bỏ watcher
+        # khỏi thông báo cũ thì bỏ lại
+        split_notification = await db.notification.find_one(
+            {"_id": notification_id, "activity_id": activity_id}, {"coalesced_notification_id": 1}
+        )
+        if split_notification is not None and split_notification.get('coalesced_notification_id'):
+            await remove_unread_recipients(split_notification['coalesced_notification_id'], watcher_ids)
+        return
+
+    notification['activity_id'] = activity_id
+    await publish(redis, PUSH_TYPE_NOTIFICATION, notification_push_data(notification), watcher_ids)
+
+
+async def split_comment(redis: Redis, job: dict, notification_id: ObjectId, watcher_ids: List[str]) -> None:
+    """
+    Thông báo "vừa bình luận" còn người nhận khác nên ko sửa nội dung được: chuyển những watcher được gộp sang
+    1 thông báo mới chỉ của họ với nội dung đã gộp, số thông báo chưa đọc ko đổi.
+    Chạy lại với cùng activity ko tạo thêm thông báo
+    """
+    source = await db.notification.find_one(
+        {"_id": notification_id}, {"activity_id": 1, "activity_ids": 1, "actors": 1, "comment_count": 1}
+    )
+    if source is None:
+        return
+
+    activity_id = ObjectId(job['activity_id'])
+    actors = list(dict.fromkeys([job['username'], *(source.get('actors') or [])]))
+    comment_count = source.get('comment_count', 1) + 1
+    notification = {
+        "content": build_coalesce_content(job['username'], actors, comment_count),
+        "watcher_noti_status": [{"watcher_id": watcher_id, "status": False} for watcher_id in watcher_ids],
+        "activity_id": activity_id,
+        "activity_notification_type": NOTIFICATION_TYPE_COALESCE,
+        "coalesced_notification_id": notification_id,
+        "activity_ids": [*source.get('activity_ids', []), source['activity_id']],
+        "actors": actors,
+        "comment_count": comment_count,
+        "watcher_created_activity": job['watcher_id'],
+        "created_by": job['system_name'],
+        "updated_by": job['system_name'],
+        "created_at": datetime.now(),
+        "updated_at": datetime.now()
+    }
+    new_notifications = await upsert_activity_notifications([notification])
+    # trỏ cửa sổ gộp sang thông báo mới trước khi bỏ watcher khỏi thông báo cũ: lần chạy lại sẽ gộp vào
+    # thông báo mới ( coalesce_comment ) thay vì tạo thêm thông báo "vừa bình luận"
+    await move_coalesce_target(redis, job['group_profile_id'], notification['_id'], watcher_ids)
+    await remove_unread_recipients(notification_id, watcher_ids)
+    await publish_notifications(redis, new_notifications)
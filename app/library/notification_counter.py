@@ -0,0 +1,120 @@
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+from aioredis import Redis
+
+from app.library.constant.redis import REDIS_COUNTER_CHUNK_SIZE
+
+# chỉ cập nhật key đang tồn tại (watcher đang online), INCRBY giữ nguyên thời gian sống của key
+# và số thông báo chưa đọc không bao giờ nhỏ hơn 0
+UPDATE_ONLINE_COUNTER_SCRIPT = """
+local updated = 0
+for index, key in ipairs(KEYS) do
+    local value = redis.call('GET', key)
+    if value then
+        local delta = tonumber(ARGV[index])
+        local current = tonumber(value) or 0
+        if current + delta < 0 then
+            delta = -current
+        end
+        redis.call('INCRBY', key, delta)
+        updated = updated + 1
+    end
+end
+return updated
+"""
+
+# giống UPDATE_ONLINE_COUNTER_SCRIPT, KEYS[1] là key đánh dấu chunk đã được cập nhật ( sống ARGV[1] giây ),
+# tăng counter và ghi key đánh dấu trong cùng 1 script nên job chạy lại ko cộng thêm lần nữa
+UPDATE_ONLINE_COUNTER_ONCE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('SET', KEYS[1], 1, 'EX', ARGV[1])
+local updated = 0
+for index = 2, #KEYS do
+    local value = redis.call('GET', KEYS[index])
+    if value then
+        local delta = tonumber(ARGV[index])
+        local current = tonumber(value) or 0
+        if current + delta < 0 then
+            delta = -current
+        end
+        redis.call('INCRBY', KEYS[index], delta)
+        updated = updated + 1
+    end
+end
+return updated
+"""
+
+
+def chunks(data: list, size: int = REDIS_COUNTER_CHUNK_SIZE):
+    for index in range(0, len(data), size):
+        yield data[index:index + size]
+
+
+async def update_online_counters(
+        redis: Redis,
+        watcher_id__delta: Dict[str, int],
+        marker_key: Optional[str] = None,
+        marker_ttl: int = 0
+) -> int:
+    """
+    Cập nhật số thông báo chưa đọc cho nhiều watcher, mỗi chunk chỉ tốn 1 round trip tới redis
+    :param marker_key: có thì mỗi chunk chỉ được cập nhật 1 lần trong `marker_ttl` giây ( key `marker_key:<chunk>` ),
+        dùng cho job có thể chạy lại
+    :return: số watcher đang online được cập nhật
+    """
+    items = [(watcher_id, delta) for watcher_id, delta in watcher_id__delta.items() if delta]
+    if not items:
+        return 0
+
+    if marker_key is None:
+        script = redis.register_script(UPDATE_ONLINE_COUNTER_SCRIPT)
+    else:
+        script = redis.register_script(UPDATE_ONLINE_COUNTER_ONCE_SCRIPT)
+        # các lần chạy lại phải chia chunk giống nhau
+        items.sort()
+    number_updated = 0
+    for index, chunk in enumerate(chunks(items)):
+        keys = [watcher_id for watcher_id, _ in chunk]
+        args = [delta for _, delta in chunk]
+        if marker_key is not None:
+            keys.insert(0, f"{marker_key}:{index}")
+            args.insert(0, marker_ttl)
+        number_updated += await script(keys=keys, args=args)
+    return number_updated
+
+
+async def incr_online_counters(
+        redis: Redis,
+        watcher_ids: Iterable[str],
+        marker_key: Optional[str] = None,
+        marker_ttl: int = 0
+) -> int:
+    # watcher_id xuất hiện nhiều lần sẽ được cộng dồn
+    return await update_online_counters(redis, dict(Counter(watcher_ids)), marker_key, marker_ttl)
+
+
+async def decr_online_counters(redis: Redis, watcher_ids: Iterable[str]) -> int:
+    return await update_online_counters(
+        redis, {watcher_id: -number for watcher_id, number in Counter(watcher_ids).items()}
+    )
+
+
+async def set_counters(redis: Redis, watcher_id__number: Dict[str, int], expire_seconds: int) -> None:
+    # ghi nhiều counter bằng 1 pipeline, mỗi chunk 1 round trip
+    items = list(watcher_id__number.items())
+    for chunk in chunks(items):
+        async with redis.pipeline(transaction=False) as pipe:
+            for watcher_id, number in chunk:
+                pipe.setex(watcher_id, expire_seconds, number)
+            await pipe.execute()
+
+
+async def set_online_counter(redis: Redis, watcher_id: str, number: int) -> bool:
+    """
+    Ghi đè số thông báo chưa đọc của watcher đang online, giữ nguyên thời gian sống của key
+    :return: False nếu watcher ko online ( key ko tồn tại )
+    """
+    return bool(await redis.set(watcher_id, number, xx=True, keepttl=True))
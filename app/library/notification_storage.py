@@ -0,0 +1,483 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.library.constant.notification import (
+    NOTIFICATION_INBOX_COLLECTION, NOTIFICATION_STORAGE_MODE,
+    NOTIFICATION_STORAGE_MODE_INBOX
+)
+from app.library.function import KeysetPaging, paging_aggregation
+from app.model.base import db
+
+DUPLICATE_KEY_ERROR_CODE = 11000
+
+# các field xác định 1 notification của activity, khớp với unique index của collection notification
+ACTIVITY_NOTIFICATION_KEY = ("activity_id", "activity_notification_type", "coalesced_notification_id")
+
+NOTIFICATION_SHOW_VALUE = {
+    "_id": 1,
+    "content": 1,
+    "created_by": 1,
+    "updated_by": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "watcher_created_activity": 1,
+}
+
+
+def is_inbox_mode() -> bool:
+    return NOTIFICATION_STORAGE_MODE == NOTIFICATION_STORAGE_MODE_INBOX
+
+
+def build_inbox_rows(notification: dict, watcher_noti_status: List[dict]) -> List[dict]:
+    return [
+        {
+            "notification_id": notification['_id'],
+            "watcher_id": watcher['watcher_id'],
+            "status": watcher['status'],
+            "created_at": notification['created_at'],
+            "updated_at": notification['updated_at']
+        } for watcher in watcher_noti_status
+    ]
+
+
+async def insert_notifications(notifications: List[dict]) -> None:
+    """
+    Lưu notification theo storage mode đang cấu hình, các dict truyền vào được gán thêm `_id` giống insert_many
+    """
+    if not notifications:
+        return
+
+    if not is_inbox_mode():
+        await db.notification.insert_many(notifications)
+        return
+
+    # chỉ lưu nội dung thông báo 1 lần, trạng thái đọc của từng watcher lưu riêng trong inbox
+    bodies = [
+        {key: value for key, value in notification.items() if key != 'watcher_noti_status'}
+        for notification in notifications
+    ]
+    await db.notification.insert_many(bodies)
+
+    inbox_rows = []
+    for notification, body in zip(notifications, bodies):
+        notification['_id'] = body['_id']
+        inbox_rows.extend(build_inbox_rows(body, notification['watcher_noti_status']))
+
+    if inbox_rows:
+        await db[NOTIFICATION_INBOX_COLLECTION].insert_many(inbox_rows, ordered=False)
+
+
+async def insert_inbox_rows(inbox_rows: List[dict]) -> None:
+    # watcher đã có trong inbox ( trùng unique index ) được bỏ qua nên ghi lại nhiều lần ko bị nhân đôi
+    try:
+        await db[NOTIFICATION_INBOX_COLLECTION].insert_many(inbox_rows, ordered=False)
+    except BulkWriteError as error:
+        if any(write_error['code'] != DUPLICATE_KEY_ERROR_CODE for write_error in error.details['writeErrors']):
+            raise
+
+
+async def upsert_activity_notifications(notifications: List[dict]) -> List[dict]:
+    """
+    Lưu notification của activity, mỗi (activity_id, activity_notification_type, coalesced_notification_id)
+    chỉ có 1 notification nên job chạy lại hoặc bị chạy song song ko tạo thêm thông báo. Ở chế độ inbox người nhận
+    được ghi lại mỗi lần, lần chạy trước lỗi sau khi lưu nội dung vẫn đủ người nhận. Notification đã có được gán `_id` cũ
+    :return: những notification được tạo trong lần gọi này
+    """
+    new_notifications = []
+    for notification in notifications:
+        notification.setdefault('_id', ObjectId())
+        key = {field: notification[field] for field in ACTIVITY_NOTIFICATION_KEY if field in notification}
+        body = {
+            field: value for field, value in notification.items()
+            if field not in key and (field != 'watcher_noti_status' or not is_inbox_mode())
+        }
+        try:
+            exist_notification = await db.notification.find_one_and_update(
+                key, {"$setOnInsert": body}, projection={"_id": 1}, upsert=True
+            )
+        except DuplicateKeyError:
+            # job chạy song song vừa tạo notification này
+            exist_notification = await db.notification.find_one(key, {"_id": 1})
+
+        if exist_notification is None:
+            new_notifications.append(notification)
+        else:
+            notification['_id'] = exist_notification['_id']
+        if is_inbox_mode() and notification['watcher_noti_status']:
+            await insert_inbox_rows(build_inbox_rows(notification, notification['watcher_noti_status']))
+    return new_notifications
+
+
+async def add_recipients(notification: dict, watcher_ids: List[str], batch_key: Any) -> dict:
+    """
+    Thêm watcher nhận notification đã được lưu trước đó, dùng khi gửi thông báo theo từng batch.
+    Chạy lại cùng `batch_key` ko thêm người nhận lần nữa.
+    Ở chế độ embedded mỗi batch được lưu thành 1 notification riêng ( cùng nội dung ) để document ko vượt 16MB
+    :return: notification mà các watcher trong batch nhận được
+    """
+    if not watcher_ids:
+        return notification
+
+    watcher_noti_status = [{"watcher_id": watcher_id, "status": False} for watcher_id in watcher_ids]
+    if not is_inbox_mode():
+        batch_notification = {key: value for key, value in notification.items() if key != '_id'}
+        return await db.notification.find_one_and_update(
+            {"broadcast_notification_id": notification['_id'], "broadcast_batch_key": batch_key},
+            {"$setOnInsert": {**batch_notification, "watcher_noti_status": watcher_noti_status}},
+            projection={"watcher_noti_status": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    # batch chạy lại sau khi lỗi: bỏ qua những watcher đã có trong inbox
+    await insert_inbox_rows(build_inbox_rows(notification, watcher_noti_status))
+    return notification
+
+
+async def get_unread_watcher_ids_of_activity(activity_id: ObjectId) -> List[str]:
+    """
+    Danh sách watcher chưa đọc các notification của activity, watcher chưa đọc nhiều notification sẽ xuất hiện
+    nhiều lần. Trạng thái đọc được lọc trên mongo nên ko phải tải cả watcher_noti_status về
+    """
+    if is_inbox_mode():
+        notification_cursor = db.notification.find({"activity_id": activity_id}, {"_id": 1})
+        notification_ids = [notification['_id'] async for notification in notification_cursor]
+        cursor = db[NOTIFICATION_INBOX_COLLECTION].find(
+            {"notification_id": {"$in": notification_ids}, "status": False},
+            {"watcher_id": 1, "_id": 0}
+        )
+        return [row['watcher_id'] async for row in cursor]
+
+    cursor = db.notification.aggregate([
+        {"$match": {"activity_id": activity_id}},
+        {
+            "$project": {
+                "_id": 0,
+                "watcher_ids": {
+                    "$map": {
+                        "input": {
+                            "$filter": {
+                                "input": "$watcher_noti_status",
+                                "cond": {"$eq": ["$$this.status", False]}
+                            }
+                        },
+                        "in": "$$this.watcher_id"
+                    }
+                }
+            }
+        }
+    ])
+    watcher_ids = []
+    async for notification in cursor:
+        watcher_ids.extend(notification['watcher_ids'])
+    return watcher_ids
+
+
+async def get_unread_watcher_ids_of_notifications(
+        notification_ids: List[ObjectId],
+        watcher_ids: List[str]
+) -> Dict[ObjectId, List[str]]:
+    """
+    Những watcher trong `watcher_ids` chưa đọc từng notification, notification ko còn ai chưa đọc sẽ ko có trong kết quả
+    """
+    notification_id__watcher_ids = {}
+    if not notification_ids or not watcher_ids:
+        return notification_id__watcher_ids
+
+    if is_inbox_mode():
+        cursor = db[NOTIFICATION_INBOX_COLLECTION].find(
+            {"notification_id": {"$in": notification_ids}, "watcher_id": {"$in": watcher_ids}, "status": False},
+            {"notification_id": 1, "watcher_id": 1, "_id": 0}
+        )
+        async for row in cursor:
+            notification_id__watcher_ids.setdefault(row['notification_id'], []).append(row['watcher_id'])
+        return notification_id__watcher_ids
+
+    cursor = db.notification.aggregate([
+        {"$match": {"_id": {"$in": notification_ids}}},
+        {
+            "$project": {
+                "watcher_ids": {
+                    "$map": {
+                        "input": {
+                            "$filter": {
+                                "input": "$watcher_noti_status",
+                                "cond": {"$and": [
+                                    {"$eq": ["$$this.status", False]},
+                                    {"$in": ["$$this.watcher_id", watcher_ids]}
+                                ]}
+                            }
+                        },
+                        "in": "$$this.watcher_id"
+                    }
+                }
+            }
+        }
+    ])
+    async for notification in cursor:
+        if notification['watcher_ids']:
+            notification_id__watcher_ids[notification['_id']] = notification['watcher_ids']
+    return notification_id__watcher_ids
+
+
+async def count_recipients_of_notifications(notification_ids: List[ObjectId]) -> Dict[ObjectId, int]:
+    """
+    Số người nhận ( cả đã đọc và chưa đọc ) của từng notification
+    """
+    if not notification_ids:
+        return {}
+
+    if is_inbox_mode():
+        cursor = db[NOTIFICATION_INBOX_COLLECTION].aggregate([
+            {"$match": {"notification_id": {"$in": notification_ids}}},
+            {"$group": {"_id": "$notification_id", "number": {"$sum": 1}}}
+        ])
+    else:
+        cursor = db.notification.aggregate([
+            {"$match": {"_id": {"$in": notification_ids}}},
+            {"$project": {"number": {"$size": {"$ifNull": ["$watcher_noti_status", []]}}}}
+        ])
+    return {row['_id']: row['number'] async for row in cursor}
+
+
+async def remove_unread_recipients(notification_id: ObjectId, watcher_ids: List[str]) -> None:
+    # chỉ bỏ watcher chưa đọc, gọi lại nhiều lần ko ảnh hưởng
+    if is_inbox_mode():
+        await db[NOTIFICATION_INBOX_COLLECTION].delete_many(
+            {"notification_id": notification_id, "watcher_id": {"$in": watcher_ids}, "status": False}
+        )
+        return
+
+    await db.notification.update_one(
+        {"_id": notification_id},
+        {"$pull": {"watcher_noti_status": {"watcher_id": {"$in": watcher_ids}, "status": False}}}
+    )
+
+
+async def get_notification_page_of_watcher(
+        watcher_id: str,
+        last_notification_id: Optional[str],
+        limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    1 trang notification của watcher, mỗi phần tử có `watcher_document` và
+    `watcher_noti_status` là list chỉ chứa trạng thái của watcher đó
+    """
+    if not is_inbox_mode():
+        return await paging_aggregation(
+            query_param_for_paging=last_notification_id,
+            database_name="notification",
+            key_query="watcher_noti_status.watcher_id",
+            value_query=watcher_id,
+            db=db,
+            foreign_table='watcher',
+            local_field="watcher_created_activity",
+            foreign_field="watcher_id",
+            show_value={
+                **NOTIFICATION_SHOW_VALUE,
+                "watcher_document": 1,
+                "watcher_noti_status": {
+                    "$filter": {
+                        "input": "$watcher_noti_status",
+                        "as": "watcher_noti_status",
+                        "cond": {
+                            "$eq": ["$$watcher_noti_status.watcher_id", watcher_id]
+                        }
+                    }
+                }
+            },
+            sort=-1,
+            limit=limit
+        )
+
+    # notification_id trong inbox chính là _id của notification nên cursor dùng được cho cả 2 storage mode
+    keyset_paging = KeysetPaging([("notification_id", -1)], last_notification_id, limit)
+
+    # sort + limit trên inbox trước rồi mới lookup nên chỉ join đúng số notification của 1 trang
+    cursor = db[NOTIFICATION_INBOX_COLLECTION].aggregate([
+        {"$match": keyset_paging.match({"watcher_id": watcher_id})},
+        {"$sort": dict(keyset_paging.sort)},
+        {"$limit": keyset_paging.fetch_limit},
+        {
+            "$lookup": {
+                "from": "notification",
+                "localField": "notification_id",
+                "foreignField": "_id",
+                "as": "notification"
+            }
+        },
+        {"$unwind": "$notification"},
+        {
+            "$lookup": {
+                "from": "watcher",
+                "localField": "notification.watcher_created_activity",
+                "foreignField": "watcher_id",
+                "as": "watcher_document"
+            }
+        },
+        {
+            "$project": {
+                **{key: f"$notification.{key}" for key in NOTIFICATION_SHOW_VALUE},
+                "notification_id": 1,
+                "watcher_document": 1,
+                "watcher_noti_status": [{"watcher_id": "$watcher_id", "status": "$status"}]
+            }
+        }
+    ])
+    return keyset_paging.page(await cursor.to_list(None))
+
+
+async def mark_notification_as_read(notification_id: ObjectId, watcher_id: str) -> Optional[dict]:
+    """
+    Chuyển trạng thái notification của watcher sang đã đọc
+    :return: notification sau khi cập nhật, None nếu không tồn tại hoặc đã đọc rồi
+    """
+    if not is_inbox_mode():
+        return await db.notification.find_one_and_update(
+            {
+                "_id": notification_id,
+                "watcher_noti_status": {
+                    "$elemMatch": {
+                        "watcher_id": watcher_id,
+                        "status": False
+                    }
+                }
+            },
+            {
+                "$set": {
+                    'watcher_noti_status.$.status': True
+                }
+            },
+            return_document=ReturnDocument.AFTER,
+            projection={
+                **NOTIFICATION_SHOW_VALUE,
+                "watcher_noti_status": {
+                    "$elemMatch": {
+                        "watcher_id": watcher_id
+                    }
+                }
+            }
+        )
+
+    inbox_row = await db[NOTIFICATION_INBOX_COLLECTION].find_one_and_update(
+        {"notification_id": notification_id, "watcher_id": watcher_id, "status": False},
+        {"$set": {"status": True, "updated_at": datetime.now()}},
+        projection={"_id": 1}
+    )
+    if inbox_row is None:
+        return None
+
+    notification = await db.notification.find_one({"_id": notification_id}, NOTIFICATION_SHOW_VALUE)
+    if notification is None:
+        return None
+    notification['watcher_noti_status'] = [{"watcher_id": watcher_id, "status": True}]
+    return notification
+
+
+async def mark_notifications_as_read(watcher_id: str, notification_ids: List[ObjectId]) -> int:
+    """
+    Chuyển nhiều notification của watcher sang đã đọc bằng 1 lần update_many
+    :return: số notification được chuyển từ chưa đọc sang đã đọc
+    """
+    if not notification_ids:
+        return 0
+    return await mark_unread_as_read(watcher_id, {"$in": notification_ids})
+
+
+async def mark_all_notifications_as_read(watcher_id: str, last_notification_id: Optional[ObjectId] = None) -> int:
+    """
+    Chuyển tất cả notification của watcher có `_id` <= last_notification_id sang đã đọc,
+    notification tới sau khi client load danh sách vẫn giữ trạng thái chưa đọc
+    """
+    return await mark_unread_as_read(watcher_id, {"$lte": last_notification_id} if last_notification_id else None)
+
+
+async def mark_unread_as_read(watcher_id: str, notification_id_condition: Optional[dict]) -> int:
+    if is_inbox_mode():
+        query = {"watcher_id": watcher_id, "status": False}
+        if notification_id_condition:
+            query["notification_id"] = notification_id_condition
+        result = await db[NOTIFICATION_INBOX_COLLECTION].update_many(
+            query, {"$set": {"status": True, "updated_at": datetime.now()}}
+        )
+        return result.modified_count
+
+    query = {"watcher_noti_status": {"$elemMatch": {"watcher_id": watcher_id, "status": False}}}
+    if notification_id_condition:
+        query["_id"] = notification_id_condition
+    # array_filters chỉ cập nhật phần tử của watcher trong mảng watcher_noti_status
+    result = await db.notification.update_many(
+        query,
+        {"$set": {"watcher_noti_status.$[watcher].status": True}},
+        array_filters=[{"watcher.watcher_id": watcher_id}]
+    )
+    return result.modified_count
+
+
+async def count_unread_notification(watcher_id: str) -> int:
+    # đếm ngay trên mongo bằng index, ko kéo document về app
+    if is_inbox_mode():
+        return await db[NOTIFICATION_INBOX_COLLECTION].count_documents({"watcher_id": watcher_id, "status": False})
+
+    return await db.notification.count_documents({
+        "watcher_noti_status": {
+            "$elemMatch": {
+                "watcher_id": watcher_id,
+                "status": False
+            }
+        }
+    })
+
+
+async def count_unread_notification_of_watchers(watcher_ids: List[str]) -> Dict[str, int]:
+    """
+    Đếm số thông báo chưa đọc của nhiều watcher trong 1 lần aggregate, watcher ko có thông báo sẽ có giá trị 0
+    """
+    watcher_id__number = {watcher_id: 0 for watcher_id in watcher_ids}
+    if not watcher_ids:
+        return watcher_id__number
+
+    if is_inbox_mode():
+        pipeline = [
+            {"$match": {"watcher_id": {"$in": watcher_ids}, "status": False}},
+            {"$group": {"_id": "$watcher_id", "number": {"$sum": 1}}}
+        ]
+        cursor = db[NOTIFICATION_INBOX_COLLECTION].aggregate(pipeline)
+    else:
+        pipeline = [
+            {
+                "$match": {
+                    "watcher_noti_status": {
+                        "$elemMatch": {"watcher_id": {"$in": watcher_ids}, "status": False}
+                    }
+                }
+            },
+            # lọc mảng trước khi unwind để ko phải bung toàn bộ watcher của notification
+            {
+                "$project": {
+                    "watcher_noti_status": {
+                        "$filter": {
+                            "input": "$watcher_noti_status",
+                            "as": "watcher_noti_status",
+                            "cond": {
+                                "$and": [
+                                    {"$in": ["$$watcher_noti_status.watcher_id", watcher_ids]},
+                                    {"$eq": ["$$watcher_noti_status.status", False]}
+                                ]
+                            }
+                        }
+                    }
+                }
+            },
+            {"$unwind": "$watcher_noti_status"},
+            {"$group": {"_id": "$watcher_noti_status.watcher_id", "number": {"$sum": 1}}}
+        ]
+        cursor = db.notification.aggregate(pipeline)
+
+    async for row in cursor:
+        watcher_id__number[row['_id']] = row['number']
+    return watcher_id__number
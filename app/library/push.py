@@ -0,0 +1,187 @@
+import asyncio
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from aioredis import Redis
+from aioredis.exceptions import RedisError
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+
+from app.library.cache import NAMED_CACHES
+from app.library.constant.push import (
+    CACHE_INVALIDATION_CHANNEL, PUSH_CHANNEL, PUSH_MAX_CONNECTIONS,
+    PUSH_QUEUE_SIZE, PUSH_RECONNECT_DELAY, PUSH_TYPE_COUNTER,
+    PUSH_TYPE_NOTIFICATION, PUSH_TYPE_RESYNC
+)
+from app.library.function import datetime_to_str
+from app.library.notification_counter import chunks
+
+PUSH_ENCODER = {ObjectId: str, datetime: datetime_to_str}
+
+
+class PushHub:
+    """
+    Nhận message từ redis pub/sub và chuyển tới các kết nối websocket/sse của watcher trong worker hiện tại,
+    cùng kết nối đó nhận lệnh xoá cache trong process
+    """
+    def __init__(self):
+        self.redis: Optional[Redis] = None
+        self.listen_task: Optional[asyncio.Task] = None
+        self.watcher_id__queues: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self.number_connection = 0
+        self.number_dropped_message = 0
+
+    def start(self, redis: Redis):
+        self.redis = redis
+        self.listen_task = asyncio.create_task(self.listen())
+
+    async def stop(self):
+        if self.listen_task is not None:
+            self.listen_task.cancel()
+            try:
+                await self.listen_task
+            except asyncio.CancelledError:
+                pass
+
+    async def listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(PUSH_CHANNEL, CACHE_INVALIDATION_CHANNEL)
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if not message:
+                        continue
+                    self.handle(message)
+            except RedisError as error:
+                logger.warning(f"push channel disconnected: {error}")
+                await asyncio.sleep(PUSH_RECONNECT_DELAY)
+            finally:
+                await pubsub.close()
+
+    def handle(self, message: dict):
+        # message lỗi chỉ bị bỏ qua, ko được làm dừng task nhận push và lệnh xoá cache của worker
+        try:
+            if message['channel'] == CACHE_INVALIDATION_CHANNEL:
+                invalidate_local_cache(json.loads(message['data']))
+            else:
+                self.dispatch(json.loads(message['data']))
+        except Exception:
+            logger.exception(f"can not handle message of channel {message.get('channel')}")
+
+    def connect(self, watcher_id: str) -> Optional[asyncio.Queue]:
+        """
+        :return: queue chứa message gửi cho kết nối, None nếu worker đã đủ số kết nối
+        """
+        if self.number_connection >= PUSH_MAX_CONNECTIONS:
+            return None
+        queue = asyncio.Queue(maxsize=PUSH_QUEUE_SIZE)
+        self.watcher_id__queues[watcher_id].add(queue)
+        self.number_connection += 1
+        return queue
+
+    def disconnect(self, watcher_id: str, queue: asyncio.Queue):
+        queues = self.watcher_id__queues.get(watcher_id)
+        if queues is None or queue not in queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.watcher_id__queues[watcher_id]
+        self.number_connection -= 1
+
+    def put(self, queue: asyncio.Queue, message: dict):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # client đọc chậm: bỏ các message đang chờ, client nhận resync sẽ tự tải lại số thông báo
+            self.number_dropped_message += queue.qsize()
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({"type": PUSH_TYPE_RESYNC, "data": None})
+
+    def dispatch(self, message: dict):
+        watcher_ids = message.pop('watcher_ids', None)
+        if watcher_ids is None:
+            targets = list(self.watcher_id__queues.keys())
+        elif len(watcher_ids) > len(self.watcher_id__queues):
+            watcher_ids = set(watcher_ids)
+            targets = [watcher_id for watcher_id in self.watcher_id__queues if watcher_id in watcher_ids]
+        else:
+            targets = [watcher_id for watcher_id in watcher_ids if watcher_id in self.watcher_id__queues]
+
+        for watcher_id in targets:
+            for queue in self.watcher_id__queues[watcher_id]:
+                self.put(queue, message)
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "connections": self.number_connection,
+            "watchers": len(self.watcher_id__queues),
+            "dropped_messages": self.number_dropped_message
+        }
+
+
+push_hub = PushHub()
+
+
+def invalidate_local_cache(message: dict) -> None:
+    cache = NAMED_CACHES.get(message['cache'])
+    if cache is not None:
+        cache.delete_many(message['keys'])
+
+
+async def publish_cache_invalidation(redis: Redis, cache_name: str, keys: List[str]) -> None:
+    """
+    Xoá key của cache trong process hiện tại ngay, worker khác xoá khi nhận message.
+    Redis lỗi thì worker khác vẫn dùng dữ liệu cũ tối đa `ttl` giây của cache
+    """
+    invalidate_local_cache({"cache": cache_name, "keys": keys})
+    try:
+        await redis.publish(CACHE_INVALIDATION_CHANNEL, json.dumps({"cache": cache_name, "keys": keys}))
+    except RedisError as error:
+        logger.warning(f"can not publish invalidation of cache {cache_name}: {error}")
+
+
+async def publish(redis: Redis, message_type: str, data, watcher_ids: Optional[List[str]] = None) -> None:
+    """
+    Gửi message tới watcher qua redis pub/sub, `watcher_ids` = None là gửi cho tất cả watcher.
+    Lỗi khi push ko làm hỏng request vì client vẫn có thể lấy lại dữ liệu bằng api
+    """
+    data = jsonable_encoder(data, custom_encoder=PUSH_ENCODER)
+    try:
+        if watcher_ids is None:
+            await redis.publish(PUSH_CHANNEL, json.dumps({"type": message_type, "data": data, "watcher_ids": None}))
+            return
+        for chunk in chunks(list(watcher_ids)):
+            await redis.publish(PUSH_CHANNEL, json.dumps({"type": message_type, "data": data, "watcher_ids": chunk}))
+    except RedisError as error:
+        logger.warning(f"can not publish {message_type}: {error}")
+
+
+async def publish_counter_deltas(redis: Redis, watcher_id__delta: Dict[str, int]) -> None:
+    # gom watcher có cùng delta vào 1 message
+    delta__watcher_ids = defaultdict(list)
+    for watcher_id, delta in watcher_id__delta.items():
+        if delta:
+            delta__watcher_ids[delta].append(watcher_id)
+    for delta, watcher_ids in delta__watcher_ids.items():
+        await publish(redis, PUSH_TYPE_COUNTER, {"delta": delta}, watcher_ids)
+
+
+def notification_push_data(notification: dict) -> dict:
+    return {
+        "_id": notification['_id'],
+        "content": notification['content'],
+        "activity_id": notification.get('activity_id'),
+        "watcher_created_activity": notification.get('watcher_created_activity'),
+        "created_at": notification['created_at']
+    }
+
+
+async def publish_notifications(redis: Redis, notifications: Iterable[dict], broadcast: bool = False) -> None:
+    for notification in notifications:
+        watcher_ids = None if broadcast else [watcher['watcher_id'] for watcher in notification['watcher_noti_status']]
+        await publish(redis, PUSH_TYPE_NOTIFICATION, notification_push_data(notification), watcher_ids)
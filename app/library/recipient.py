@@ -0,0 +1,66 @@
+from typing import Iterable, List, NamedTuple, Optional
+
+from app.library.group_member import get_member_ids
+from app.model.base import db
+
+# chỉ cần 2 field này để chia người nhận thông báo và tạo index gợi ý tag
+MEMBER_SHOW_VALUE = {"watcher_id": 1, "username": 1, "_id": 0}
+
+TAG_ALL = '@all'
+
+
+class Recipients(NamedTuple):
+    # watcher_id của người tạo activity nếu là thành viên của group
+    author: Optional[str]
+    # watcher được tag, nhận thông báo "nhắc đến bạn"
+    mentioned: List[str]
+    # các thành viên còn lại, nhận thông báo "vừa bình luận"
+    not_mentioned: List[str]
+
+
+async def get_member_watchers(group_profile_id: str, group_profile: Optional[dict] = None) -> List[dict]:
+    """
+    Thành viên của group còn tồn tại trong collection watcher, mỗi phần tử chỉ gồm `watcher_id`, `username`
+    """
+    member_ids = await get_member_ids(group_profile_id, group_profile)
+    if not member_ids:
+        return []
+    cursor = db.watcher.find({"watcher_id": {"$in": member_ids}}, MEMBER_SHOW_VALUE)
+    return await cursor.to_list(None)
+
+
+def partition_recipients(
+        members: List[dict],
+        author_id: str,
+        tag_users: Iterable[str]
+) -> Recipients:
+    """
+    Chia thành viên thành người tạo / người được tag / người còn lại, ko query thêm
+    :param tag_users: watcher_id được tag, [@all] là ko tag riêng ai
+    """
+    tag_users = set(tag_users)
+    tag_users.discard(TAG_ALL)
+
+    author = None
+    mentioned, not_mentioned = [], []
+    for member in members:
+        if member['watcher_id'] == author_id:
+            author = author_id
+        elif member['watcher_id'] in tag_users:
+            mentioned.append(member['watcher_id'])
+        else:
+            not_mentioned.append(member['watcher_id'])
+    return Recipients(author=author, mentioned=mentioned, not_mentioned=not_mentioned)
+
+
+async def resolve_recipients(
+        group_profile_id: str,
+        author_id: str,
+        tag_users: Iterable[str],
+        group_profile: Optional[dict] = None
+) -> Recipients:
+    """
+    Lấy thành viên của group trong 1 lần ( chỉ gồm watcher_id, username ) rồi chia trong bộ nhớ
+    """
+    members = await get_member_watchers(group_profile_id, group_profile)
+    return partition_recipients(members, author_id, tag_users)
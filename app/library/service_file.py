@@ -1,49 +1,176 @@
+import asyncio
 import os
-from typing import Dict, Optional, Tuple
+import time
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
 
 import aiohttp
 from dotenv import load_dotenv
+from fastapi import UploadFile
 from starlette import status
 
+from app.library.circuit_breaker import CircuitBreaker
+from app.library.constant.file import (
+    MAX_SIZE_UPLOAD_IN_BYTES, UPLOAD_CHUNK_SIZE_IN_BYTES
+)
 from app.library.constant.service_file import (
-    SERVICE_FILE_API_FILES, SERVICE_FILE_HEADER
+    SERVICE_FILE_API_FILES, SERVICE_FILE_CIRCUIT_FAILURE_THRESHOLD,
+    SERVICE_FILE_CIRCUIT_RESET_TIMEOUT, SERVICE_FILE_CONNECT_TIMEOUT,
+    SERVICE_FILE_DNS_CACHE_TTL, SERVICE_FILE_HEADER,
+    SERVICE_FILE_KEEPALIVE_TIMEOUT, SERVICE_FILE_LIMIT,
+    SERVICE_FILE_LIMIT_PER_HOST, SERVICE_FILE_MAX_RETRY,
+    SERVICE_FILE_READ_TIMEOUT, SERVICE_FILE_RETRY_BACKOFF,
+    SERVICE_FILE_TOTAL_TIMEOUT, SERVICE_FILE_UPLOAD_RESULT_CIRCUIT_OPEN,
+    SERVICE_FILE_UPLOAD_RESULT_ERROR, SERVICE_FILE_UPLOAD_RESULT_FAILED,
+    SERVICE_FILE_UPLOAD_RESULT_SUCCESS, SERVICE_FILE_UPLOAD_RESULT_TOO_LARGE
 )
+from app.library.metrics import Histogram
 
 load_dotenv()
 
+SERVICE_FILE_UPLOAD_SECONDS = Histogram(
+    "service_file_upload_seconds", "Thời gian upload 1 file lên service file", label_names=("result",)
+)
+
+
+class FileTooLargeError(Exception):
+    pass
+
+
+class ServiceFileUnavailableError(Exception):
+    pass
+
 
 class ServiceFile:
     def __init__(self):
         self.session = None
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=SERVICE_FILE_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=SERVICE_FILE_CIRCUIT_RESET_TIMEOUT
+        )
 
     def start_session(self):
-        self.session = aiohttp.ClientSession()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=SERVICE_FILE_LIMIT,
+                limit_per_host=SERVICE_FILE_LIMIT_PER_HOST,
+                keepalive_timeout=SERVICE_FILE_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=SERVICE_FILE_DNS_CACHE_TTL
+            ),
+            timeout=aiohttp.ClientTimeout(
+                total=SERVICE_FILE_TOTAL_TIMEOUT,
+                sock_connect=SERVICE_FILE_CONNECT_TIMEOUT,
+                sock_read=SERVICE_FILE_READ_TIMEOUT
+            )
+        )
 
     async def close_session(self):
         await self.session.close()
 
-    async def upload_file(self, file: bytes, temp_flag: bool = False) -> Tuple[bool, Optional[Dict[str, str]]]:
-        try:
-            async with self.session.post(
-                    url=f'{os.getenv("SERVICE_FILE_URL")}/{SERVICE_FILE_API_FILES}',
-                    headers=SERVICE_FILE_HEADER,
-                    data={
-                        'file': file,
-                        'return_download_file_url_flag': "True",
-                        'temp_flag': str(temp_flag)
-                    }
-            ) as response:
-                if response.status == status.HTTP_201_CREATED:
-                    is_success = True
-                    response_data = await response.json()
-                    output = {
-                        'uuid': response_data['uuid'],
-                        'file_url': response_data['file_url'],
-                    }
-                else:
-                    is_success = False
-                    output = {}
-
-            return is_success, output
-        except Exception:
-            return False, None
+    @staticmethod
+    async def read_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+        # đọc file tạm của UploadFile theo từng chunk, dừng ngay khi vượt quá kích thước cho phép
+        await file.seek(0)
+        uploaded_size = 0
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE_IN_BYTES)
+            if not chunk:
+                break
+            uploaded_size += len(chunk)
+            if uploaded_size > MAX_SIZE_UPLOAD_IN_BYTES:
+                raise FileTooLargeError(f"file is larger than {MAX_SIZE_UPLOAD_IN_BYTES} bytes")
+            yield chunk
+
+    async def post_file(self, payload, filename: str, content_type: str, temp_flag: bool) -> Optional[Dict[str, str]]:
+        """
+        :return: uuid và file_url, None nếu service file từ chối file
+        :raise ServiceFileUnavailableError: service file lỗi ( 5xx ), có thể thử lại
+        """
+        form_data = aiohttp.FormData()
+        form_data.add_field('file', payload, filename=filename, content_type=content_type)
+        form_data.add_field('return_download_file_url_flag', "True")
+        form_data.add_field('temp_flag', str(temp_flag))
+
+        async with self.session.post(
+                url=f'{os.getenv("SERVICE_FILE_URL")}/{SERVICE_FILE_API_FILES}',
+                headers=SERVICE_FILE_HEADER,
+                data=form_data
+        ) as response:
+            if response.status >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+                raise ServiceFileUnavailableError(f"service file response status {response.status}")
+            if response.status != status.HTTP_201_CREATED:
+                return None
+            response_data = await response.json()
+            return {
+                'uuid': response_data['uuid'],
+                'file_url': response_data['file_url'],
+            }
+
+    async def upload(
+            self,
+            make_payload: Callable,
+            filename: str,
+            content_type: str,
+            temp_flag: bool
+    ) -> Tuple[bool, Optional[Dict[str, str]]]:
+        """
+        File tạm ( temp_flag ) upload lại ko ảnh hưởng gì nên được retry khi service file lỗi,
+        `make_payload` tạo lại nội dung file cho mỗi lần gửi
+        """
+        number_attempt = SERVICE_FILE_MAX_RETRY + 1 if temp_flag else 1
+        for attempt in range(number_attempt):
+            if attempt:
+                await asyncio.sleep(SERVICE_FILE_RETRY_BACKOFF * 2 ** (attempt - 1))
+            if not self.circuit_breaker.allow_request():
+                # service file đang lỗi, trả về ngay thay vì để request chờ tới timeout
+                SERVICE_FILE_UPLOAD_SECONDS.observe(0, SERVICE_FILE_UPLOAD_RESULT_CIRCUIT_OPEN)
+                return False, None
+            is_trial = self.circuit_breaker.is_trial()
+
+            start_time = time.perf_counter()
+            try:
+                output = await self.post_file(make_payload(), filename, content_type, temp_flag)
+                self.circuit_breaker.record_success()
+            except FileTooLargeError:
+                SERVICE_FILE_UPLOAD_SECONDS.observe(time.perf_counter() - start_time, SERVICE_FILE_UPLOAD_RESULT_TOO_LARGE)
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, ServiceFileUnavailableError):
+                self.circuit_breaker.record_failure()
+                SERVICE_FILE_UPLOAD_SECONDS.observe(time.perf_counter() - start_time, SERVICE_FILE_UPLOAD_RESULT_ERROR)
+                continue
+            except Exception:
+                SERVICE_FILE_UPLOAD_SECONDS.observe(time.perf_counter() - start_time, SERVICE_FILE_UPLOAD_RESULT_ERROR)
+                return False, None
+            finally:
+                # request thử kết thúc mà chưa ghi kết quả ( file quá lớn, lỗi khác, request bị huỷ )
+                # thì trả lại lượt thử, nếu ko breaker bị kẹt ở half open
+                if is_trial:
+                    self.circuit_breaker.release_trial()
+
+            if output is None:
+                SERVICE_FILE_UPLOAD_SECONDS.observe(time.perf_counter() - start_time, SERVICE_FILE_UPLOAD_RESULT_FAILED)
+                return False, {}
+            SERVICE_FILE_UPLOAD_SECONDS.observe(time.perf_counter() - start_time, SERVICE_FILE_UPLOAD_RESULT_SUCCESS)
+            return True, output
+
+        return False, None
+
+    async def upload_file(self, file: UploadFile, temp_flag: bool = False) -> Tuple[bool, Optional[Dict[str, str]]]:
+        """
+        Upload file lên service file dạng multipart, nội dung file được gửi dần theo từng chunk
+        :raise FileTooLargeError: file lớn hơn MAX_SIZE_UPLOAD_IN_BYTES
+        """
+        return await self.upload(
+            lambda: self.read_chunks(file),
+            filename=file.filename or 'file',
+            content_type=file.content_type or 'application/octet-stream',
+            temp_flag=temp_flag
+        )
+
+    async def upload_bytes(
+            self,
+            data: bytes,
+            filename: str,
+            content_type: str,
+            temp_flag: bool = False
+    ) -> Tuple[bool, Optional[Dict[str, str]]]:
+        return await self.upload(lambda: data, filename=filename, content_type=content_type, temp_flag=temp_flag)
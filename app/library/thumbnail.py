@@ -1,87 +1,186 @@
-# import io
-# import os
-# import tempfile
-#
-# import cv2
-# from typing import Optional
-# from PIL import Image
-# from pdf2image import convert_from_path
-#
-#
-# from app.api.v1.setting.event import service_file
-# from app.library.constant.file import PREFIX_CONTENT_TYPE_IMAGE, PREFIX_CONTENT_TYPE_VIDEO, CONTENT_TYPE_PDF, \
-#     THUMBNAIL_IMAGE_EXTENSION, CONTENT_TYPE_GIF, THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT
-#
-#
-# def generate_video_thumbnail_bytes(path_tempfile: str, position: float = 0.5) -> Optional[bytes]:
-#     if position < 0 or position >= 1.0:
-#         # raise ValueError(f'Position {position} is not between 0.0 and 1.0')
-#         return None
-#
-#     capture = cv2.VideoCapture(path_tempfile)
-#
-#     total_frame = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
-#
-#     capture.set(cv2.CAP_PROP_POS_FRAMES, int(total_frame * position))
-#
-#     _, frame = capture.read()
-#     _, buffer = cv2.imencode(f'.{THUMBNAIL_IMAGE_EXTENSION}', frame)
-#
-#     return generate_image_thumbnail_bytes(io.BytesIO(buffer))
-#
-#
-# def generate_libreoffice_thumbnail_bytes(path_tempfile: str) -> Optional[bytes]:
-#     change_to_pdf = f'libreoffice --headless --convert-to pdf {path_tempfile}'
-#     os.system(change_to_pdf)
-#
-#     temp_file_pdf_name = path_tempfile[path_tempfile.rfind('/'):]
-#     bytes_str = generate_pdf_thumbnail_bytes(f'.{temp_file_pdf_name}.pdf')
-#
-#     os.remove(f'.{temp_file_pdf_name}.pdf')
-#
-#     return bytes_str
-#
-#
-# def generate_pdf_thumbnail_bytes(path_tempfile: str) -> Optional[bytes]:
-#     images = convert_from_path(path_tempfile)
-#
-#     stream_str = io.BytesIO()
-#     # số 0 tương ứng với page 0, lần lượt theo sau sẽ là 1 2 3 4
-#     images[0].save(stream_str, format=f'{THUMBNAIL_IMAGE_EXTENSION}')
-#
-#     return generate_image_thumbnail_bytes(stream_str)
-#
-#
-# def generate_image_thumbnail_bytes(input_image_bytesIO: io.BytesIO, content_tye: Optional[str]=None) -> Optional[bytes]: # noqa
-#     if content_tye == CONTENT_TYPE_GIF:
-#         image = Image.open(input_image_bytesIO).convert('RGB')
-#     else:
-#         image = Image.open(input_image_bytesIO)
-#
-#     image.thumbnail(size=(THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT))
-#
-#     stream_str = io.BytesIO()
-#     image.save(stream_str, format=f'{THUMBNAIL_IMAGE_EXTENSION}')
-#
-#     return stream_str.getvalue()
-#
-#
-# def create_thumbnail_for_file_upload(
-#         content_type: str,
-#         file: io.BytesIO,
-# ) -> None:
-#
-#     temp_file = tempfile.NamedTemporaryFile()
-#     if PREFIX_CONTENT_TYPE_IMAGE in content_type:
-#         thumbnail = generate_image_thumbnail_bytes(file, content_type)
-#     else:
-#         temp_file.write(bytes(file.getbuffer().tobytes()))
-#
-#         if PREFIX_CONTENT_TYPE_VIDEO in content_type:
-#             thumbnail = generate_video_thumbnail_bytes(temp_file.name)
-#         elif CONTENT_TYPE_PDF in content_type:
-#             thumbnail = generate_pdf_thumbnail_bytes(temp_file.name)
-#         else:
-#             thumbnail = generate_libreoffice_thumbnail_bytes(temp_file.name)
-#
-#     temp_file.close()
+import asyncio
+import hashlib
+import os
+import shutil
+import signal
+import sys
+import tempfile
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId
+from fastapi import UploadFile
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+
+from app.library.constant.file import (
+    CONTENT_TYPE_PDF, PREFIX_CONTENT_TYPE_APPLICATION,
+    PREFIX_CONTENT_TYPE_IMAGE, PREFIX_CONTENT_TYPE_VIDEO, THUMBNAIL_COLLECTION,
+    THUMBNAIL_CONTENT_TYPE, THUMBNAIL_ENABLED, THUMBNAIL_IMAGE_EXTENSION,
+    THUMBNAIL_PROCESS_WORKERS, THUMBNAIL_QUEUE_SIZE, THUMBNAIL_TIMEOUT,
+    THUMBNAIL_TYPE_IMAGE, THUMBNAIL_TYPE_OFFICE, THUMBNAIL_TYPE_PDF,
+    THUMBNAIL_TYPE_VIDEO, UPLOAD_CHUNK_SIZE_IN_BYTES
+)
+from app.library.service_file import ServiceFile
+from app.model.base import db
+
+# module chạy trong process con, chỉ import thư viện xử lý ảnh
+THUMBNAIL_GENERATOR_MODULE = "app.library.thumbnail_generator"
+
+
+def hash_file(path_tempfile: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path_tempfile, 'rb') as file:
+        for chunk in iter(lambda: file.read(UPLOAD_CHUNK_SIZE_IN_BYTES), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_thumbnail_type(content_type: Optional[str]) -> Optional[str]:
+    if not content_type:
+        return None
+    if content_type.startswith(PREFIX_CONTENT_TYPE_IMAGE):
+        return THUMBNAIL_TYPE_IMAGE
+    if content_type.startswith(PREFIX_CONTENT_TYPE_VIDEO):
+        return THUMBNAIL_TYPE_VIDEO
+    if content_type == CONTENT_TYPE_PDF:
+        return THUMBNAIL_TYPE_PDF
+    if content_type in PREFIX_CONTENT_TYPE_APPLICATION:
+        return THUMBNAIL_TYPE_OFFICE
+    return None
+
+
+def copy_to_tempfile(file, suffix: str) -> str:
+    # file tạm của UploadFile bị đóng khi request kết thúc nên cần copy ra file riêng
+    file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        shutil.copyfileobj(file, temp_file, UPLOAD_CHUNK_SIZE_IN_BYTES)
+    return temp_file.name
+
+
+async def run_thumbnail_generator(path_tempfile: str, content_type: str, thumbnail_type: str) -> Optional[bytes]:
+    """
+    Tạo thumbnail trong process con riêng, quá THUMBNAIL_TIMEOUT thì kill cả process group
+    ( gồm libreoffice, pdftoppm được process con gọi )
+    :raise asyncio.TimeoutError: quá thời gian
+    :raise RuntimeError: process con bị lỗi
+    """
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", THUMBNAIL_GENERATOR_MODULE, path_tempfile, content_type, thumbnail_type,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=THUMBNAIL_TIMEOUT[thumbnail_type])
+    finally:
+        # timeout hoặc task bị huỷ khi tắt app
+        if process.returncode is None:
+            os.killpg(process.pid, signal.SIGKILL)
+            await process.wait()
+
+    if process.returncode:
+        raise RuntimeError(f"thumbnail generator exit code {process.returncode}: {stderr.decode(errors='replace')[-1000:]}")
+    return stdout or None
+
+
+class ThumbnailService:
+    """
+    Tạo thumbnail cho file của activity trong process con, ko chạy trên event loop,
+    tối đa THUMBNAIL_PROCESS_WORKERS process cùng lúc.
+    Thumbnail được cache theo sha256 của nội dung file nên file trùng chỉ tạo 1 lần
+    """
+    def __init__(self, service_file: ServiceFile):
+        self.service_file = service_file
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+        self.number_skipped = 0
+
+    def start(self):
+        if not THUMBNAIL_ENABLED:
+            return
+        self.queue = asyncio.Queue(maxsize=THUMBNAIL_QUEUE_SIZE)
+        self.tasks = [asyncio.create_task(self.consume()) for _ in range(THUMBNAIL_PROCESS_WORKERS)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        # file đang xử lý được xoá trong consume(), process con bị kill trong run_thumbnail_generator()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+        # file còn trong queue ko được xử lý nữa
+        while self.queue is not None and not self.queue.empty():
+            job = self.queue.get_nowait()
+            os.remove(job['path_tempfile'])
+            self.queue.task_done()
+
+    async def submit(self, activity_id: ObjectId, file: UploadFile) -> bool:
+        """
+        Đưa file vào queue tạo thumbnail
+        :return: False nếu loại file ko hỗ trợ hoặc queue đã đầy
+        """
+        thumbnail_type = get_thumbnail_type(file.content_type)
+        if self.queue is None or thumbnail_type is None:
+            return False
+        if self.queue.full():
+            self.number_skipped += 1
+            return False
+
+        path_tempfile = await run_in_threadpool(copy_to_tempfile, file.file, os.path.splitext(file.filename or '')[1])
+        try:
+            self.queue.put_nowait({
+                "activity_id": activity_id,
+                "path_tempfile": path_tempfile,
+                "content_type": file.content_type,
+                "thumbnail_type": thumbnail_type
+            })
+        except asyncio.QueueFull:
+            self.number_skipped += 1
+            os.remove(path_tempfile)
+            return False
+        return True
+
+    async def consume(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.process(job)
+            except Exception:
+                logger.exception(f"can not create thumbnail for activity {job['activity_id']}")
+            finally:
+                os.remove(job['path_tempfile'])
+                self.queue.task_done()
+
+    async def process(self, job: dict):
+        content_hash = await run_in_threadpool(hash_file, job['path_tempfile'])
+
+        thumbnail = await db[THUMBNAIL_COLLECTION].find_one({"content_hash": content_hash}, {"thumbnail_url": 1})
+        if thumbnail:
+            thumbnail_url = thumbnail['thumbnail_url']
+        else:
+            thumbnail_bytes = await run_thumbnail_generator(
+                job['path_tempfile'], job['content_type'], job['thumbnail_type']
+            )
+            if not thumbnail_bytes:
+                return
+
+            is_success, uuid_and_file_url = await self.service_file.upload_bytes(
+                thumbnail_bytes, filename=f'{content_hash}.{THUMBNAIL_IMAGE_EXTENSION}', content_type=THUMBNAIL_CONTENT_TYPE
+            )
+            if not is_success:
+                return
+            thumbnail_url = uuid_and_file_url['file_url']
+            await db[THUMBNAIL_COLLECTION].update_one(
+                {"content_hash": content_hash},
+                {"$setOnInsert": {"content_hash": content_hash, "thumbnail_url": thumbnail_url, "created_at": datetime.now()}},
+                upsert=True
+            )
+
+        await db.activity.update_one({"_id": job['activity_id']}, {"$set": {"thumbnail_url": thumbnail_url}})
+
+    def metrics(self) -> dict:
+        return {
+            "queue_size": self.queue.qsize() if self.queue else 0,
+            "skipped": self.number_skipped
+        }
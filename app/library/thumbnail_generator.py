@@ -0,0 +1,107 @@
+"""
+Tạo thumbnail trong process con, mỗi file 1 process để quá thời gian thì kill được cả process
+( kể cả libreoffice, pdftoppm do process đó gọi )
+
+Chạy: python -m app.library.thumbnail_generator <path_tempfile> <content_type> <thumbnail_type>
+thumbnail ( jpeg ) được ghi ra stdout, ko tạo được thumbnail thì stdout rỗng
+"""
+import io
+import os
+import subprocess  # nosec
+import sys
+import tempfile
+from typing import Optional
+
+import cv2
+from pdf2image import convert_from_path
+from PIL import Image
+
+from app.library.constant.file import (
+    CONTENT_TYPE_GIF, EXTENSION_PDF, THUMBNAIL_HEIGHT,
+    THUMBNAIL_IMAGE_EXTENSION, THUMBNAIL_TIMEOUT, THUMBNAIL_TYPE_IMAGE,
+    THUMBNAIL_TYPE_OFFICE, THUMBNAIL_TYPE_PDF, THUMBNAIL_TYPE_VIDEO,
+    THUMBNAIL_WIDTH
+)
+
+
+def generate_video_thumbnail_bytes(path_tempfile: str, position: float = 0.5) -> Optional[bytes]:
+    if position < 0 or position >= 1.0:
+        return None
+
+    capture = cv2.VideoCapture(path_tempfile)
+    try:
+        total_frame = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        capture.set(cv2.CAP_PROP_POS_FRAMES, int(total_frame * position))
+        is_success, frame = capture.read()
+    finally:
+        capture.release()
+    if not is_success:
+        return None
+
+    _, buffer = cv2.imencode(f'.{THUMBNAIL_IMAGE_EXTENSION}', frame)
+    return generate_image_thumbnail_bytes(io.BytesIO(buffer))
+
+
+def generate_libreoffice_thumbnail_bytes(path_tempfile: str) -> Optional[bytes]:
+    with tempfile.TemporaryDirectory() as output_dir:
+        # mỗi lần convert dùng profile riêng để nhiều process libreoffice chạy cùng lúc ko bị khoá nhau
+        subprocess.run(  # nosec
+            [
+                'libreoffice', f'-env:UserInstallation=file://{output_dir}/profile',
+                '--headless', '--convert-to', 'pdf', '--outdir', output_dir, path_tempfile
+            ],
+            check=True,
+            timeout=THUMBNAIL_TIMEOUT[THUMBNAIL_TYPE_OFFICE],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        file_name = os.path.splitext(os.path.basename(path_tempfile))[0]
+        return generate_pdf_thumbnail_bytes(os.path.join(output_dir, f'{file_name}{EXTENSION_PDF}'))
+
+
+def generate_pdf_thumbnail_bytes(path_tempfile: str) -> Optional[bytes]:
+    # chỉ render trang đầu tiên
+    images = convert_from_path(path_tempfile, first_page=1, last_page=1)
+    if not images:
+        return None
+
+    stream_str = io.BytesIO()
+    images[0].save(stream_str, format=f'{THUMBNAIL_IMAGE_EXTENSION}')
+
+    return generate_image_thumbnail_bytes(stream_str)
+
+
+def generate_image_thumbnail_bytes(input_image_bytesIO: io.BytesIO, content_tye: Optional[str] = None) -> Optional[bytes]:  # noqa
+    image = Image.open(input_image_bytesIO)
+    if content_tye == CONTENT_TYPE_GIF or image.mode not in ('RGB', 'L'):
+        # jpeg ko lưu được ảnh có kênh alpha hoặc bảng màu
+        image = image.convert('RGB')
+
+    image.thumbnail(size=(THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT))
+
+    stream_str = io.BytesIO()
+    image.save(stream_str, format=f'{THUMBNAIL_IMAGE_EXTENSION}')
+
+    return stream_str.getvalue()
+
+
+def create_thumbnail_for_file_upload(path_tempfile: str, content_type: str, thumbnail_type: str) -> Optional[bytes]:
+    if thumbnail_type == THUMBNAIL_TYPE_IMAGE:
+        with open(path_tempfile, 'rb') as file:
+            return generate_image_thumbnail_bytes(io.BytesIO(file.read()), content_type)
+    if thumbnail_type == THUMBNAIL_TYPE_VIDEO:
+        return generate_video_thumbnail_bytes(path_tempfile)
+    if thumbnail_type == THUMBNAIL_TYPE_PDF:
+        return generate_pdf_thumbnail_bytes(path_tempfile)
+    return generate_libreoffice_thumbnail_bytes(path_tempfile)
+
+
+def main():
+    path_tempfile, content_type, thumbnail_type = sys.argv[1:4]
+    thumbnail_bytes = create_thumbnail_for_file_upload(path_tempfile, content_type, thumbnail_type)
+    if thumbnail_bytes:
+        sys.stdout.buffer.write(thumbnail_bytes)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.endpoints import router as v1_router
 
 from app.api.v1.setting.event import create_start_app_handler, create_stop_app_handler
+from app.api.v1.setting.metrics import metrics
+from app.api.v1.setting.middleware import TimingMiddleware
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
 
@@ -19,6 +21,7 @@ app = FastAPI(
     openapi_url="/openapi.json" if bool(os.getenv("DEBUG", True)) else None
 )
 
+app.add_middleware(TimingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -33,9 +36,11 @@ templates = Jinja2Templates(directory=r"D:\test\Notification-system\app\template
 
 @app.get("/", response_class=HTMLResponse)
 async def maintenance_notice(request: Request):
-    print("vaof ")
     return templates.TemplateResponse("noti.html", {"request": request})
 
+
+app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+
 app.add_event_handler("startup", create_start_app_handler(app))
 app.add_event_handler("shutdown", create_stop_app_handler(app))
 
@@ -0,0 +1,144 @@
+from typing import Dict, List
+
+from bson import ObjectId
+from loguru import logger
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.library.constant.broadcast import BROADCAST_JOB_COLLECTION
+from app.library.constant.file import THUMBNAIL_COLLECTION
+from app.library.constant.group_member import GROUP_MEMBER_COLLECTION
+from app.library.constant.notification import NOTIFICATION_INBOX_COLLECTION
+from app.model.base import db
+
+# index của từng collection, tạo lại khi startup ( create_indexes bỏ qua index đã tồn tại )
+INDEX_MANIFEST: Dict[str, List[IndexModel]] = {
+    "watcher": [
+        IndexModel([("watcher_id", ASCENDING)], name="watcher_id_unique", unique=True),
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "group_profile": [
+        IndexModel([("group_profile_id", ASCENDING)], name="group_profile_id_unique", unique=True),
+        IndexModel([("watcher_ids", ASCENDING)], name="watcher_ids"),
+    ],
+    "activity": [
+        IndexModel([("group_profile_id", ASCENDING), ("_id", DESCENDING)], name="group_profile_id__id"),
+    ],
+    "notification": [
+        IndexModel([("activity_id", ASCENDING)], name="activity_id"),
+        IndexModel(
+            [
+                ("activity_id", ASCENDING), ("activity_notification_type", ASCENDING),
+                ("coalesced_notification_id", ASCENDING)
+            ],
+            name="activity_id_activity_notification_type_coalesced_notification_id_unique", unique=True,
+            partialFilterExpression={"activity_notification_type": {"$exists": True}}
+        ),
+        IndexModel(
+            [("broadcast_notification_id", ASCENDING), ("broadcast_batch_key", ASCENDING)],
+            name="broadcast_notification_id_broadcast_batch_key_unique", unique=True,
+            partialFilterExpression={"broadcast_notification_id": {"$exists": True}}
+        ),
+        IndexModel(
+            [("watcher_noti_status.watcher_id", ASCENDING), ("_id", DESCENDING)],
+            name="watcher_noti_status_watcher_id__id"
+        ),
+        IndexModel(
+            [("watcher_noti_status.watcher_id", ASCENDING), ("watcher_noti_status.status", ASCENDING)],
+            name="watcher_noti_status_watcher_id_status"
+        ),
+    ],
+    NOTIFICATION_INBOX_COLLECTION: [
+        IndexModel(
+            [("notification_id", ASCENDING), ("watcher_id", ASCENDING)],
+            name="notification_id_watcher_id_unique", unique=True
+        ),
+        IndexModel([("watcher_id", ASCENDING), ("notification_id", DESCENDING)], name="watcher_id_notification_id"),
+        IndexModel([("watcher_id", ASCENDING), ("status", ASCENDING)], name="watcher_id_status"),
+    ],
+    GROUP_MEMBER_COLLECTION: [
+        IndexModel(
+            [("group_profile_id", ASCENDING), ("watcher_id", ASCENDING)],
+            name="group_profile_id_watcher_id_unique", unique=True
+        ),
+        IndexModel(
+            [("group_profile_id", ASCENDING), ("watcher_object_id", ASCENDING)], name="group_profile_id_watcher_object_id"
+        ),
+        IndexModel([("watcher_id", ASCENDING)], name="watcher_id"),
+    ],
+    BROADCAST_JOB_COLLECTION: [
+        IndexModel([("created_by", ASCENDING), ("_id", DESCENDING)], name="created_by__id"),
+        IndexModel([("status", ASCENDING)], name="status"),
+    ],
+    THUMBNAIL_COLLECTION: [
+        IndexModel([("content_hash", ASCENDING)], name="content_hash_unique", unique=True),
+    ],
+}
+
+SAMPLE_ID = ObjectId()
+
+# các dạng query mà view, paging và paging_aggregation dùng: (collection, filter, sort)
+QUERY_SHAPES = [
+    ("watcher", {"watcher_id": ""}, None),
+    ("watcher", {"username": {"$in": [""]}}, None),
+    ("watcher", {"watcher_id": {"$in": [""]}, "_id": {"$gt": SAMPLE_ID}}, [("_id", ASCENDING)]),
+    ("group_profile", {"group_profile_id": "", "created_by": ""}, None),
+    ("group_profile", {"watcher_ids": ""}, None),
+    ("activity", {"group_profile_id": "", "_id": {"$lt": SAMPLE_ID}}, [("_id", DESCENDING)]),
+    ("activity", {"_id": SAMPLE_ID, "group_profile_id": ""}, None),
+    ("notification", {"activity_id": SAMPLE_ID}, None),
+    ("notification", {"broadcast_notification_id": SAMPLE_ID, "broadcast_batch_key": None}, None),
+    ("notification", {"watcher_noti_status.watcher_id": "", "_id": {"$lt": SAMPLE_ID}}, [("_id", DESCENDING)]),
+    ("notification", {"watcher_noti_status": {"$elemMatch": {"watcher_id": "", "status": False}}}, None),
+    (
+        NOTIFICATION_INBOX_COLLECTION,
+        {"watcher_id": "", "notification_id": {"$lt": SAMPLE_ID}},
+        [("notification_id", DESCENDING)]
+    ),
+    (NOTIFICATION_INBOX_COLLECTION, {"watcher_id": "", "status": False}, None),
+    (NOTIFICATION_INBOX_COLLECTION, {"notification_id": {"$in": [SAMPLE_ID]}, "status": False}, None),
+    (GROUP_MEMBER_COLLECTION, {"group_profile_id": "", "watcher_id": {"$in": [""]}}, None),
+    (
+        GROUP_MEMBER_COLLECTION,
+        {"group_profile_id": "", "watcher_object_id": {"$gt": SAMPLE_ID}},
+        [("watcher_object_id", ASCENDING)]
+    ),
+    (GROUP_MEMBER_COLLECTION, {"watcher_id": ""}, None),
+]
+
+
+async def create_indexes():
+    for collection, indexes in INDEX_MANIFEST.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except OperationFailure as error:
+            # thường do dữ liệu cũ bị trùng với unique index, cần xử lý dữ liệu bằng tay
+            logger.error(f"can not create index for collection {collection}: {error}")
+
+
+def find_stages(plan, stage_name: str) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage_name:
+            return True
+        return any(find_stages(value, stage_name) for value in plan.values())
+    if isinstance(plan, list):
+        return any(find_stages(value, stage_name) for value in plan)
+    return False
+
+
+async def check_query_plans():
+    """
+    Chạy explain() cho từng dạng query, raise RuntimeError nếu có query phải quét cả collection
+    """
+    collection_scans = []
+    for collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        if find_stages(explain["queryPlanner"]["winningPlan"], "COLLSCAN"):
+            collection_scans.append(f"{collection}: {query}")
+
+    if collection_scans:
+        raise RuntimeError(f"COLLSCAN detected for query: {collection_scans}")
+    logger.info(f"checked {len(QUERY_SHAPES)} query plans, no COLLSCAN")
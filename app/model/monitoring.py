@@ -0,0 +1,43 @@
+import threading
+from typing import Dict
+
+from pymongo import monitoring
+
+from app.library.metrics import Histogram
+
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_seconds", "Thời gian chạy 1 command mongo", label_names=("command", "collection", "result")
+)
+
+# command nội bộ của driver, ko phải query của app
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions"}
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Ghi thời gian từng command mongo theo tên command và collection, chạy trong thread của motor
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # request_id -> collection, event succeeded/failed ko có tên collection
+        self.request_id__collection: Dict[int, str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        with self.lock:
+            self.request_id__collection[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self.observe(event, "success")
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self.observe(event, "error")
+
+    def observe(self, event, result: str) -> None:
+        with self.lock:
+            collection = self.request_id__collection.pop(event.request_id, None)
+        if collection is None:
+            return
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1_000_000, event.command_name, collection, result)
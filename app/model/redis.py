@@ -1,18 +1,99 @@
 import os
+import time
+from typing import Dict, Optional
 
 import aioredis
+from aioredis import Redis
+from aioredis.client import Pipeline
 from dotenv import load_dotenv
 
+from app.library.constant.redis import (
+    REDIS_HEALTH_CHECK_INTERVAL, REDIS_MAX_CONNECTIONS, REDIS_POOL_TIMEOUT,
+    REDIS_SOCKET_TIMEOUT
+)
+from app.library.metrics import Histogram
+
 load_dotenv()
 
+REDIS_COMMAND_SECONDS = Histogram(
+    "redis_command_seconds", "Thời gian chạy 1 command redis", label_names=("command", "result")
+)
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        start_time = time.perf_counter()
+        result = "success"
+        try:
+            return await super().execute(raise_on_error)
+        except Exception:
+            result = "error"
+            raise
+        finally:
+            REDIS_COMMAND_SECONDS.observe(time.perf_counter() - start_time, "PIPELINE", result)
+
+
+class InstrumentedRedis(Redis):
+    """
+    Ghi thời gian từng command theo tên command, pipeline tính là 1 command PIPELINE
+    """
+    async def execute_command(self, *args, **options):
+        start_time = time.perf_counter()
+        result = "success"
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            result = "error"
+            raise
+        finally:
+            REDIS_COMMAND_SECONDS.observe(time.perf_counter() - start_time, str(args[0]).upper(), result)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> Pipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class RedisPool:
+    def __init__(self):
+        self.pool: Optional[aioredis.BlockingConnectionPool] = None
+        self.redis: Optional[Redis] = None
+
+    def start_pool(self):
+        # pool dùng chung cho cả app, tạo 1 lần khi startup thay vì mỗi request
+        self.pool = aioredis.BlockingConnectionPool.from_url(
+            f"redis://{os.getenv('HOST_REDIS', 'localhost')}",
+            # username=f"{os.getenv('USERNAME_REDIS', '')}",
+            password=f"{os.getenv('PASSWORD_REDIS', '')}",
+            encoding="utf-8",
+            decode_responses=True,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+        )
+        self.redis = InstrumentedRedis(connection_pool=self.pool)
+
+    async def close_pool(self):
+        if self.redis is not None:
+            await self.redis.close()
+        if self.pool is not None:
+            await self.pool.disconnect()
+
+    def metrics(self) -> Dict[str, int]:
+        if self.pool is None:
+            return {"max_connections": REDIS_MAX_CONNECTIONS, "created_connections": 0, "in_use_connections": 0}
+        # BlockingConnectionPool giữ sẵn slot None trong queue cho những connection chưa được tạo
+        created_connections = len(self.pool._connections)
+        available_connections = len([connection for connection in self.pool.pool._queue if connection])
+        return {
+            "max_connections": self.pool.max_connections,
+            "created_connections": created_connections,
+            "in_use_connections": created_connections - available_connections
+        }
+
+
+redis_client = RedisPool()
+
 
-async def redis_pool():
-    print(f"redis://{os.getenv('HOST_REDIS', 'localhost')}", f"{os.getenv('PASSWORD_REDIS', '')}")
-    redis = await aioredis.from_url(
-        f"redis://{os.getenv('HOST_REDIS', 'localhost')}",
-        # username=f"{os.getenv('USERNAME_REDIS', '')}",
-        password=f"{os.getenv('PASSWORD_REDIS', '')}",
-        encoding="utf-8", decode_responses=True
-    )
-    print(redis)
-    return redis
+async def redis_pool() -> Redis:
+    return redis_client.redis
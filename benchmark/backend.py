@@ -0,0 +1,73 @@
+"""
+Chuẩn bị môi trường cho app trước khi import app.main
+
+- local: mongo/redis chạy bằng benchmark/docker-compose.yml ( giống production nhất )
+- memory: mongomock-motor + fakeredis chạy trong process, ko cần cài gì thêm nhưng
+  ko có index nên chỉ dùng để so sánh tương đối giữa các commit. fakeredis ko hỗ trợ stream
+  nên thông báo được gửi inline trong request
+"""
+import os
+from urllib.parse import urlparse
+
+BACKEND_LOCAL = "local"
+BACKEND_MEMORY = "memory"
+
+LOCAL_HOSTS = ("127.0.0.1", "localhost")
+LOCAL_MONGO_URL = "mongodb://127.0.0.1:27018"
+LOCAL_REDIS_HOST = "127.0.0.1:6380"
+
+BENCHMARK_SERVER_AUTH = "benchmark-server-auth"
+
+BENCHMARK_ENV = {
+    "SERVER_AUTH_CRM": BENCHMARK_SERVER_AUTH,
+    "JWT_SECRET_KEY": "benchmark-secret-key",
+    "ALGORITHM": "HS256",
+    "VERSION": "benchmark",
+    "MONGO_INDEX_CHECK": "False",
+    "THUMBNAIL_ENABLED": "False",
+    "FAN_OUT_LOCAL_WORKER": "True",
+}
+
+
+def setup_backend(backend: str) -> None:
+    # constant của app đọc env lúc import nên phải set trước
+    for key, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(key, value)
+
+    if backend == BACKEND_MEMORY:
+        setup_memory_backend()
+        return
+
+    os.environ.setdefault("MONGO_URL", LOCAL_MONGO_URL)
+    os.environ.setdefault("HOST_REDIS", LOCAL_REDIS_HOST)
+    os.environ.setdefault("PASSWORD_REDIS", "")
+    # benchmark xoá dữ liệu cũ trước khi chạy nên ko cho phép trỏ tới mongo ngoài máy local
+    if urlparse(os.environ["MONGO_URL"]).hostname not in LOCAL_HOSTS:
+        raise RuntimeError(f"benchmark only runs against a local mongo, got MONGO_URL={os.environ['MONGO_URL']}")
+    if urlparse(f"redis://{os.environ['HOST_REDIS']}").hostname not in LOCAL_HOSTS:
+        raise RuntimeError(f"benchmark only runs against a local redis, got HOST_REDIS={os.environ['HOST_REDIS']}")
+
+
+def setup_memory_backend() -> None:
+    import fakeredis.aioredis
+    import mongomock_motor
+    import motor.motor_asyncio
+
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    os.environ["MONGO_URL"] = "mongodb://memory"
+    # fakeredis ko có XADD / consumer group
+    os.environ["FAN_OUT_MODE"] = "inline"
+
+    from app.model import index
+    from app.model.redis import RedisPool
+
+    async def create_indexes():
+        # mongomock bỏ qua partialFilterExpression nên unique index từng phần bị báo trùng ( E11000 )
+        pass
+
+    index.create_indexes = create_indexes
+
+    def start_pool(self):
+        self.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+    RedisPool.start_pool = start_pool
@@ -0,0 +1,151 @@
+"""
+Sinh dữ liệu benchmark: N watcher, M group, K activity và notification chưa đọc
+"""
+import random
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from app.api.v1.dependency.authentication import create_access_token
+from app.library.constant.broadcast import BROADCAST_JOB_COLLECTION
+from app.library.constant.group_member import GROUP_MEMBER_COLLECTION
+from app.library.constant.notification import (
+    NOTIFICATION_INBOX_COLLECTION, NOTIFICATION_TYPE_COMMENT
+)
+from app.library.fan_out import build_notification
+from app.library.group_member import add_members
+from app.library.notification_storage import insert_notifications
+from app.model.base import db
+
+SYSTEM_NAME = "CRM"
+
+INSERT_BATCH_SIZE = 1000
+
+COLLECTIONS = [
+    "watcher", "group_profile", GROUP_MEMBER_COLLECTION, "activity", "notification",
+    NOTIFICATION_INBOX_COLLECTION, BROADCAST_JOB_COLLECTION
+]
+
+
+@dataclass
+class Dataset:
+    watcher_ids: List[str] = field(default_factory=list)
+    group_profile_ids: List[str] = field(default_factory=list)
+    group_profile_id__member_ids: Dict[str, List[str]] = field(default_factory=dict)
+    watcher_id__token: Dict[str, str] = field(default_factory=dict)
+
+
+def base_fields() -> dict:
+    now = datetime.now()
+    return {"created_by": SYSTEM_NAME, "updated_by": SYSTEM_NAME, "created_at": now, "updated_at": now}
+
+
+async def insert_in_batches(collection: str, documents: List[dict]) -> None:
+    for index in range(0, len(documents), INSERT_BATCH_SIZE):
+        await db[collection].insert_many(documents[index:index + INSERT_BATCH_SIZE], ordered=False)
+
+
+async def reset_database() -> None:
+    for collection in COLLECTIONS:
+        await db[collection].delete_many({})
+
+
+async def generate_dataset(
+        number_watcher: int,
+        number_group: int,
+        number_activity: int,
+        member_per_group: int,
+        number_token: int,
+        seed: int
+) -> Dataset:
+    """
+    Ghi thẳng vào mongo ( ko qua API ) để dữ liệu lớn vẫn tạo nhanh, dùng lại hàm của app để dữ liệu
+    đúng với storage mode đang cấu hình
+    """
+    random_generator = random.Random(seed)
+    dataset = Dataset()
+
+    watchers = [
+        {
+            "watcher_id": f"benchmark-watcher-{index}",
+            "username": f"benchmark_user_{index}",
+            "avatar_url": f"https://example.com/avatar/{index}.png",
+            **base_fields()
+        } for index in range(number_watcher)
+    ]
+    await insert_in_batches("watcher", watchers)
+    dataset.watcher_ids = [watcher['watcher_id'] for watcher in watchers]
+    watcher_id__username = {watcher['watcher_id']: watcher['username'] for watcher in watchers}
+
+    for index in range(number_group):
+        group_profile_id = f"benchmark-group-{index}"
+        await db.group_profile.insert_one({
+            "group_profile_id": group_profile_id,
+            "watcher_ids": [],
+            "member_count": 0,
+            "activity_count": 0,
+            "last_activity_id": None,
+            "last_activity_at": None,
+            **base_fields()
+        })
+        members = random_generator.sample(watchers, min(member_per_group, len(watchers)))
+        await add_members(group_profile_id, members)
+        dataset.group_profile_ids.append(group_profile_id)
+        dataset.group_profile_id__member_ids[group_profile_id] = [member['watcher_id'] for member in members]
+
+    # activity cũ dần về quá khứ để feed có nhiều ngày
+    start_time = datetime.now() - timedelta(minutes=number_activity)
+    activities = []
+    for index in range(number_activity):
+        group_profile_id = random_generator.choice(dataset.group_profile_ids)
+        watcher_id = random_generator.choice(dataset.group_profile_id__member_ids[group_profile_id])
+        created_at = start_time + timedelta(minutes=index)
+        activities.append({
+            "group_profile_id": group_profile_id,
+            "content": f"benchmark activity {index} ",
+            "tag_users": ["@all"],
+            "file_uuid": None,
+            "file_url": None,
+            "file_name": None,
+            "watcher_id": watcher_id,
+            **base_fields(),
+            "created_by": watcher_id__username[watcher_id],
+            "updated_by": watcher_id__username[watcher_id],
+            "created_at": created_at,
+            "updated_at": created_at
+        })
+    await insert_in_batches("activity", activities)
+
+    notifications = []
+    for activity in activities:
+        job = {"activity_id": str(activity['_id']), "watcher_id": activity['watcher_id'], "system_name": SYSTEM_NAME}
+        recipients = [
+            member_id for member_id in dataset.group_profile_id__member_ids[activity['group_profile_id']]
+            if member_id != activity['watcher_id']
+        ]
+        notifications.append(build_notification(
+            job, NOTIFICATION_TYPE_COMMENT, f"{activity['created_by']} đã thêm 1 hoạt động", recipients
+        ))
+        if len(notifications) >= INSERT_BATCH_SIZE:
+            await insert_notifications(notifications)
+            notifications = []
+    await insert_notifications(notifications)
+
+    group_profile_id__activities = defaultdict(list)
+    for activity in activities:
+        group_profile_id__activities[activity['group_profile_id']].append(activity)
+    for group_profile_id, group_activities in group_profile_id__activities.items():
+        await db.group_profile.update_one(
+            {"group_profile_id": group_profile_id},
+            {"$set": {
+                "activity_count": len(group_activities),
+                "last_activity_id": str(group_activities[-1]['_id']),
+                "last_activity_at": group_activities[-1]['created_at']
+            }}
+        )
+
+    for watcher_id in random_generator.sample(dataset.watcher_ids, min(number_token, len(dataset.watcher_ids))):
+        dataset.watcher_id__token[watcher_id] = await create_access_token(watcher_id)
+
+    return dataset
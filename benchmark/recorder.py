@@ -0,0 +1,57 @@
+import math
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    # nearest-rank
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """
+    Lưu thời gian của từng request theo tên endpoint ( path template ) để tính p50/p95/p99 và request/giây
+    """
+    def __init__(self):
+        self.endpoint__durations: Dict[str, List[float]] = defaultdict(list)
+        self.endpoint__errors: Dict[str, int] = defaultdict(int)
+        self.endpoint__elapsed: Dict[str, float] = defaultdict(float)
+
+    def record(self, endpoint: str, duration: float, is_success: bool) -> None:
+        self.endpoint__durations[endpoint].append(duration)
+        if not is_success:
+            self.endpoint__errors[endpoint] += 1
+
+    def add_elapsed(self, endpoints: List[str], elapsed: float) -> None:
+        # thời gian thực của scenario, dùng để tính request/giây khi chạy nhiều request song song
+        for endpoint in endpoints:
+            self.endpoint__elapsed[endpoint] += elapsed
+
+    def summary(self) -> Dict[str, dict]:
+        endpoint__summary = {}
+        for endpoint, durations in sorted(self.endpoint__durations.items()):
+            sorted_durations = sorted(durations)
+            elapsed = self.endpoint__elapsed.get(endpoint) or sum(durations)
+            endpoint__summary[endpoint] = {
+                "count": len(durations),
+                "errors": self.endpoint__errors[endpoint],
+                "rps": round(len(durations) / elapsed, 2) if elapsed else 0.0,
+                "mean_ms": round(sum(durations) / len(durations) * 1000, 3),
+                "p50_ms": round(percentile(sorted_durations, 50) * 1000, 3),
+                "p95_ms": round(percentile(sorted_durations, 95) * 1000, 3),
+                "p99_ms": round(percentile(sorted_durations, 99) * 1000, 3),
+            }
+        return endpoint__summary
+
+
+class Timer:
+    def __init__(self):
+        self.start_time = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start_time
@@ -0,0 +1,164 @@
+"""
+Benchmark API thông báo bằng ASGI client chạy trong process ( ko qua network )
+
+Chạy với mongo/redis local:
+    docker compose -f benchmark/docker-compose.yml up -d
+    pip install -r benchmark/requirements.txt
+    python -m benchmark.run --backend local
+
+Chạy ko cần mongo/redis ( mongomock-motor + fakeredis ):
+    python -m benchmark.run --backend memory
+
+So sánh với lần chạy trước:
+    python -m benchmark.run --compare benchmark/results/<commit>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess  # nosec
+from datetime import datetime
+from typing import Optional
+
+from benchmark.backend import BACKEND_LOCAL, BACKEND_MEMORY, setup_backend
+
+BASE_URL = "http://benchmark"
+
+RESULT_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark notification API")
+    parser.add_argument("--backend", choices=[BACKEND_LOCAL, BACKEND_MEMORY], default=BACKEND_LOCAL)
+    parser.add_argument("--watchers", type=int, default=1000, help="số watcher")
+    parser.add_argument("--groups", type=int, default=50, help="số group profile")
+    parser.add_argument("--activities", type=int, default=5000, help="số activity có sẵn")
+    parser.add_argument("--members-per-group", type=int, default=100)
+    parser.add_argument("--tokens", type=int, default=100, help="số watcher đăng nhập ( có token )")
+    parser.add_argument("--scenarios", nargs="+", default=None, help="mặc định chạy tất cả")
+    parser.add_argument("--iterations", type=int, default=200, help="số lượt của mỗi scenario")
+    parser.add_argument("--broadcast-iterations", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=20, help="số user chạy song song")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="file json kết quả, mặc định benchmark/results/<commit>.json")
+    parser.add_argument("--compare", default=None, help="file json kết quả lần chạy trước")
+    return parser.parse_args()
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(  # nosec
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def reset_redis() -> None:
+    from app.model.redis import redis_client
+
+    redis_client.start_pool()
+    try:
+        await redis_client.redis.flushdb()
+    finally:
+        await redis_client.close_pool()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from app.main import app
+    from benchmark.dataset import generate_dataset, reset_database
+    from benchmark.recorder import Recorder, Timer
+    from benchmark.scenarios import SCENARIOS, run_scenario
+
+    scenario_names = args.scenarios or list(SCENARIOS)
+    unknown_scenarios = set(scenario_names) - set(SCENARIOS)
+    if unknown_scenarios:
+        raise SystemExit(f"unknown scenario: {sorted(unknown_scenarios)}, available: {list(SCENARIOS)}")
+
+    if args.backend == BACKEND_LOCAL:
+        # xoá trước khi startup vì startup tạo consumer group của fan out trong redis
+        await reset_redis()
+    await reset_database()
+
+    timer = Timer()
+    dataset = await generate_dataset(
+        number_watcher=args.watchers,
+        number_group=args.groups,
+        number_activity=args.activities,
+        member_per_group=args.members_per_group,
+        number_token=args.tokens,
+        seed=args.seed
+    )
+    print(f"generated dataset in {timer.elapsed:.1f}s")
+
+    recorder = Recorder()
+    scenario__elapsed = {}
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url=BASE_URL) as client:
+            for name in scenario_names:
+                iterations = args.broadcast_iterations if name == "broadcast" else args.iterations
+                scenario__elapsed[name] = await run_scenario(
+                    name, client, dataset, recorder, iterations, args.concurrency, args.seed
+                )
+                print(f"{name}: {iterations} iterations in {scenario__elapsed[name]:.2f}s")
+    finally:
+        await app.router.shutdown()
+
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "backend": args.backend,
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("output", "compare")
+        },
+        "scenarios": {name: {"elapsed_s": round(elapsed, 3)} for name, elapsed in scenario__elapsed.items()},
+        "endpoints": recorder.summary()
+    }
+
+
+def print_result(result: dict, baseline: Optional[dict] = None) -> None:
+    header = f"{'endpoint':<52}{'count':>7}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    if baseline:
+        header += f"{'p95 vs base':>13}"
+    print(header)
+    for endpoint, summary in result["endpoints"].items():
+        line = (
+            f"{endpoint:<52}{summary['count']:>7}{summary['errors']:>5}{summary['rps']:>9}"
+            f"{summary['p50_ms']:>10}{summary['p95_ms']:>10}{summary['p99_ms']:>10}"
+        )
+        base_summary = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if base_summary and base_summary["p95_ms"]:
+            change = (summary["p95_ms"] - base_summary["p95_ms"]) / base_summary["p95_ms"] * 100
+            line += f"{change:>+12.1f}%"
+        print(line)
+
+
+def main():
+    args = parse_args()
+    setup_backend(args.backend)
+
+    result = asyncio.run(run(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_result(result, baseline)
+
+    # thời gian của request lỗi ko so sánh được với lần chạy khác nên ko lưu kết quả
+    error_endpoints = [endpoint for endpoint, summary in result["endpoints"].items() if summary["errors"]]
+    if error_endpoints:
+        raise SystemExit(f"benchmark failed, endpoints with errors: {error_endpoints}")
+
+    output = args.output or os.path.join(RESULT_DIR, f"{result['commit'] or 'result'}-{args.backend}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(result, file, indent=2, ensure_ascii=False)
+    print(f"saved result to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Các kịch bản benchmark, mỗi lần gọi là 1 lượt thao tác của 1 user
+"""
+import asyncio
+import random
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+
+from benchmark.backend import BENCHMARK_SERVER_AUTH
+from benchmark.dataset import Dataset
+from benchmark.recorder import Recorder, Timer
+
+API_PREFIX = "/api/v1"
+
+SERVER_AUTH_HEADER = {"server-auth": BENCHMARK_SERVER_AUTH}
+
+PAGE_LIMIT = 20
+# số trang mỗi lượt kéo feed / danh sách thông báo
+SCROLL_PAGES = 5
+
+BROADCAST_POLL_INTERVAL = 0.05
+BROADCAST_MAX_POLL = 200
+
+
+async def send(
+        client: httpx.AsyncClient,
+        recorder: Recorder,
+        endpoint: str,
+        method: str,
+        url: str,
+        **kwargs
+) -> Optional[httpx.Response]:
+    timer = Timer()
+    try:
+        response = await client.request(method, f"{API_PREFIX}{url}", **kwargs)
+    except Exception:
+        recorder.record(endpoint, timer.elapsed, is_success=False)
+        return None
+    recorder.record(endpoint, timer.elapsed, is_success=response.status_code < 400)
+    return response
+
+
+def bearer(dataset: Dataset, random_generator: random.Random) -> Dict[str, str]:
+    watcher_id = random_generator.choice(list(dataset.watcher_id__token))
+    return {"Authorization": f"Bearer {dataset.watcher_id__token[watcher_id]}"}
+
+
+async def fan_out(client: httpx.AsyncClient, dataset: Dataset, recorder: Recorder, random_generator: random.Random):
+    group_profile_id = random_generator.choice(dataset.group_profile_ids)
+    watcher_id = random_generator.choice(dataset.group_profile_id__member_ids[group_profile_id])
+    await send(
+        client, recorder, "POST /activity/", "POST", "/activity/",
+        data={"content": "benchmark fan out", "watcher_id": watcher_id, "group_profile_id": group_profile_id},
+        headers=SERVER_AUTH_HEADER
+    )
+
+
+async def feed_scroll(client: httpx.AsyncClient, dataset: Dataset, recorder: Recorder, random_generator: random.Random):
+    group_profile_id = random_generator.choice(dataset.group_profile_ids)
+    headers = bearer(dataset, random_generator)
+    params = {"limit": PAGE_LIMIT}
+    for _ in range(SCROLL_PAGES):
+        response = await send(
+            client, recorder, "GET /{group_profile_id}/activity/", "GET", f"/{group_profile_id}/activity/",
+            params=params, headers=headers
+        )
+        if response is None or response.status_code >= 400 or not response.json().get("next_cursor"):
+            return
+        params["last_activity_id"] = response.json()["next_cursor"]
+
+
+async def notification_scroll(
+        client: httpx.AsyncClient, dataset: Dataset, recorder: Recorder, random_generator: random.Random
+):
+    params = {"limit": PAGE_LIMIT, "watcher_id": random_generator.choice(dataset.watcher_ids)}
+    for _ in range(SCROLL_PAGES):
+        response = await send(
+            client, recorder, "GET /notification/", "GET", "/notification/", params=params, headers=SERVER_AUTH_HEADER
+        )
+        if response is None or response.status_code >= 400 or not response.json().get("next_cursor"):
+            return
+        params["last_notification_id"] = response.json()["next_cursor"]
+
+
+async def unread_polling(
+        client: httpx.AsyncClient, dataset: Dataset, recorder: Recorder, random_generator: random.Random
+):
+    await send(
+        client, recorder, "GET /notification/number/", "GET", "/notification/number/",
+        headers=bearer(dataset, random_generator)
+    )
+
+
+async def broadcast(client: httpx.AsyncClient, dataset: Dataset, recorder: Recorder, random_generator: random.Random):
+    response = await send(
+        client, recorder, "POST /notification/broadcast/", "POST", "/notification/broadcast/",
+        json={"content": "benchmark broadcast"}, headers=SERVER_AUTH_HEADER
+    )
+    if response is None or response.status_code >= 400:
+        return
+
+    broadcast_job_id = response.json()["data"]["_id"]
+    for _ in range(BROADCAST_MAX_POLL):
+        response = await send(
+            client, recorder, "GET /notification/broadcast/{broadcast_job_id}", "GET",
+            f"/notification/broadcast/{broadcast_job_id}", headers=SERVER_AUTH_HEADER
+        )
+        if response is None or response.status_code >= 400 or response.json()["data"]["status"] in ("done", "failed"):
+            return
+        await asyncio.sleep(BROADCAST_POLL_INTERVAL)
+
+
+class Scenario(NamedTuple):
+    run: Callable[[httpx.AsyncClient, Dataset, Recorder, random.Random], Awaitable[None]]
+    endpoints: List[str]
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "fan_out": Scenario(fan_out, ["POST /activity/"]),
+    "feed_scroll": Scenario(feed_scroll, ["GET /{group_profile_id}/activity/"]),
+    "notification_scroll": Scenario(notification_scroll, ["GET /notification/"]),
+    "unread_polling": Scenario(unread_polling, ["GET /notification/number/"]),
+    "broadcast": Scenario(
+        broadcast, ["POST /notification/broadcast/", "GET /notification/broadcast/{broadcast_job_id}"]
+    ),
+}
+
+
+async def run_scenario(
+        name: str,
+        client: httpx.AsyncClient,
+        dataset: Dataset,
+        recorder: Recorder,
+        iterations: int,
+        concurrency: int,
+        seed: int
+) -> float:
+    """
+    Chạy `iterations` lượt chia cho `concurrency` user chạy song song
+    :return: thời gian chạy ( giây )
+    """
+    scenario = SCENARIOS[name]
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(iterations):
+        queue.put_nowait(None)
+
+    async def user(index: int):
+        random_generator = random.Random(seed + index)
+        while not queue.empty():
+            queue.get_nowait()
+            await scenario.run(client, dataset, recorder, random_generator)
+
+    timer = Timer()
+    await asyncio.gather(*[user(index) for index in range(concurrency)])
+    recorder.add_elapsed(scenario.endpoints, timer.elapsed)
+    return timer.elapsed
@@ -0,0 +1,10 @@
+import os
+
+# import app cần các biến môi trường này, test ko kết nối tới mongo/redis thật
+os.environ.setdefault("MONGO_URL", "mongodb://127.0.0.1:27017")
+os.environ.setdefault("JWT_SECRET_KEY", "test")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("SERVER_AUTH_CRM", "test")
+os.environ.setdefault("VERSION", "test")
+os.environ.setdefault("MONGO_INDEX_CHECK", "False")
+os.environ.setdefault("THUMBNAIL_ENABLED", "False")
@@ -0,0 +1,127 @@
+import asyncio
+from copy import deepcopy
+from datetime import date, datetime
+from typing import List
+
+import pytest
+from bson import ObjectId
+from fastapi.routing import serialize_response
+from starlette.responses import JSONResponse
+
+from app.api.v1.endpoints.activity.schema import ActivityByDayResponse
+from app.api.v1.endpoints.notification.schema import NotificationResponse
+from app.api.v1.endpoints.watcher.schema import WatcherResponseSchema
+from app.library import fast_json
+from app.library.constant.function import PAGING_DIRECTION_NEXT
+from app.library.function import encode_cursor
+from app.model.base import PagingResponseData
+
+CREATED_AT = datetime(2024, 3, 9, 23, 59, 58, 123456)
+UPDATED_AT = datetime(2024, 3, 10, 0, 0, 1)
+
+WATCHER = {
+    "_id": ObjectId(),
+    "watcher_id": "watcher-1",
+    "username": "Nguyễn Văn A",
+    "avatar_url": "https://example.com/avatar.png",
+    "created_by": "CRM",
+    "updated_by": "CRM",
+    "created_at": CREATED_AT,
+    "updated_at": UPDATED_AT
+}
+
+NOTIFICATION_PAGE = {
+    "data": [
+        {
+            "_id": ObjectId(),
+            "content": "Nguyễn Văn A vừa bình luận",
+            # field ko có trong model bị bỏ qua
+            "activity_id": ObjectId(),
+            "watcher_created_activity": "watcher-1",
+            "watcher_document": [WATCHER],
+            "watcher_noti_status": {"watcher_id": "watcher-2", "status": False},
+            "watcher_created_activity_document": WATCHER,
+            "created_by": "CRM",
+            "updated_by": "CRM",
+            "created_at": CREATED_AT,
+            "updated_at": UPDATED_AT
+        },
+        {
+            # ko có người tạo: dùng default None
+            "_id": ObjectId(),
+            "content": "broadcast",
+            "watcher_noti_status": {"watcher_id": "watcher-2", "status": True},
+            "created_by": "CRM",
+            "updated_by": "CRM",
+            "created_at": CREATED_AT,
+            "updated_at": UPDATED_AT
+        }
+    ],
+    "has_more": True,
+    "next_cursor": encode_cursor([ObjectId()], PAGING_DIRECTION_NEXT),
+    "prev_cursor": None
+}
+
+ACTIVITY = {
+    "_id": ObjectId(),
+    "content": "@watcher-2 xin chào ",
+    "file_uuid": "uuid",
+    "file_name": "báo cáo.pdf",
+    "file_url": "https://example.com/file.pdf",
+    "tag_users": ["watcher-2"],
+    "watcher_id": "watcher-1",
+    "watcher_created_acitivity_document": WATCHER,
+    "group_profile_id": "group-1",
+    "created_by": "Nguyễn Văn A",
+    "updated_by": "Nguyễn Văn A",
+    "created_at": CREATED_AT,
+    "updated_at": UPDATED_AT
+}
+
+ACTIVITY_PAGE = {
+    "data": [
+        # created_day là date ( phân trang cũ ) hoặc datetime
+        {"created_day": date(2024, 3, 9), "activities": [ACTIVITY]},
+        {
+            "created_day": datetime(2024, 3, 8, 10, 0),
+            "activities": [
+                {
+                    **ACTIVITY, "_id": ObjectId(), "file_uuid": None, "file_name": None, "file_url": None,
+                    "thumbnail_url": "https://example.com/thumbnail.jpeg", "tag_users": ["@all"]
+                }
+            ]
+        }
+    ],
+    "has_more": False,
+    "next_cursor": None,
+    "prev_cursor": encode_cursor([ObjectId()], PAGING_DIRECTION_NEXT)
+}
+
+MEMBER_PAGE = {
+    "data": [WATCHER, {**WATCHER, "_id": ObjectId(), "watcher_id": "watcher-2", "username": "b"}],
+    "has_more": False,
+    "next_cursor": None,
+    "prev_cursor": None
+}
+
+
+def render(response_model, content: dict) -> bytes:
+    response = fast_json.make_response(response_model, deepcopy(content))
+    if isinstance(response, JSONResponse):
+        return response.body
+    # endpoint trả về model: fastapi serialize như với route ko khai báo response_model
+    return JSONResponse(asyncio.run(serialize_response(response_content=response))).body
+
+
+@pytest.mark.parametrize("response_model, content", [
+    (PagingResponseData[List[NotificationResponse]], NOTIFICATION_PAGE),
+    (PagingResponseData[List[ActivityByDayResponse]], ACTIVITY_PAGE),
+    (PagingResponseData[List[WatcherResponseSchema]], MEMBER_PAGE),
+], ids=["notification", "activity", "member"])
+def test_fast_json_response_matches_pydantic_response(monkeypatch, response_model, content):
+    monkeypatch.setattr(fast_json, "FAST_JSON_RESPONSE", False)
+    expected = render(response_model, content)
+    monkeypatch.setattr(fast_json, "FAST_JSON_RESPONSE", True)
+    actual = render(response_model, content)
+
+    assert actual == expected
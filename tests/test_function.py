@@ -0,0 +1,158 @@
+import base64
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.library.constant.function import (
+    PAGING_DIRECTION_NEXT, PAGING_DIRECTION_PREVIOUS, PAGING_LIMIT,
+    PAGING_MAX_LIMIT
+)
+from app.library.function import (
+    KeysetPaging, decode_cursor, encode_cursor, get_page_limit
+)
+
+
+@pytest.mark.parametrize("values", [
+    [ObjectId()],
+    [datetime(2024, 1, 2, 3, 4, 5, 678000), ObjectId()],
+    ["watcher", 10, None],
+    [],
+])
+@pytest.mark.parametrize("direction", [PAGING_DIRECTION_NEXT, PAGING_DIRECTION_PREVIOUS])
+def test_cursor_round_trip(values, direction):
+    cursor = encode_cursor(values, direction)
+
+    # dùng được trên query string, ko có padding
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == (values, direction)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    "",
+    encode_cursor([ObjectId()], 0),
+    encode_cursor([ObjectId()], 2),
+    # payload hợp lệ nhưng values ko phải list / thiếu direction
+    base64.urlsafe_b64encode(b'{"v": 1, "d": 1}').decode(),
+    base64.urlsafe_b64encode(b'{"v": []}').decode(),
+])
+def test_decode_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("limit, expected", [
+    (None, PAGING_LIMIT),
+    (0, PAGING_LIMIT),
+    (-5, 1),
+    (1, 1),
+    (PAGING_MAX_LIMIT, PAGING_MAX_LIMIT),
+    (PAGING_MAX_LIMIT + 1, PAGING_MAX_LIMIT),
+])
+def test_get_page_limit(limit, expected):
+    assert get_page_limit(limit) == expected
+
+
+def test_keyset_paging_first_page_does_not_filter():
+    keyset_paging = KeysetPaging([("_id", -1)])
+
+    assert keyset_paging.match({"group_profile_id": "group"}) == {"group_profile_id": "group"}
+    assert keyset_paging.sort == [("_id", -1)]
+    assert keyset_paging.fetch_limit == PAGING_LIMIT + 1
+
+
+def test_keyset_paging_accepts_legacy_object_id_cursor():
+    last_id = ObjectId()
+    keyset_paging = KeysetPaging([("_id", 1)], str(last_id))
+
+    assert keyset_paging.match({}) == {"$and": [{}, {"_id": {"$gt": last_id}}]}
+
+
+def test_keyset_paging_rejects_cursor_of_other_sort_keys():
+    cursor = encode_cursor([ObjectId()], PAGING_DIRECTION_NEXT)
+
+    with pytest.raises(HTTPException):
+        KeysetPaging([("created_at", -1), ("_id", -1)], cursor)
+
+
+def test_keyset_paging_match_multiple_keys():
+    created_at, last_id = datetime(2024, 1, 1), ObjectId()
+    keyset_paging = KeysetPaging(
+        [("created_at", -1), ("_id", -1)], encode_cursor([created_at, last_id], PAGING_DIRECTION_NEXT)
+    )
+
+    assert keyset_paging.match({"watcher_id": "a"}) == {
+        "$and": [
+            {"watcher_id": "a"},
+            {"$or": [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": last_id}}
+            ]}
+        ]
+    }
+
+
+def test_keyset_paging_previous_direction_reverses_sort():
+    last_id = ObjectId()
+    keyset_paging = KeysetPaging([("_id", -1)], encode_cursor([last_id], PAGING_DIRECTION_PREVIOUS))
+
+    assert keyset_paging.sort == [("_id", 1)]
+    assert keyset_paging.match({}) == {"$and": [{}, {"_id": {"$gt": last_id}}]}
+
+
+def make_items(number: int) -> list:
+    return [{"_id": ObjectId()} for _ in range(number)]
+
+
+def test_keyset_paging_page_exactly_limit_items_has_no_next_page():
+    items = make_items(3)
+    page = KeysetPaging([("_id", 1)], limit=3).page(list(items))
+
+    assert page == {"data": items, "has_more": False, "next_cursor": None, "prev_cursor": None}
+
+
+def test_keyset_paging_page_with_extra_item_has_next_page():
+    items = make_items(4)
+    keyset_paging = KeysetPaging([("_id", 1)], limit=3)
+    page = keyset_paging.page(list(items))
+
+    assert page['data'] == items[:3]
+    assert page['has_more'] is True
+    assert page['prev_cursor'] is None
+    assert decode_cursor(page['next_cursor']) == ([items[2]['_id']], PAGING_DIRECTION_NEXT)
+
+    # trang tiếp theo bắt đầu sau phần tử cuối của trang này
+    next_paging = KeysetPaging([("_id", 1)], page['next_cursor'], limit=3)
+    assert next_paging.match({}) == {"$and": [{}, {"_id": {"$gt": items[2]['_id']}}]}
+
+
+def test_keyset_paging_next_page_has_previous_cursor():
+    items = make_items(2)
+    cursor = encode_cursor([ObjectId()], PAGING_DIRECTION_NEXT)
+    page = KeysetPaging([("_id", 1)], cursor, limit=3).page(list(items))
+
+    assert page['has_more'] is False
+    assert page['next_cursor'] is None
+    assert decode_cursor(page['prev_cursor']) == ([items[0]['_id']], PAGING_DIRECTION_PREVIOUS)
+
+
+def test_keyset_paging_previous_page_is_reversed():
+    # đọc trang trước: mongo trả về theo sort ngược lại
+    items = make_items(4)
+    cursor = encode_cursor([ObjectId()], PAGING_DIRECTION_PREVIOUS)
+    page = KeysetPaging([("_id", 1)], cursor, limit=3).page(list(items))
+
+    assert page['data'] == list(reversed(items[:3]))
+    assert page['has_more'] is True
+    assert decode_cursor(page['prev_cursor']) == ([items[2]['_id']], PAGING_DIRECTION_PREVIOUS)
+    assert decode_cursor(page['next_cursor']) == ([items[0]['_id']], PAGING_DIRECTION_NEXT)
+
+
+def test_keyset_paging_empty_page():
+    cursor = encode_cursor([ObjectId()], PAGING_DIRECTION_NEXT)
+    page = KeysetPaging([("_id", 1)], cursor).page([])
+
+    assert page == {"data": [], "has_more": False, "next_cursor": None, "prev_cursor": None}
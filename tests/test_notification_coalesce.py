@@ -0,0 +1,13 @@
+import pytest
+
+from app.library.notification_coalesce import build_coalesce_content
+
+
+@pytest.mark.parametrize("actors, comment_count, content", [
+    (["b"], 1, "b vừa bình luận"),
+    (["b"], 3, "b vừa bình luận 3 lần"),
+    (["b", "a"], 2, "b và 1 người khác vừa bình luận"),
+    (["c", "b", "a"], 5, "c và 2 người khác vừa bình luận"),
+])
+def test_build_coalesce_content(actors, comment_count, content):
+    assert build_coalesce_content(actors[0], actors, comment_count) == content